@@ -3,8 +3,11 @@
 # use data structures
 from __future__ import unicode_literals
 from processors.ds import Document, Sentence, DirectedGraph
-from processors.utils import post_json
+from processors.utils import post_json, concurrent_map
+import logging
 import json
+import copy
+import time
 
 
 class Processor(object):
@@ -34,11 +37,11 @@ class Processor(object):
     def __init__(self, address):
         self.service = "{}/api/annotate".format(address)
 
-    def _message_to_json_dict(self, msg):
-        return post_json(self.service, msg.to_JSON())
+    def _message_to_json_dict(self, msg, timeout=None):
+        return post_json(self.service, msg.to_JSON(), timeout=timeout)
 
-    def _annotate_message(self, msg):
-        annotated_text = post_json(self.service, msg.to_JSON())
+    def _annotate_message(self, msg, timeout=None):
+        annotated_text = self._message_to_json_dict(msg, timeout=timeout)
         return Document.load_from_JSON(annotated_text)
 
     def annotate(self, text):
@@ -199,3 +202,238 @@ class SegmentedMessage(object):
 
     def to_JSON(self):
         return json.dumps(self.to_JSON_dict(), sort_keys=True, indent=4)
+
+
+class TokenAlignment(object):
+    """
+    Aligns the tokens of two annotations of the same text using their character offsets.
+
+    Parameters
+    ----------
+    base : dict
+        Document JSON providing the reference tokenization.
+    other : dict
+        Document JSON to align with `base`.
+
+    Attributes
+    ----------
+    agrees : bool
+        Whether both annotations have the same sentences and tokens (i.e., identical offsets).
+    pairs : [((int, int), (int, int))]
+        ((sentence, token) in `base`, (sentence, token) in `other`) for each pair of overlapping tokens.
+    unaligned : [(int, int)]
+        (sentence, token) in `other` for each token that overlaps no token in `base`.
+    mismatched_sentences : [int]
+        The sentences of `base` whose tokens differ from those of `other`.
+    """
+
+    def __init__(self, base, other):
+        self.mismatched_sentences = TokenAlignment._mismatched_sentences(base, other)
+        self.agrees = len(base["sentences"]) == len(other["sentences"]) and not self.mismatched_sentences
+        (self.pairs, self.unaligned) = TokenAlignment._align(TokenAlignment._tokens(base), TokenAlignment._tokens(other))
+
+    @staticmethod
+    def _tokens(jdict):
+        return [
+            (start, end, (i, j))
+            for (i, s) in enumerate(jdict["sentences"])
+            for (j, (start, end)) in enumerate(zip(s["startOffsets"], s["endOffsets"]))
+        ]
+
+    @staticmethod
+    def _mismatched_sentences(base, other):
+        others = other["sentences"]
+        return [
+            i for (i, s) in enumerate(base["sentences"])
+            if i >= len(others) or s["startOffsets"] != others[i]["startOffsets"] or s["endOffsets"] != others[i]["endOffsets"]
+        ]
+
+    @staticmethod
+    def _align(base_tokens, other_tokens):
+        pairs = []
+        unaligned = []
+        k = 0
+        for (start, end, other_idx) in other_tokens:
+            # skip base tokens that end before this token
+            while k < len(base_tokens) and base_tokens[k][1] <= start:
+                k += 1
+            m = k
+            aligned = False
+            while m < len(base_tokens) and base_tokens[m][0] < max(end, start + 1):
+                pairs.append((base_tokens[m][2], other_idx))
+                aligned = True
+                m += 1
+            if not aligned:
+                unaligned.append(other_idx)
+        return (pairs, unaligned)
+
+
+class MergedAnnotation(object):
+    """
+    The result of annotating a text with several processors concurrently and merging their layers into one `processors.ds.Document`.
+
+    Layers are "tags", "lemmas", "entities", "chunks", "graphs" (all graphs), or the name of a single graph (ex. "stanford-basic").
+    Sentences, tokens, and any layer without a source are taken from the `tokens` processor.
+    A layer is only merged if its processor produced the same tokenization as the `tokens` processor.  Otherwise, the layer is listed in `skipped` and the mismatch is described in `alignments`.
+
+    Attributes
+    ----------
+    document : processors.ds.Document or None
+        The merged `Document` (None if the `tokens` processor failed).
+    documents : dict
+        processor name -> document JSON (None if the request failed).
+    alignments : dict
+        processor name -> `processors.annotators.TokenAlignment` with the `tokens` processor.
+    skipped : dict
+        layer -> processor name for each layer that could not be merged.
+    seconds : dict
+        processor name -> seconds taken by the request.
+    errors : dict
+        processor name -> the exception raised by each failed request.
+
+    Methods
+    -------
+    fan_out(text, processors, sources, tokens=None)
+        Annotates `text` with each processor concurrently and merges the requested layers.
+    merge(documents, sources, tokens)
+        Merges the layers of several document JSONs.
+    """
+
+    TOKEN_LAYERS = ("tags", "lemmas", "entities", "chunks")
+    GRAPHS = "graphs"
+
+    def __init__(self, document, documents, alignments, skipped, seconds=None, errors=None):
+        self.document = document
+        self.documents = documents
+        self.alignments = alignments
+        self.skipped = skipped
+        self.seconds = seconds or dict()
+        self.errors = errors or dict()
+
+    @property
+    def agrees(self):
+        """
+        Whether every requested layer was merged.
+        """
+        return self.document is not None and not self.skipped
+
+    @staticmethod
+    def tokens_source(sources):
+        """
+        The processor providing the most layers in `sources` (ties are broken by name).
+        """
+        counts = dict()
+        for name in sources.values():
+            counts[name] = counts.get(name, 0) + 1
+        return sorted(counts, key=lambda name: (-counts[name], name))[0]
+
+    @staticmethod
+    def fan_out(text, processors, sources, tokens=None):
+        """
+        Annotates `text` with each processor named in `sources` concurrently (so the elapsed time is that of the slowest request) and merges the requested layers.
+
+        Parameters
+        ----------
+        text : str
+            The text to annotate.
+        processors : dict
+            processor name -> `processors.annotators.Processor`
+        sources : dict
+            layer -> processor name (ex. {"entities": "bionlp", "graphs": "fastnlp", "chunks": "fastnlp"})
+        tokens : str or None
+            The processor providing sentences and tokens.  None uses `MergedAnnotation.tokens_source`.
+
+        Returns
+        -------
+        processors.annotators.MergedAnnotation
+        """
+        if not sources:
+            raise ValueError("At least one layer source is required")
+        tokens = tokens or MergedAnnotation.tokens_source(sources)
+        names = sorted(set(sources.values()) | {tokens})
+        for name in names:
+            if name not in processors:
+                raise ValueError("Unknown processor: {}".format(name))
+
+        logger = logging.getLogger(__name__)
+
+        def annotate(name):
+            start = time.time()
+            (jdict, error) = (None, None)
+            try:
+                jdict = processors[name]._message_to_json_dict(Message(text))
+            except Exception as e:
+                error = e
+                logger.warning("Annotation with {} failed: {}".format(name, e))
+            return (name, jdict, error, time.time() - start)
+
+        documents = dict()
+        seconds = dict()
+        errors = dict()
+        for (_, (name, jdict, error, elapsed)) in concurrent_map(annotate, names, max_in_flight=len(names), ordered=False):
+            documents[name] = jdict
+            seconds[name] = elapsed
+            if error is not None:
+                errors[name] = error
+        res = MergedAnnotation.merge(documents, sources, tokens)
+        res.seconds = seconds
+        res.errors = errors
+        return res
+
+    @staticmethod
+    def merge(documents, sources, tokens):
+        """
+        Merges the layers of several document JSONs (see `MergedAnnotation.fan_out`).
+
+        Parameters
+        ----------
+        documents : dict
+            processor name -> document JSON (or None)
+        sources : dict
+            layer -> processor name
+        tokens : str
+            The processor providing sentences and tokens.
+
+        Returns
+        -------
+        processors.annotators.MergedAnnotation
+        """
+        base = documents.get(tokens, None)
+        if base is None:
+            skipped = {layer: name for (layer, name) in sources.items() if name != tokens}
+            return MergedAnnotation(None, documents, dict(), skipped)
+        merged = copy.deepcopy(base)
+        alignments = dict()
+        skipped = dict()
+        for (layer, name) in sorted(sources.items()):
+            if name == tokens:
+                continue
+            other = documents.get(name, None)
+            if other is None:
+                skipped[layer] = name
+                continue
+            if name not in alignments:
+                alignments[name] = TokenAlignment(base, other)
+            if not alignments[name].agrees:
+                skipped[layer] = name
+                continue
+            for (s, o) in zip(merged["sentences"], other["sentences"]):
+                MergedAnnotation._copy_layer(layer, o, s)
+        return MergedAnnotation(Document.load_from_JSON(merged), documents, alignments, skipped)
+
+    @staticmethod
+    def _copy_layer(layer, source, destination):
+        if layer in MergedAnnotation.TOKEN_LAYERS:
+            if source.get(layer, None) is None:
+                destination.pop(layer, None)
+            else:
+                destination[layer] = source[layer]
+        elif layer == MergedAnnotation.GRAPHS:
+            destination[layer] = source.get(layer, dict())
+        else:
+            graphs = source.get(MergedAnnotation.GRAPHS, None) or dict()
+            destination.setdefault(MergedAnnotation.GRAPHS, dict())
+            if layer in graphs:
+                destination[MergedAnnotation.GRAPHS][layer] = graphs[layer]
+            else:
+                destination[MergedAnnotation.GRAPHS].pop(layer, None)
@@ -5,6 +5,8 @@ from .utils import *
 from .annotators import *
 from .sentiment import SentimentAnalysisAPI
 from .serialization import JSONSerializer
+from .cache import ResultCache
+from .ds import DocumentView
 import os
 import shlex
 import subprocess as sp
@@ -28,6 +30,10 @@ class ProcessorsBaseAPI(object):
         The host name to use for the server.  Default is "localhost".
     log_file: str
         The path for the log file.  Default is py-processors.log in the user's home directory.
+    cache: processors.cache.ResultCache or None
+        An optional cache for Odin and OpenIE results.  Default is None (results are not cached).
+    sentiment_cache: processors.cache.SentimentCache or None
+        An optional cache for sentence-level sentiment scores.  Default is None (scores are not cached).
 
     Methods
     -------
@@ -41,6 +47,10 @@ class ProcessorsBaseAPI(object):
         Produces a Document from the provided `text` using BioNLPProcessor.
     annotate_from_sentences(sentences)
         Produces a Document from `sentences` (a list of text split into sentences). Uses the default processor.
+    annotate_layers(text, sources, tokens=None)
+        Annotates `text` with several processors concurrently and merges their layers (ex. BioNLP entities with the FastNLP parse).
+    concurrency_limits()
+        The adaptive limit on concurrent requests (and latency statistics) for each server.
     fastnlp.annotate_from_sentences(sentences)
         Produces a Document from `sentences` (a list of text split into sentences). Uses FastNLPProcessor.
     bionlp.annotate_from_sentences(sentences)
@@ -55,6 +65,8 @@ class ProcessorsBaseAPI(object):
         Produces a list of Mentions for matches of the provided `rules` on the `text`.  `rules` can be a string of Odin rules, or a url ending in `.yml` or `.yaml`.
     odin.extract_from_document(doc, rules)
         Produces a list of Mentions for matches of the provided `rules` on the `doc` (an instance of Document).  `rules` can be a string of Odin rules, or a url ending in .yml or yaml.
+    odin.extract_from_documents(docs, rules, max_in_flight=4)
+        Concurrently produces a list of Mentions for each of `docs`.
     """
     PORT = 8888
     HOST = "localhost"
@@ -71,11 +83,13 @@ class ProcessorsBaseAPI(object):
         self.fastnlp = FastNLPProcessor(self.address)
         self.bionlp = BioNLPProcessor(self.address)
         # sentiment
-        self.sentiment = SentimentAnalysisAPI(self.address)
+        self.sentiment = SentimentAnalysisAPI(self.address, cache=kwargs.get("sentiment_cache", None))
+        # cache for IE results
+        self.cache = kwargs.get("cache", None)
         # odin
-        self.odin = OdinAPI(self.address)
+        self.odin = OdinAPI(self.address, cache=self.cache)
         #openie
-        self.openie = OpenIEAPI(self.address)
+        self.openie = OpenIEAPI(self.address, cache=self.cache)
         # use the os module's devnull for compatibility with python 2.7
         #self.DEVNULL = open(os.devnull, 'wb')
         self.logger = logging.getLogger(__name__)
@@ -123,6 +137,33 @@ class ProcessorsBaseAPI(object):
         """
         return self.default.annotate_from_sentences(sentences)
 
+    def annotate_layers(self, text, sources, tokens=None):
+        """
+        Annotates `text` with several processors concurrently and merges their layers into one `Document` (see `processors.annotators.MergedAnnotation`).
+
+        Parameters
+        ----------
+        text : str
+            The text to annotate.
+        sources : dict
+            layer -> processor name ("default", "clu", "fastnlp", or "bionlp").  ex. {"entities": "bionlp", "graphs": "fastnlp", "chunks": "fastnlp"}
+        tokens : str or None
+            The processor providing sentences and tokens.  None uses the processor providing the most layers.
+
+        Returns
+        -------
+        processors.annotators.MergedAnnotation
+            The merged `Document`, along with the token alignment for any processor whose tokenization disagreed.
+        """
+        processors = {name: getattr(self, name) for name in ("default", "clu", "fastnlp", "bionlp")}
+        return MergedAnnotation.fan_out(text, processors, sources, tokens=tokens)
+
+    def concurrency_limits(self):
+        """
+        The adaptive limit on concurrent requests (and latency statistics) for each server that has received a request (see `processors.utils.AdaptiveConcurrency`).
+        """
+        return AdaptiveConcurrency.limits()
+
     def is_running(self):
         return True if self.annotate("Blah") else False
 
@@ -352,7 +393,45 @@ class ProcessorsAPI(ProcessorsBaseAPI):
                 print("Couldn't kill processors-server.  Was server started externally?")
 
 
-class OdinAPI(object):
+class ExtractionAPI(object):
+    """
+    Base class for information extraction APIs.  Handles the (optional) caching of results.
+
+    Parameters
+    ----------
+    address : str
+        The base address for the API (i.e., everything preceding `/api/..`)
+    cache : processors.cache.ResultCache or None
+        If provided, mention JSON is cached by (endpoint, request, rules, server version).
+    """
+
+    def __init__(self, address, cache=None):
+        self.address = address
+        self.cache = cache
+        self._server_version = ServerVersion(address)
+
+    def server_version(self):
+        """
+        The version of processors-server (retrieved once, see `processors.utils.ServerVersion`).  Used to invalidate cached results.
+        """
+        return self._server_version.get()
+
+    def _post(self, service, json_data, rules=None):
+        """
+        POSTs `json_data` to `service`, using the cache (if any).  Errors are never cached.
+        """
+        if self.cache is None:
+            return post_json(service, json_data)
+        version = self.server_version()
+        mns_json = self.cache.get(service, json_data, rules, version)
+        if mns_json is None:
+            mns_json = post_json(service, json_data)
+            if "error" not in mns_json:
+                self.cache.put(service, json_data, rules, version, mns_json)
+        return mns_json
+
+
+class OdinAPI(ExtractionAPI):
     """
     API for performing rule-based information extraction with Odin.
 
@@ -360,25 +439,31 @@ class OdinAPI(object):
     ----------
     address : str
         The base address for the API (i.e., everything preceding `/api/..`)
+    cache : processors.cache.ResultCache or None
+        If provided, results are cached by (endpoint, document, rules, server version).
 
     """
 
     validator = re.compile("^(https?|ftp):.+?\.?ya?ml$")
 
-    def __init__(self, address):
+    def __init__(self, address, cache=None):
+        super(OdinAPI, self).__init__(address, cache=cache)
         self._service = "{}/api/odin/extract".format(address)
+        # rules -> processors.rules.RulePrefilter
+        self._prefilters = dict()
 
-    def _extract(self, json_data):
-        mns_json = post_json(self._service, json_data)
+    def _extract(self, json_data, rules=None, service=None, documents=None, qualify_ids=False):
+        mns_json = self._post(service or self._service, json_data, rules)
         if "error" in mns_json:
             error_msg = mns_json["error"]
-            original_msg = json.loads(json_data)
-            rules = original_msg.get("rules", original_msg.get("url", None))
+            if rules is None:
+                original_msg = json.loads(json_data)
+                rules = original_msg.get("rules", original_msg.get("url", None))
             oe = OdinError(rules=rules, message=error_msg)
             print(oe)
             return None
         else:
-            return JSONSerializer.mentions_from_JSON(mns_json)
+            return JSONSerializer.mentions_from_JSON(mns_json, documents=documents, qualify_ids=qualify_ids)
 
     @staticmethod
     def valid_rule_url(url):
@@ -406,9 +491,9 @@ class OdinAPI(object):
             container = TextWithURL(text, url)
         else:
             container = TextWithRules(text, rules)
-        return self._extract(container.to_JSON())
+        return self._extract(container.to_JSON(), rules)
 
-    def extract_from_document(self, doc, rules):
+    def extract_from_document(self, doc, rules, rebind=False, prefilter=None):
         """
         Sends a `processors.ds.Document` (`doc`) to the server with rules for information extraction (IE).
 
@@ -418,6 +503,12 @@ class OdinAPI(object):
             `rules` will be applied to this `processors.ds.Document`.
         rules : str
             Either Odin rules provided as a `yaml` string, or a url pointing to a `yaml` file of rules.
+        rebind : bool
+            Whether to attach the mentions to `doc` itself instead of a copy decoded from the response.  Saves memory and decoding time.
+            Mentions found in a `processors.ds.DocumentView` are always attached to its parent.
+        prefilter : processors.rules.RulePrefilter or bool or None
+            If provided, only the sentences that `rules` could match are sent (as a `processors.ds.DocumentView`), and a `doc` that can't match is never sent.
+            True builds (and reuses) a `RulePrefilter` for `rules`, which requires `pyyaml`.  Rules provided as a url are not filtered.
 
         Returns
         -------
@@ -425,18 +516,260 @@ class OdinAPI(object):
             Rule matches produce a list of `processors.odin.Mention`.
 
         """
+        doc = self._apply_prefilter(doc, self._prefilter_for(rules, prefilter))
+        if doc is None:
+            return []
         if OdinAPI.valid_rule_url(rules):
             # this is actually a URL to a yaml file
             url = rules
             container = DocumentWithURL(doc, rules)
         else:
             container = DocumentWithRules(doc, rules)
-        return self._extract(container.to_JSON())
+        return self._extract(container.to_JSON(), rules, documents=[doc] if (rebind or isinstance(doc, DocumentView)) else None)
+
+    def _prefilter_for(self, rules, prefilter):
+        """
+        Resolves the `prefilter` argument of an extraction method.
+        """
+        if prefilter is not True:
+            return prefilter or None
+        if OdinAPI.valid_rule_url(rules):
+            return None
+        if rules not in self._prefilters:
+            # requires pyyaml
+            from .rules import RulePrefilter
+            self._prefilters[rules] = RulePrefilter(rules)
+        return self._prefilters[rules]
+
+    @staticmethod
+    def _apply_prefilter(doc, prefilter):
+        """
+        The part of `doc` worth sending to the server (either `doc` itself or a `processors.ds.DocumentView`), or None if `prefilter` excludes every sentence.
+        """
+        if prefilter is None or prefilter.accepts_all:
+            return doc
+        indices = prefilter.sentences(doc)
+        if not indices:
+            return None
+        if len(indices) == doc.size or prefilter.cross_sentence:
+            return doc
+        return doc.view(indices)
+
+    @staticmethod
+    def _rules_fields(rules):
+        """
+        The (pre-serialized) rules field of a request.
+        """
+        return {"url" if OdinAPI.valid_rule_url(rules) else "rules": json.dumps(rules)}
+
+    @staticmethod
+    def _request(fields):
+        """
+        Assembles a request from pre-serialized fields.  Equivalent to the `to_JSON` of the corresponding container (ex. `DocumentWithRules`).
+        """
+        return "{{{}}}".format(", ".join("{}: {}".format(json.dumps(k), fields[k]) for k in sorted(fields)))
+
+    def _extract_many(self, payloads, rules, max_in_flight, ordered, addresses):
+        services = ["{}/api/odin/extract".format(address) for address in addresses] if addresses else [self._service]
 
+        def extract(task):
+            (i, (json_data, documents)) = task
+            if json_data is None:
+                # excluded by a prefilter
+                return []
+            # distribute requests across servers (favoring those with free slots)
+            return self._extract(json_data, rules, service=AdaptiveConcurrency.choose(services, i), documents=documents)
 
-class OpenIEAPI(object):
+        results = concurrent_map(extract, enumerate(payloads), max_in_flight=max_in_flight, ordered=ordered)
+        for (i, mentions) in results:
+            yield mentions if ordered else (i, mentions)
+
+    def extract_from_document_sharded(self, doc, rules, workers=4, addresses=None, costs=None):
+        """
+        Splits `rules` into independent shards (see `processors.rules.OdinGrammar.shards`) and applies them to `doc` concurrently.
+        Rules that consume the mentions of other rules are kept in the same shard (with their priorities), so the merged mentions match those of a single request.
+        If the dependencies between rules can't be determined locally (ex. the grammar has `import`s), `rules` are sent as a single shard.
+        Requires `pyyaml`.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            `rules` will be applied to this `processors.ds.Document`.  It is serialized once for all shards.
+        rules : str
+            Odin rules provided as a `yaml` string.
+        workers : int
+            The maximum number of shards (and concurrent requests).
+        addresses : [str] or None
+            The base addresses of several servers.  Shards are distributed across them in turn, favoring servers with free slots (see `processors.utils.AdaptiveConcurrency`).  None uses this API's server.
+        costs : dict or None
+            rule name -> cost used to balance the shards (ex. `marginal_seconds` from `processors.rules.RuleProfiler`).
+
+        Returns
+        -------
+        [processors.odin.Mention] or None
+            The mentions of all shards (attached to `doc`), without duplicate ids.  None if any shard fails.
+        """
+        if OdinAPI.valid_rule_url(rules):
+            raise ValueError("Rules provided as a url can't be sharded")
+        from .rules import OdinGrammar
+        grammar = OdinGrammar(rules)
+        shards = [grammar.subset(names) for names in grammar.shards(workers, costs=costs)] if grammar.resolvable else [rules]
+        document = json.dumps(doc.to_JSON_dict(), sort_keys=True)
+        services = ["{}/api/odin/extract".format(address) for address in addresses] if addresses else [self._service]
+
+        def extract(task):
+            (i, shard) = task
+            json_data = OdinAPI._request(dict(OdinAPI._rules_fields(shard), document=document))
+            return self._extract(json_data, shard, service=AdaptiveConcurrency.choose(services, i), documents=[doc])
+
+        results = [mentions for (_, mentions) in concurrent_map(extract, enumerate(shards), max_in_flight=max(1, len(shards)))]
+        if any(mentions is None for mentions in results):
+            return None
+        return OdinAPI._merge(results)
+
+    def extract_from_document_parallel(self, doc, rules, group_size=None, max_in_flight=4, addresses=None):
+        """
+        Splits `doc` into groups of consecutive sentences (see `processors.ds.DocumentView`) and applies `rules` to each group concurrently.
+        Only suitable for grammars whose rules never cross sentence boundaries.
+        If the rules can't be analyzed locally (a url, a grammar with `import`s, or `yaml` that can't be parsed as a grammar), they are applied to the whole document instead (see `OdinAPI.extract_from_document`).
+        Requires `pyyaml`.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            `rules` will be applied to this `processors.ds.Document`.
+        rules : str
+            Either Odin rules provided as a `yaml` string, or a url pointing to a `yaml` file of rules.  Rules provided as a `yaml` string may not include cross-sentence rules.
+        group_size : int or None
+            The number of sentences in each group.  None splits `doc` evenly across `max_in_flight` requests.
+        max_in_flight : int
+            The maximum number of concurrent requests.
+        addresses : [str] or None
+            The base addresses of several servers.  Groups are distributed across them in turn, favoring servers with free slots (see `processors.utils.AdaptiveConcurrency`).  None uses this API's server.
+
+        Returns
+        -------
+        [processors.odin.Mention] or None
+            The mentions of all groups, attached to `doc` with sentence indices in `doc`.  None if any group fails.
+            Each mention id is qualified with its sentence index (ex. T:123@4), as ids are only unique within a request.
+        """
+        if not OdinAPI._sentence_local(rules):
+            return self.extract_from_document(doc, rules)
+        if doc.size == 0:
+            return []
+        group_size = group_size or -(-doc.size // max_in_flight)
+        views = [doc.view(range(i, min(i + group_size, doc.size))) for i in range(0, doc.size, group_size)]
+        rules_fields = OdinAPI._rules_fields(rules)
+        services = ["{}/api/odin/extract".format(address) for address in addresses] if addresses else [self._service]
+
+        def extract(task):
+            (i, view) = task
+            json_data = OdinAPI._request(dict(rules_fields, document=json.dumps(view.to_JSON_dict(), sort_keys=True)))
+            return self._extract(json_data, rules, service=AdaptiveConcurrency.choose(services, i), documents=[view], qualify_ids=True)
+
+        results = [mentions for (_, mentions) in concurrent_map(extract, enumerate(views), max_in_flight=max_in_flight)]
+        if any(mentions is None for mentions in results):
+            return None
+        return OdinAPI._merge(results)
+
+    @staticmethod
+    def _sentence_local(rules):
+        """
+        True if `rules` can be analyzed locally and no rule crosses sentence boundaries.  Raises a `ValueError` if a rule is cross-sentence.
+        Rules that are not valid `yaml` (or not a grammar) can't be analyzed, so they are left for the server to report.
+        """
+        if OdinAPI.valid_rule_url(rules):
+            return False
+        # requires pyyaml
+        from .rules import OdinGrammar
+        import yaml
+        try:
+            grammar = OdinGrammar(rules)
+        except (yaml.YAMLError, ValueError):
+            return False
+        if any("import" in rule for rule in grammar.rules):
+            return False
+        if any(rule.get("type", None) == "cross-sentence" for rule in grammar.rules):
+            raise ValueError("Rules with cross-sentence rules can't be applied to groups of sentences")
+        return True
+
+    @staticmethod
+    def _merge(results):
+        """
+        Concatenates lists of mentions, keeping only the first mention with each (doc id, mention id).
+        """
+        seen = set()
+        merged = []
+        for mentions in results:
+            for m in mentions:
+                key = (m._doc_id, m.id)
+                if key not in seen:
+                    seen.add(key)
+                    merged.append(m)
+        return merged
+
+    def extract_from_texts(self, texts, rules, max_in_flight=4, ordered=True, addresses=None):
+        """
+        Concurrently applies `rules` to each of `texts`.  See `OdinAPI.extract_from_documents`.
+        """
+        rules_fields = OdinAPI._rules_fields(rules)
+        payloads = ((OdinAPI._request(dict(rules_fields, text=json.dumps(text))), None) for text in texts)
+        return self._extract_many(payloads, rules, max_in_flight, ordered, addresses)
+
+    def extract_from_documents(self, docs, rules, max_in_flight=4, ordered=True, addresses=None, rebind=False, prefilter=None):
+        """
+        Concurrently sends each of `docs` to the server with rules for information extraction (IE).
+        `rules` are serialized once for the whole batch.
+
+        Parameters
+        ----------
+        docs : iterable of processors.ds.Document
+            `rules` will be applied to each `processors.ds.Document`.  Consumed lazily.
+        rules : str
+            Either Odin rules provided as a `yaml` string, or a url pointing to a `yaml` file of rules.
+        max_in_flight : int
+            The maximum number of concurrent requests.
+        ordered : bool
+            Whether results are yielded in the order of `docs` (True) or as they complete (False).
+        addresses : [str] or None
+            The base addresses of several servers.  Requests are distributed across them in turn, favoring servers with free slots (see `processors.utils.AdaptiveConcurrency`).  None uses this API's server.
+        rebind : bool
+            Whether to attach the mentions to each of `docs` instead of copies decoded from the responses (see `OdinAPI.extract_from_document`).
+        prefilter : processors.rules.RulePrefilter or bool or None
+            If provided, only the sentences that `rules` could match are sent (see `OdinAPI.extract_from_document`).
+
+        Returns
+        -------
+        generator
+            If `ordered`, the output of `OdinAPI.extract_from_document` for each of `docs`.  Otherwise, (index, output) pairs as each request completes.
+        """
+        rules_fields = OdinAPI._rules_fields(rules)
+        prefilter = self._prefilter_for(rules, prefilter)
+
+        def payload(doc):
+            doc = OdinAPI._apply_prefilter(doc, prefilter)
+            if doc is None:
+                return (None, None)
+            json_data = OdinAPI._request(dict(rules_fields, document=json.dumps(doc.to_JSON_dict(), sort_keys=True)))
+            return (json_data, [doc] if (rebind or isinstance(doc, DocumentView)) else None)
+
+        return self._extract_many((payload(doc) for doc in docs), rules, max_in_flight, ordered, addresses)
+
+
+class OpenIEAPI(ExtractionAPI):
+    """
+    API for extracting entities with OpenIE.
+
+    Parameters
+    ----------
+    address : str
+        The base address for the API (i.e., everything preceding `/api/..`)
+    cache : processors.cache.ResultCache or None
+        If provided, results are cached by (endpoint, document, server version).
+    """
 
-    def __init__(self, address):
+    def __init__(self, address, cache=None):
+        super(OpenIEAPI, self).__init__(address, cache=cache)
         self._service = "{}/api/openie/entities/".format(address)
 
     def _extract(self, endpoint, json_data):
@@ -444,7 +777,7 @@ class OpenIEAPI(object):
         """
         # /api/openie/entities/???
         api_endpoint = self._service + endpoint
-        mns_json = post_json(api_endpoint, json_data)
+        mns_json = self._post(api_endpoint, json_data)
         if "error" in mns_json:
             error_msg = mns_json["error"]
             print(error_msg)
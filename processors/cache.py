@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from .utils import full_path
+from collections import defaultdict, OrderedDict
+import threading
+import hashlib
+import sqlite3
+import json
+import time
+import zlib
+import os
+
+
+class ResultCache(object):
+    """
+    An opt-in, persistent cache of extraction results (ex. for `processors.api.OdinAPI` and `processors.api.OpenIEAPI`).
+
+    Results are keyed on (endpoint, request fingerprint, rules, server version), where the request fingerprint covers the `Document` (or text) and rules sent to the server.
+    The mention JSON returned by the server is stored zlib-compressed in a sqlite database.  Once the cache exceeds `max_bytes`, the least recently used results are evicted.
+
+    Parameters
+    ----------
+    path : str or None
+        The path of the sqlite database.  None keeps the cache in memory.
+    max_bytes : int
+        The maximum total size (compressed) of the cached results.
+
+    Attributes
+    ----------
+    size : int
+        The total size (compressed) of the cached results.
+
+    Methods
+    -------
+    rules_id(rules)
+        A short identifier for `rules` (a url or a hash of the yaml).
+    get(endpoint, request, rules, server_version)
+        Retrieves the cached mention JSON for a request.
+    put(endpoint, request, rules, server_version, jdict)
+        Stores the mention JSON for a request.
+    stats()
+        Hits, misses, and hit rate for each set of rules.
+    clear()
+        Removes all cached results.
+    """
+
+    MAX_BYTES = 256 * 1024 * 1024
+    # number of least recently used results removed at a time
+    EVICTION_BATCH = 100
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES):
+        self.path = full_path(path) if path else ":memory:"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, rules TEXT, data BLOB, size INTEGER, accessed REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._connection.commit()
+        # tracked incrementally, so eviction doesn't scan the table
+        self._size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+
+    @staticmethod
+    def _hash(*parts):
+        h = hashlib.sha1()
+        for part in parts:
+            h.update((part if part is not None else "").encode("utf-8"))
+            # separator
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    @staticmethod
+    def rules_id(rules):
+        """
+        A short identifier for `rules`.  A url (see `processors.api.OdinAPI.valid_rule_url`) is its own id.  Otherwise, the id is a hash of the yaml.
+        """
+        if not rules:
+            return ""
+        from .api import OdinAPI
+        return rules if OdinAPI.valid_rule_url(rules) else "sha1:{}".format(ResultCache._hash(rules)[:16])
+
+    def _key(self, endpoint, request, rules, server_version):
+        return ResultCache._hash(endpoint, ResultCache._hash(request), ResultCache.rules_id(rules), server_version)
+
+    @property
+    def size(self):
+        with self._lock:
+            return self._size
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, endpoint, request, rules, server_version):
+        """
+        Retrieves the cached mention JSON for a request.
+
+        Parameters
+        ----------
+        endpoint : str
+            The service the request is sent to.
+        request : str
+            The JSON sent to `endpoint`.
+        rules : str or None
+            The Odin rules (yaml or a url) included in the request.
+        server_version : str or None
+            The version of processors-server.
+
+        Returns
+        -------
+        dict or None
+            The mention JSON, or None if the result is not cached.
+        """
+        key = self._key(endpoint, request, rules, server_version)
+        rules_id = ResultCache.rules_id(rules)
+        with self._lock:
+            row = self._connection.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses[rules_id] += 1
+                return None
+            self._hits[rules_id] += 1
+            self._connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, endpoint, request, rules, server_version, jdict):
+        """
+        Stores the mention JSON (`jdict`) for a request (see `ResultCache.get`), evicting the least recently used results if the cache exceeds `max_bytes`.
+        """
+        key = self._key(endpoint, request, rules, server_version)
+        data = zlib.compress(json.dumps(jdict, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            row = self._connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._size += len(data) - (row[0] if row else 0)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO results (key, rules, data, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, ResultCache.rules_id(rules), sqlite3.Binary(data), len(data), time.time())
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT key, size FROM results ORDER BY accessed ASC LIMIT ?", (ResultCache.EVICTION_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            evicted = []
+            for (key, size) in rows:
+                if self._size <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                self._size -= size
+            self._connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def stats(self):
+        """
+        Hits, misses, and hit rate for each set of rules (see `ResultCache.rules_id`) since this cache was opened.
+
+        Returns
+        -------
+        dict
+            rules id -> {"hits": int, "misses": int, "hit_rate": float}
+        """
+        with self._lock:
+            rules = set(self._hits) | set(self._misses)
+            res = dict()
+            for r in rules:
+                (hits, misses) = (self._hits[r], self._misses[r])
+                res[r] = {"hits": hits, "misses": misses, "hit_rate": hits / float(hits + misses)}
+            return res
+
+    def clear(self):
+        """
+        Removes all cached results and resets the statistics.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM results")
+            self._connection.commit()
+            self._size = 0
+            self._hits.clear()
+            self._misses.clear()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SentimentCache(object):
+    """
+    A bounded (LRU) cache of sentiment scores for individual sentences or segments (see `processors.sentiment.SentimentAnalyzer`).
+
+    Scores are keyed on (endpoint, server version, fingerprint), where the fingerprint is a hash of a sentence's words (or of a segment's text).
+    Once the cache holds `max_size` scores, the least recently used score is evicted.
+
+    Parameters
+    ----------
+    max_size : int
+        The maximum number of cached scores.
+    path : str or None
+        A json file used to persist the cache (see `SentimentCache.save`).  Scores are loaded from `path` if it exists.
+
+    Attributes
+    ----------
+    hits : int
+        The number of scores retrieved from the cache.
+    misses : int
+        The number of scores not found in the cache.
+    evictions : int
+        The number of scores evicted from the cache.
+
+    Methods
+    -------
+    fingerprint(data)
+        The fingerprint of a `processors.ds.Sentence` or str.
+    get(endpoint, server_version, fingerprint)
+        Retrieves a cached score (or None).
+    put(endpoint, server_version, fingerprint, score)
+        Stores a score.
+    stats()
+        Hits, misses, evictions, hit rate, and size.
+    save(path=None)
+        Writes the cache to a json file.
+    """
+
+    MAX_SIZE = 100000
+
+    def __init__(self, max_size=MAX_SIZE, path=None):
+        self.max_size = max_size
+        self.path = full_path(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as f:
+                for (key, score) in json.load(f):
+                    self._scores[key] = score
+            self._evict()
+
+    def __len__(self):
+        return len(self._scores)
+
+    @staticmethod
+    def fingerprint(data):
+        """
+        The fingerprint of a `processors.ds.Sentence` (a hash of its words) or of a str (a hash of the text).
+        """
+        if hasattr(data, "words"):
+            return ResultCache._hash("s", *data.words)
+        return ResultCache._hash("t", data)
+
+    @staticmethod
+    def _key(endpoint, server_version, fingerprint):
+        return ResultCache._hash(endpoint, server_version, fingerprint)
+
+    def get(self, endpoint, server_version, fingerprint):
+        """
+        Retrieves a cached score, or None if it is not cached.
+        """
+        key = SentimentCache._key(endpoint, server_version, fingerprint)
+        with self._lock:
+            score = self._scores.pop(key, None)
+            if score is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # most recently used
+            self._scores[key] = score
+            return score
+
+    def put(self, endpoint, server_version, fingerprint, score):
+        """
+        Stores a score, evicting the least recently used score if the cache is full.  None is never stored.
+        """
+        if score is None:
+            return
+        key = SentimentCache._key(endpoint, server_version, fingerprint)
+        with self._lock:
+            self._scores.pop(key, None)
+            self._scores[key] = score
+            self._evict()
+
+    def _evict(self):
+        while len(self._scores) > self.max_size:
+            self._scores.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Hits, misses, evictions, hit rate, and size of the cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / float(lookups) if lookups else 0.0,
+                "size": len(self._scores)
+            }
+
+    def save(self, path=None):
+        """
+        Writes the cache (in LRU order) to a json file.  Defaults to the `path` the cache was created with.
+        """
+        path = full_path(path) if path else self.path
+        if not path:
+            raise ValueError("A path is required to save the cache")
+        with self._lock:
+            items = list(self._scores.items())
+        tmp = "{}.tmp".format(path)
+        with open(tmp, "w") as f:
+            json.dump(items, f)
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from processors.annotators import SegmentedMessage
+from processors.ds import Document
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import logging
+import time
+try:
+    import queue
+except ImportError:
+    # python 2.7
+    import Queue as queue
+
+
+class _Request(object):
+    """
+    A distinct request pending in a `CoalescingDispatcher`, with the `Future` of each caller waiting on it.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.futures = []
+        self.sent = False
+
+
+class CoalescingDispatcher(object):
+    """
+    Coalesces concurrent calls to `processors.annotators.Processor.annotate_from_sentences` into batched requests.
+
+    Requests arriving within `window` seconds of the first request in a batch are sent together as a single `processors.annotators.SegmentedMessage`.
+    The annotated `Document` is then split back into one `Document` per caller, with character offsets rebased so that each matches a direct call to `annotate_from_sentences`.
+    Identical requests that are pending or in flight share a single response (and a single `Document`), but each caller receives its own `Future`.
+
+    Parameters
+    ----------
+    processor : processors.annotators.Processor
+        The processor used to annotate each batch (ex. `api.fastnlp`).
+    window : float
+        The number of seconds to wait for more requests after the first request in a batch.
+    max_batch : int
+        The maximum number of distinct requests in a batch.
+    max_in_flight : int
+        The maximum number of batches sent concurrently.
+
+    Attributes
+    ----------
+    stats : dict
+        "requests" (calls received), "shared" (calls answered by an identical pending request), "batches" (batched requests sent), and "fallbacks" (batches retried one request at a time).
+
+    Methods
+    -------
+    annotate_from_sentences(sentences, timeout=None)
+        Annotates `sentences` as part of a batch.  Blocks until the batch is annotated.
+    submit(sentences)
+        Adds `sentences` to a batch, returning a `concurrent.futures.Future` for its `Document`.
+    close()
+        Sends any pending requests and stops the dispatcher.
+    """
+
+    WINDOW = 0.005
+    MAX_BATCH = 32
+
+    def __init__(self, processor, window=WINDOW, max_batch=MAX_BATCH, max_in_flight=4):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.processor = processor
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {"requests": 0, "shared": 0, "batches": 0, "fallbacks": 0}
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue()
+        self._pending = dict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._worker = None
+        self._closed = False
+
+    def annotate_from_sentences(self, sentences, timeout=None):
+        """
+        Annotates text that has already been segmented into `sentences`, as part of a batch.
+
+        Parameters
+        ----------
+        sentences : [str]
+            A list of str representing text already split into sentences.
+        timeout : float or None
+            The maximum number of seconds to wait.  None waits until the batch is annotated.
+
+        Returns
+        -------
+        processors.ds.Document or None
+            An annotated `Document` composed of `sentences` (None if annotation failed).
+        """
+        future = self.submit(sentences)
+        try:
+            return future.result(timeout)
+        except Exception:
+            future.cancel()
+            return None
+
+    def submit(self, sentences):
+        """
+        Adds `sentences` to the next batch.  If an identical request is pending or in flight, the caller shares its response.
+
+        Each caller receives its own `Future`, so cancelling one does not affect the others.
+        A `Future` can be cancelled until its batch is sent.  A request whose callers have all cancelled is left out of its batch.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            Resolves to the annotated `processors.ds.Document`.
+        """
+        key = tuple(sentences)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise ValueError("CoalescingDispatcher is closed")
+            self.stats["requests"] += 1
+            request = self._pending.get(key, None)
+            if request is None:
+                request = _Request(key)
+                self._pending[key] = request
+                # enqueue under the lock, so that close() can't stop the worker before the request is queued
+                self._queue.put(request)
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run)
+                    self._worker.daemon = True
+                    self._worker.start()
+            else:
+                self.stats["shared"] += 1
+            if request.sent:
+                # the batch has already been sent
+                future.set_running_or_notify_cancel()
+            request.futures.append(future)
+        return future
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopped = True
+                    break
+                batch.append(item)
+            self._executor.submit(self._dispatch, batch)
+
+    def _take(self, batch):
+        """
+        Marks the requests in `batch` as sent, dropping cancelled callers and any request with no callers left.
+        """
+        taken = []
+        with self._lock:
+            for request in batch:
+                request.sent = True
+                request.futures = [f for f in request.futures if f.set_running_or_notify_cancel()]
+                if request.futures:
+                    taken.append(request)
+                else:
+                    del self._pending[request.key]
+            if taken:
+                self.stats["batches"] += 1
+        return taken
+
+    def _resolve(self, request, doc=None, error=None):
+        with self._lock:
+            del self._pending[request.key]
+            futures = request.futures
+        for future in futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(doc)
+
+    def _dispatch(self, batch):
+        batch = self._take(batch)
+        if not batch:
+            return
+        keys = [request.key for request in batch]
+        try:
+            segments = [segment for key in keys for segment in key]
+            jdict = self.processor._message_to_json_dict(SegmentedMessage(segments))
+            docs = CoalescingDispatcher._split(jdict, keys)
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch[0], error=e)
+                return
+            # isolate the request(s) responsible for the failure
+            self.logger.debug("Batch of {} requests failed ({}).  Retrying each request.".format(len(batch), e))
+            with self._lock:
+                self.stats["fallbacks"] += 1
+            for request in batch:
+                try:
+                    doc = self.processor._annotate_message(SegmentedMessage(list(request.key)))
+                except Exception as error:
+                    self._resolve(request, error=error)
+                    continue
+                self._resolve(request, doc)
+            return
+        for (request, doc) in zip(batch, docs):
+            self._resolve(request, doc)
+
+    @staticmethod
+    def _split(jdict, keys):
+        """
+        Splits the document JSON for a batch into one `Document` per request, rebasing character offsets to the start of each request.
+        """
+        sentences = jdict["sentences"]
+        if len(sentences) != sum(len(key) for key in keys):
+            raise ValueError("Expected {} sentences, but received {}".format(sum(len(key) for key in keys), len(sentences)))
+        text = jdict.get("text", None) or ""
+        docs = []
+        (i, position) = (0, 0)
+        for key in keys:
+            sents = sentences[i:i + len(key)]
+            i += len(key)
+            # locate the request in the text of the batch
+            start = text.find(key[0], position) if key else -1
+            end = text.find(key[-1], start) + len(key[-1]) if start >= 0 else -1
+            if start < 0 or end < len(key[-1]):
+                start = sents[0]["startOffsets"][0] if sents and sents[0]["startOffsets"] else 0
+                doc_text = " ".join(key)
+            else:
+                doc_text = text[start:end]
+                position = end
+            rebased = []
+            for s in sents:
+                s = dict(s)
+                s["startOffsets"] = [offset - start for offset in s["startOffsets"]]
+                s["endOffsets"] = [offset - start for offset in s["endOffsets"]]
+                rebased.append(s)
+            docs.append(Document.load_from_JSON({"sentences": rebased, "text": doc_text}))
+        return docs
+
+    def close(self):
+        """
+        Sends any pending requests and stops the dispatcher.
+        """
+        with self._lock:
+            self._closed = True
+            worker = self._worker
+            if worker is not None:
+                self._queue.put(None)
+        if worker is not None:
+            worker.join()
+        self._executor.shutdown(wait=True)
@@ -6,6 +6,7 @@
 from __future__ import unicode_literals
 from itertools import chain
 from collections import defaultdict, Counter
+from bisect import bisect_left, bisect_right
 from processors.paths import DependencyUtils, HeadFinder
 from processors.utils import LabelManager
 import networkx as nx
@@ -79,6 +80,9 @@ class Document(NLPDatum):
 
     bag_of_unlabeled_dependencies_using(form)
         Produces a list of syntactic dependencies where each edge is left unlabeled without its grammatical relation.
+
+    view(indices)
+        Produces a `processors.ds.DocumentView` over the sentences at `indices`.
     """
 
     def __init__(self, sentences):
@@ -145,6 +149,12 @@ class Document(NLPDatum):
             doc_dict["id"] = self.id
         return doc_dict
 
+    def view(self, indices):
+        """
+        Produces a `processors.ds.DocumentView` over the sentences at `indices`.  See `DocumentView`.
+        """
+        return DocumentView(self, indices)
+
     @staticmethod
     def load_from_JSON(json_dict):
         sentences = []
@@ -168,6 +178,58 @@ class Document(NLPDatum):
         return doc
 
 
+class DocumentView(Document):
+
+    """
+    A `Document` over a subset of the sentences of another `Document` (the `parent`).
+    `Sentence` objects are shared with the parent (not copied), so a view is cheap to build.
+
+    Sending a view to Odin (see `processors.api.OdinAPI.extract_from_document`) transmits only its sentences,
+    and the resulting mentions are attached to the parent with their sentence indices mapped back to the parent.
+
+    Parameters
+    ----------
+    parent : processors.ds.Document
+        The `Document` to view.  The view of a view is a view of the original `Document`.
+    indices : [int]
+        The indices (in `parent`) of the sentences to include.  Sentences keep their order in `parent`.
+
+    Attributes
+    ----------
+    parent : processors.ds.Document
+        The viewed `Document`.
+    indices : [int]
+        The parent index of each sentence in the view.
+
+    Methods
+    -------
+    to_parent(i)
+        The index in `parent` of the view's sentence `i`.
+    """
+
+    def __init__(self, parent, indices):
+        if isinstance(parent, DocumentView):
+            indices = [parent.indices[i] for i in indices]
+            parent = parent.parent
+        self.parent = parent
+        self.indices = sorted(set(indices))
+        if any(i < 0 or i >= parent.size for i in self.indices):
+            raise ValueError("indices must be between 0 and {}".format(parent.size - 1))
+        Document.__init__(self, [parent.sentences[i] for i in self.indices])
+        # character offsets refer to the parent's text
+        self.id = parent.id
+        self.text = parent.text
+
+    def __str__(self):
+        return "DocumentView w/ {} of {} Sentence{}".format(self.size, self.parent.size, "" if self.parent.size == 1 else "s")
+
+    def to_parent(self, i):
+        """
+        The index in `parent` of the view's sentence `i`.
+        """
+        return self.indices[i]
+
+
 class Sentence(NLPDatum):
 
     """
@@ -248,6 +310,12 @@ class Sentence(NLPDatum):
 
     bag_of_unlabeled_dependencies_using(form)
         Produces a list of syntactic dependencies where each edge is left unlabeled without its grammatical relation.
+
+    ne_intervals()
+        Produces a dictionary of NE labels -> a list of the `processors.ds.Interval` (token span) of each entity.
+
+    phrase_intervals()
+        Produces a dictionary of chunk labels -> a list of the `processors.ds.Interval` (token span) of each phrase.
     """
 
     UNKNOWN = LabelManager.UNKNOWN
@@ -359,6 +427,41 @@ class Sentence(NLPDatum):
         # this might be empty
         return entity_dict
 
+    @staticmethod
+    def _iob_intervals(iob):
+        """
+        Groups consecutive tokens in IOB notation into labeled token spans.
+        A B- prefix always starts a new span.
+        """
+        intervals = defaultdict(list)
+        current = None
+        start = None
+        for (i, tok) in enumerate(list(iob) + [Sentence.O]):
+            tok = str(tok)
+            label = re.sub('^(B-|I-)', '', tok)
+            continues = label == current and not tok.startswith("B-")
+            if current is not None and not continues:
+                intervals[current].append(Interval(start, i))
+                current = None
+            if current is None and tok not in (Sentence.O, Sentence.UNKNOWN):
+                current = label
+                start = i
+        return intervals
+
+    def ne_intervals(self):
+        """
+        Produces a dictionary of NE labels -> a list of the `processors.ds.Interval` (token span) of each entity.
+        Built from `Sentence._entities`.
+        """
+        return Sentence._iob_intervals(self._entities)
+
+    def phrase_intervals(self):
+        """
+        Produces a dictionary of chunk labels -> a list of the `processors.ds.Interval` (token span) of each phrase.
+        Built from `Sentence._chunks`.
+        """
+        return Sentence._iob_intervals(self._chunks)
+
     def _build_directed_graph_from_dict(self, graphs):
         deps_dict = dict()
         if graphs and len(graphs) > 0:
@@ -516,6 +619,14 @@ class DirectedGraph(NLPDatum):
         Produces a list of syntactic dependencies where each edge is labeled with its grammatical relation.
     bag_of_unlabeled_dependencies_from_tokens(form)
         Produces a list of syntactic dependencies where each edge is left unlabeled without its grammatical relation.
+    subtree_index()
+        Builds (once) and returns a `processors.ds.SubtreeIndex` for dominance queries.
+    dominates(head, token)
+        Test whether `token` is in the subtree headed by `head`.
+    subtree(head)
+        The sorted token indices in the subtree headed by `head`.
+    subtree_span(head)
+        The `processors.ds.Interval` covering the subtree headed by `head`.
     """
     STANFORD_BASIC_DEPENDENCIES = "stanford-basic"
     STANFORD_COLLAPSED_DEPENDENCIES = "stanford-collapsed"
@@ -532,6 +643,8 @@ class DirectedGraph(NLPDatum):
         self.unlabeled = self._build_unlabeled()
         self.directed_graph = DependencyUtils.build_networkx_graph(roots=self.roots, edges=self.edges, name=self.kind, reverse=False)
         self.undirected_graph = self.directed_graph.to_undirected()
+        # built on demand (see subtree_index)
+        self._subtree_index = None
 
     def __unicode__(self):
         return self.edges
@@ -548,6 +661,44 @@ class DirectedGraph(NLPDatum):
     def __hash__(self):
         return hash(self.to_JSON())
 
+    def subtree_index(self):
+        """
+        Builds (once) and returns a `processors.ds.SubtreeIndex` for constant-time dominance queries.
+        """
+        if self._subtree_index is None:
+            self._subtree_index = SubtreeIndex(self)
+        return self._subtree_index
+
+    def dominates(self, head, token):
+        """
+        Test whether `token` is in the subtree headed by `head` (a token dominates itself).
+
+        See Also
+        --------
+        `processors.ds.SubtreeIndex.dominates`
+        """
+        return self.subtree_index().dominates(head, token)
+
+    def subtree(self, head):
+        """
+        The sorted token indices in the subtree headed by `head`.
+
+        See Also
+        --------
+        `processors.ds.SubtreeIndex.subtree`
+        """
+        return self.subtree_index().subtree(head)
+
+    def subtree_span(self, head):
+        """
+        The `processors.ds.Interval` covering the subtree headed by `head`.
+
+        See Also
+        --------
+        `processors.ds.SubtreeIndex.span`
+        """
+        return self.subtree_index().span(head)
+
     def shortest_paths(self, start, end):
         """
         Find the shortest paths in the syntactic depedency graph
@@ -683,6 +834,140 @@ class DirectedGraph(NLPDatum):
         return {self.kind:self._graph_to_JSON_dict()}
 
 
+class SubtreeIndex(object):
+    """
+    Precomputed dominance (ancestor) relations and subtree spans for a `processors.ds.DirectedGraph`.
+
+    When the graph is a forest (every token has at most one head and there are no cycles), an Euler tour over the root tree(s) assigns each token an entry and exit time so that ancestor checks are O(1).
+    Subtree spans are computed bottom-up during the same traversal.
+    Graphs that are not forests (ex. collapsed dependencies with multiple heads or cycles) fall back to reachability via `DirectedGraph.outgoing`, which is computed once per head and cached.
+
+    Parameters
+    ----------
+    graph : processors.ds.DirectedGraph
+        The graph to index.
+
+    Attributes
+    ----------
+    size : int
+        The number of tokens covered by the index.
+
+    is_tree : bool
+        Whether or not the graph is a forest (i.e., whether the Euler tour index is used).
+
+    Methods
+    -------
+    dominates(head, token)
+        Test whether `token` is in the subtree headed by `head`.
+    subtree(head)
+        The sorted token indices in the subtree headed by `head`.
+    span(head)
+        The `processors.ds.Interval` covering the subtree headed by `head`.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        nodes = set(chain(*[(e.source, e.destination) for e in graph.edges]))
+        self.size = max([len(graph._words)] + [i + 1 for i in nodes])
+        self._descendants = dict()
+        self.is_tree = self._build_euler_tour()
+
+    def _build_euler_tour(self):
+        """
+        Assigns entry/exit times and subtree spans.  Returns False if the graph is not a forest.
+        """
+        outgoing = self.graph.outgoing
+        if any(len(self.graph.incoming.get(i, [])) > 1 for i in range(self.size)):
+            return False
+        # every token without a head starts a tree (this includes isolated tokens such as punctuation)
+        roots = [i for i in range(self.size) if not self.graph.incoming.get(i, [])]
+        tin = [None] * self.size
+        tout = [None] * self.size
+        starts = list(range(self.size))
+        ends = [i + 1 for i in range(self.size)]
+        clock = 0
+        for root in roots:
+            tin[root] = clock
+            clock += 1
+            stack = [(root, iter(outgoing.get(root, [])))]
+            while stack:
+                (node, children) = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    tout[node] = clock
+                    clock += 1
+                    if stack:
+                        parent = stack[-1][0]
+                        starts[parent] = min(starts[parent], starts[node])
+                        ends[parent] = max(ends[parent], ends[node])
+                    continue
+                (dest, _) = child
+                tin[dest] = clock
+                clock += 1
+                stack.append((dest, iter(outgoing.get(dest, []))))
+        # a cycle leaves some tokens unreachable from any root
+        if any(t is None for t in tin):
+            return False
+        self._tin = tin
+        self._tout = tout
+        self._starts = starts
+        self._ends = ends
+        return True
+
+    def _reachable(self, head):
+        if head not in self._descendants:
+            outgoing = self.graph.outgoing
+            seen = {head}
+            stack = [head]
+            while stack:
+                node = stack.pop()
+                for (dest, _) in outgoing.get(node, []):
+                    if dest not in seen:
+                        seen.add(dest)
+                        stack.append(dest)
+            self._descendants[head] = frozenset(seen)
+        return self._descendants[head]
+
+    def dominates(self, head, token):
+        """
+        Test whether `token` is in the subtree headed by `head`.  A token dominates itself.
+
+        Parameters
+        ----------
+        head : int
+            The token index of the subtree's head.
+        token : int
+            The token index to check.
+
+        Returns
+        -------
+        bool
+            True if `token` is reachable from `head` via outgoing edges.
+        """
+        if self.is_tree:
+            return self._tin[head] <= self._tin[token] and self._tout[token] <= self._tout[head]
+        return token in self._reachable(head)
+
+    def subtree(self, head):
+        """
+        The sorted token indices in the subtree headed by `head` (including `head`).
+        """
+        if self.is_tree:
+            return [i for i in range(self._starts[head], self._ends[head]) if self.dominates(head, i)]
+        return sorted(self._reachable(head))
+
+    def span(self, head):
+        """
+        The `processors.ds.Interval` covering the subtree headed by `head`.
+        Note that the subtree of a non-projective parse may not cover every token in its span.
+        """
+        if self.is_tree:
+            return Interval(self._starts[head], self._ends[head])
+        reachable = self._reachable(head)
+        return Interval(min(reachable), max(reachable) + 1)
+
+
 class Interval(NLPDatum):
     """
     Defines a token or character span
@@ -698,10 +983,10 @@ class Interval(NLPDatum):
     Methods
     -------
     contains(that)
-        Test whether `that` (int or Interval) overlaps with span of this Interval.
+        Test whether this Interval contains `that` (int or Interval).
 
     overlaps(that)
-        Test whether this Interval contains another.  Equivalent Intervals will overlap.
+        Test whether `that` (int or Interval) overlaps with span of this Interval.  Equivalent Intervals will overlap.
     """
 
     def __init__(self, start, end):
@@ -720,7 +1005,9 @@ class Interval(NLPDatum):
         """
         Checks if this interval contains another (that)
         """
-        if isinstance(that, self.__class__):
+        if isinstance(that, int):
+            return self.start <= that < self.end
+        elif isinstance(that, self.__class__):
             return self.start <= that.start and self.end >= that.end
         else:
             return False
@@ -730,7 +1017,7 @@ class Interval(NLPDatum):
         Checks for overlap.
         """
         if isinstance(that, int):
-            return self.start <= other < self.end
+            return self.start <= that < self.end
         elif isinstance(that, self.__class__):
             return ((that.start <= self.start < that.end) or (self.start <= that.start < self.end))
         else:
@@ -739,3 +1026,130 @@ class Interval(NLPDatum):
     @staticmethod
     def load_from_JSON(json):
         return Interval(start=json["start"], end=json["end"])
+
+
+class IntervalTree(object):
+    """
+    A static (bulk-loaded) interval tree for half-open [start, end) spans.
+
+    Items are sorted by start and stored in an implicit balanced binary tree where each node records the maximum and minimum end in its subtree.
+    Subtrees that can't hold a result are pruned using these bounds, so each query visits O((k + 1) log n) nodes for k results (O(log n) when nothing matches).
+
+    Parameters
+    ----------
+    items : [(int, int, object)]
+        (start, end, value) triples.
+
+    Methods
+    -------
+    overlapping(start, end)
+        The values of all spans overlapping [start, end).
+    containing(start, end)
+        The values of all spans that contain [start, end).
+    within(start, end)
+        The values of all spans contained by [start, end).
+    nearest(start, end)
+        The values of the non-overlapping spans closest to [start, end).
+    """
+
+    def __init__(self, items):
+        items = sorted(items, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.values = [item[2] for item in items]
+        self._max_end = list(self.ends)
+        self._min_end = list(self.ends)
+        self._augment(0, len(items))
+        # for predecessor queries
+        by_end = sorted(range(len(items)), key=lambda i: self.ends[i])
+        self._sorted_ends = [self.ends[i] for i in by_end]
+        self._by_end = by_end
+
+    def __len__(self):
+        return len(self.values)
+
+    def _augment(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for child in (self._augment(lo, mid), self._augment(mid + 1, hi)):
+            if child is not None:
+                self._max_end[mid] = max(self._max_end[mid], self._max_end[child])
+                self._min_end[mid] = min(self._min_end[mid], self._min_end[child])
+        return mid
+
+    def _search(self, lo, hi, prune_left, prune_right, accept, results):
+        """
+        Traverses the implicit tree over [lo, hi), skipping subtrees whose max end fails `prune_left` and right subtrees whose root start fails `prune_right`.
+        """
+        stack = [(lo, hi)]
+        while stack:
+            (lo, hi) = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if prune_left(self._max_end[mid]):
+                continue
+            if accept(self.starts[mid], self.ends[mid]):
+                results.append(mid)
+            stack.append((lo, mid))
+            if not prune_right(self.starts[mid]):
+                stack.append((mid + 1, hi))
+        return [self.values[i] for i in sorted(results)]
+
+    def overlapping(self, start, end):
+        """
+        The values of all spans overlapping [start, end) (sorted by start).
+        """
+        return self._search(0, len(self), lambda max_end: max_end <= start, lambda s: s >= end, lambda s, e: s < end and e > start, [])
+
+    def containing(self, start, end):
+        """
+        The values of all spans that contain [start, end) (sorted by start).
+        """
+        return self._search(0, len(self), lambda max_end: max_end < end, lambda s: s > start, lambda s, e: s <= start and e >= end, [])
+
+    def within(self, start, end):
+        """
+        The values of all spans contained by [start, end) (sorted by start).
+        """
+        # spans starting in [start, end) occupy a contiguous range of the tree
+        (first, last) = (bisect_left(self.starts, start), bisect_left(self.starts, end))
+        results = []
+        stack = [(0, len(self))]
+        while stack:
+            (lo, hi) = stack.pop()
+            # skip subtrees outside the range or whose spans all end after `end`
+            if lo >= hi or hi <= first or lo >= last:
+                continue
+            mid = (lo + hi) // 2
+            if self._min_end[mid] > end:
+                continue
+            if first <= mid < last and self.ends[mid] <= end:
+                results.append(mid)
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+        return [self.values[i] for i in sorted(results)]
+
+    def nearest(self, start, end):
+        """
+        The values of the non-overlapping spans closest to [start, end) (i.e., those ending nearest before `start` and starting nearest after `end`).
+        All spans at the minimum distance are returned.
+        """
+        candidates = []
+        # closest preceding span(s)
+        i = bisect_right(self._sorted_ends, start)
+        if i > 0:
+            gap = start - self._sorted_ends[i - 1]
+            j = bisect_left(self._sorted_ends, self._sorted_ends[i - 1])
+            candidates += [(gap, self._by_end[k]) for k in range(j, i)]
+        # closest following span(s)
+        i = bisect_left(self.starts, end)
+        if i < len(self):
+            gap = self.starts[i] - end
+            j = bisect_right(self.starts, self.starts[i])
+            candidates += [(gap, k) for k in range(i, j)]
+        if not candidates:
+            return []
+        best = min(gap for (gap, _) in candidates)
+        return [self.values[k] for k in sorted(k for (gap, k) in candidates if gap == best)]
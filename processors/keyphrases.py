@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from processors.utils import parallel_map
+import numpy as np
+import logging
+import time
+import re
+
+
+class KeyphraseExtractor(object):
+    """
+    TextRank-style keyphrase extraction over the syntactic dependency graphs of a `processors.ds.Document`.
+
+    Tokens sharing a lemma are merged into a single node, so the graphs of all sentences in a `Document` form one (sparse) graph.
+    PageRank is computed over that graph using vectorized power iteration, and the highest scoring lemmas are expanded to the chunks (see `processors.ds.Sentence.phrase_intervals`) that contain them.
+
+    Parameters
+    ----------
+    valid_tags : set
+        str or regexes for the PoS tags of candidate tokens.  Default is nouns and adjectives.
+    phrase_labels : set
+        The chunk labels used to expand candidate tokens to phrases.  Default is {"NP"}.
+    graph_name : str or None
+        The graph to use.  None uses `processors.ds.Sentence.dependencies`.
+    alpha : float
+        The damping factor for PageRank.
+    max_iter : int
+        The maximum number of power iterations.
+    tol : float
+        Error tolerance used to check convergence (as in `networkx.pagerank`).
+    reverse : bool
+        Whether or not to reverse the direction of each edge (see `processors.ds.DirectedGraph.pagerank`).
+
+    Attributes
+    ----------
+    stats : dict
+        The number of documents, elapsed seconds, and documents per second for the last completed call to `extract_many`.
+
+    Methods
+    -------
+    rank_lemmas(doc)
+        Scores each lemma in `doc` using PageRank.
+    extract(doc, top_n=10)
+        Produces the `top_n` (phrase, score) pairs for `doc`.
+    extract_many(docs, top_n=10, processes=None, chunksize=1)
+        Lazily applies `extract` to each of `docs` using a pool of worker processes.
+    """
+
+    def __init__(self,
+                 valid_tags={r"^N", r"^J"},
+                 phrase_labels={"NP"},
+                 graph_name=None,
+                 alpha=0.85,
+                 max_iter=100,
+                 tol=1e-06,
+                 reverse=True):
+        self.valid_tags = set(valid_tags)
+        self.phrase_labels = set(phrase_labels)
+        self.graph_name = graph_name
+        self.alpha = alpha
+        self.max_iter = max_iter
+        self.tol = tol
+        self.reverse = reverse
+        self.stats = dict()
+        self.logger = logging.getLogger(__name__)
+
+    def _is_valid_tag(self, tag):
+        return any(re.match(pattern, tag) for pattern in self.valid_tags)
+
+    def _graph(self, sentence):
+        if not self.graph_name:
+            return sentence.dependencies
+        return sentence.graphs.get(self.graph_name, None) if sentence.graphs else None
+
+    @staticmethod
+    def _node(sentence, i):
+        lemma = sentence.lemmas[i]
+        return (lemma if lemma != sentence.UNKNOWN else sentence.words[i]).lower()
+
+    def _build_graph(self, doc):
+        """
+        Merges the graphs of all sentences in `doc` into parallel arrays of node ids.
+        """
+        nodes = dict()
+        sources = []
+        destinations = []
+        for s in doc.sentences:
+            ids = [nodes.setdefault(KeyphraseExtractor._node(s, i), len(nodes)) for i in range(s.length)]
+            g = self._graph(s)
+            if g is None:
+                continue
+            for e in g.edges:
+                (src, dst) = (ids[e.destination], ids[e.source]) if self.reverse else (ids[e.source], ids[e.destination])
+                sources.append(src)
+                destinations.append(dst)
+        return (nodes, np.array(sources, dtype=np.int64), np.array(destinations, dtype=np.int64))
+
+    def _pagerank(self, size, sources, destinations):
+        """
+        Power iteration over edge arrays.  Repeated edges increase the weight of a link.
+        """
+        if size == 0:
+            return np.zeros(0)
+        out_degree = np.bincount(sources, minlength=size).astype(np.float64)
+        dangling = out_degree == 0
+        # weight of each edge is 1 / out-degree of its source
+        weights = 1.0 / out_degree[sources] if len(sources) else np.zeros(0)
+        scores = np.full(size, 1.0 / size)
+        for _ in range(self.max_iter):
+            previous = scores
+            flow = np.bincount(destinations, weights=previous[sources] * weights, minlength=size)
+            scores = self.alpha * (flow + previous[dangling].sum() / size) + (1.0 - self.alpha) / size
+            if np.abs(scores - previous).sum() < size * self.tol:
+                break
+        return scores
+
+    def rank_lemmas(self, doc):
+        """
+        Scores each lemma (or lower-cased word, if lemmas are unavailable) in `doc` using PageRank over the merged dependency graph.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            The `Document` to analyze.
+
+        Returns
+        -------
+        dict
+            lemma -> score
+        """
+        (nodes, sources, destinations) = self._build_graph(doc)
+        scores = self._pagerank(len(nodes), sources, destinations)
+        return {node: float(scores[i]) for (node, i) in nodes.items()}
+
+    def _phrase(self, sentence, i, phrases):
+        """
+        The words of the chunk containing token `i`, trimmed to the span of candidate tokens.
+        """
+        span = next((interval for interval in phrases if interval.start <= i < interval.end), None)
+        if not span:
+            return sentence.words[i]
+        candidates = [j for j in range(span.start, span.end) if self._is_valid_tag(sentence.tags[j])]
+        return " ".join(sentence.words[min(candidates):max(candidates) + 1])
+
+    def extract(self, doc, top_n=10):
+        """
+        Produces the `top_n` keyphrases for `doc`.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            The `Document` to analyze.
+        top_n : int
+            The number of keyphrases to return.
+
+        Returns
+        -------
+        [(str, float)]
+            (phrase, score) pairs sorted by descending score.  A phrase is scored using the highest scoring lemma that it contains.
+        """
+        scores = self.rank_lemmas(doc)
+        phrases = dict()
+        for s in doc.sentences:
+            chunks = [interval for (label, intervals) in s.phrase_intervals().items() if label in self.phrase_labels for interval in intervals]
+            for i in range(s.length):
+                if not self._is_valid_tag(s.tags[i]):
+                    continue
+                phrase = self._phrase(s, i, chunks)
+                score = scores[KeyphraseExtractor._node(s, i)]
+                key = phrase.lower()
+                if key not in phrases or phrases[key][1] < score:
+                    phrases[key] = (phrase, score)
+        return sorted(phrases.values(), key=lambda pair: (-pair[1], pair[0]))[:top_n]
+
+    def extract_many(self, docs, top_n=10, processes=None, chunksize=1):
+        """
+        Lazily applies `extract` to each of `docs` using a pool of worker processes.
+        Throughput is logged and stored in `KeyphraseExtractor.stats` once all `docs` are consumed.
+
+        Parameters
+        ----------
+        docs : iterable of processors.ds.Document
+            The documents to analyze.
+        top_n : int
+            The number of keyphrases for each document.
+        processes : int or None
+            The number of worker processes.  None uses one process per CPU.  1 extracts in the current process.
+        chunksize : int
+            The number of documents sent to a worker at a time.
+
+        Returns
+        -------
+        generator
+            For each of `docs` (in order), the output of `KeyphraseExtractor.extract`.
+        """
+        start = time.time()
+        count = 0
+        tasks = ((self, doc, top_n) for doc in docs)
+        for res in parallel_map(_extract_keyphrases, tasks, processes=processes, chunksize=chunksize):
+            count += 1
+            yield res
+        elapsed = time.time() - start
+        self.stats = {
+            "documents": count,
+            "seconds": elapsed,
+            "documents_per_second": count / elapsed if elapsed > 0 else float("inf")
+        }
+        self.logger.info("Extracted keyphrases from {documents} documents in {seconds:.2f}s ({documents_per_second:.1f} documents/s)".format(**self.stats))
+
+    def __getstate__(self):
+        # loggers can't be pickled in python 2
+        state = self.__dict__.copy()
+        del state["logger"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = logging.getLogger(__name__)
+
+
+def _extract_keyphrases(task):
+    (extractor, doc, top_n) = task
+    return extractor.extract(doc, top_n=top_n)
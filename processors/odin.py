@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-from .utils import post_json
-from .ds import Document, Interval, NLPDatum
+from .utils import post_json, is_string
+from .ds import Document, Interval, IntervalTree, NLPDatum
+from collections import defaultdict
+from bisect import bisect_right
 from termcolor import colored
 import re
 import json
@@ -149,7 +151,8 @@ class Mention(NLPDatum):
                 arguments=None,
                 paths=None,
                 keep=True,
-                doc_id=None):
+                doc_id=None,
+                mention_table=None):
 
         NLPDatum.__init__(self)
         self.label = label
@@ -160,15 +163,12 @@ class Mention(NLPDatum):
         self.document = document
         self._doc_id = doc_id or hash(self.document)
         self.sentence = sentence
-        if trigger:
-            # NOTE: doc id is not stored for trigger's json,
-            # as it is assumed to be contained in the same document as its parent
-            trigger.update({"document": self._doc_id})
-            self.trigger = Mention.load_from_JSON(trigger, self._to_document_map())
-        else:
-            self.trigger = None
-        # unpack args
-        self.arguments = {role:[Mention.load_from_JSON(a, self._to_document_map()) for a in args] for (role, args) in arguments.items()} if arguments else None
+        # the trigger and arguments may be Mentions or JSON.
+        # JSON is resolved on first access using a MentionTable shared by all mentions from the same source
+        self._mention_table = mention_table
+        self._trigger = trigger
+        self._arguments = arguments
+        self._unresolved_arguments = arguments is not None
         self.paths = paths
         self.keep = keep
         self.foundBy = foundBy
@@ -182,12 +182,44 @@ class Mention(NLPDatum):
         self.id = None
         self.type = self._set_type()
 
+    @property
+    def trigger(self):
+        if isinstance(self._trigger, dict):
+            self._trigger = self._resolve(self._trigger)
+        return self._trigger
+
+    @trigger.setter
+    def trigger(self, trigger):
+        self._trigger = trigger
+
+    @property
+    def arguments(self):
+        if self._unresolved_arguments:
+            self._arguments = {role:[self._resolve(a) if isinstance(a, dict) else a for a in args] for (role, args) in self._arguments.items()}
+            self._unresolved_arguments = False
+        return self._arguments
+
+    @arguments.setter
+    def arguments(self, arguments):
+        self._arguments = arguments
+        self._unresolved_arguments = arguments is not None
+
+    def _resolve(self, mjson):
+        """
+        Retrieves (or builds) the Mention for `mjson` from the shared `MentionTable`
+        """
+        if self._mention_table is None:
+            self._mention_table = MentionTable(self._to_document_map())
+        # NOTE: doc id is not stored for trigger's json,
+        # as it is assumed to be contained in the same document as its parent
+        return self._mention_table.mention(mjson, default_doc_id=self._doc_id)
+
     def __str__(self):
         return "{}: {}".format(OdinHighlighter.LABEL(self.label), OdinHighlighter.highlight_mention(self))
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return self.to_JSON() == other.to_JSON() and self.document == other.document
         else:
             return False
 
@@ -288,7 +320,7 @@ class Mention(NLPDatum):
         bool
             True if `label_pattern` matches any element in `Mention.labels`
         """
-        return any(re.match(label_pattern, label) for label in self.labels)
+        return LabelMatcher.matches(label_pattern, self.labels)
 
     def _arguments_to_JSON_dict(self):
         return dict((role, [a.to_JSON_dict() for a in args]) for (role, args) in self.arguments.items())
@@ -297,7 +329,19 @@ class Mention(NLPDatum):
         return {role: paths.to_JSON_dict() for (role, paths) in self.paths}
 
     @staticmethod
-    def load_from_JSON(mjson, docs_dict):
+    def load_from_JSON(mjson, docs_dict, mention_table=None):
+        """
+        Builds a Mention from `mjson`.
+
+        Parameters
+        ----------
+        mjson : dict
+            The JSON for the Mention.
+        docs_dict : dict
+            doc id -> `processors.ds.Document`
+        mention_table : processors.odin.MentionTable or None
+            The table used to resolve (and share) the Mention's trigger and arguments.  If None, a new table is used.
+        """
         # recover document
         doc_id = mjson["document"]
         doc = docs_dict[doc_id]
@@ -313,7 +357,8 @@ class Mention(NLPDatum):
             "arguments": mjson.get("arguments", None),
             "paths": mjson.get("paths", None),
             "keep": mjson.get("keep", True),
-            "foundBy": mjson["foundBy"]
+            "foundBy": mjson["foundBy"],
+            "mention_table": mention_table if mention_table is not None else MentionTable(docs_dict)
         }
         m = Mention(**kwargs)
         # set IDs
@@ -328,11 +373,502 @@ class Mention(NLPDatum):
         return {self._doc_id: self.document}
 
     def _set_type(self):
+        # NOTE: checks the unresolved trigger and arguments to avoid building them
         # event mention
-        if self.trigger != None:
+        if self._trigger != None:
             return Mention.EM
         # textbound mention
-        elif self.trigger == None and self.arguments == None:
+        elif self._trigger == None and self._arguments == None:
             return Mention.TBM
         else:
             return Mention.RM
+
+
+class MentionTable(object):
+    """
+    A table of (doc id, mention id) -> `processors.odin.Mention` shared by all mentions deserialized from the same source.
+    Triggers and arguments that appear in many mentions (ex. an entity participating in several events) are built only once and on first access.
+    Mention ids are only unique within a document, so the same id in two documents refers to two different mentions.
+
+    Parameters
+    ----------
+    docs_dict : dict
+        doc id -> `processors.ds.Document`
+
+    Methods
+    -------
+    mention(mjson, default_doc_id=None)
+        Retrieves (or builds) the Mention for `mjson`.
+    """
+
+    def __init__(self, docs_dict):
+        self.documents = docs_dict
+        self._mentions = dict()
+
+    def __len__(self):
+        return len(self._mentions)
+
+    def __contains__(self, key):
+        """
+        Whether the Mention with `key` (a (doc id, mention id) pair) has been built.
+        """
+        return key in self._mentions
+
+    def mention(self, mjson, default_doc_id=None):
+        """
+        Retrieves the Mention with the document and id of `mjson`, building it if it has not yet been seen.
+
+        Parameters
+        ----------
+        mjson : dict
+            The JSON for the Mention.
+        default_doc_id : str or None
+            The doc id to use if `mjson` does not specify one (ex. for triggers).
+
+        Returns
+        -------
+        processors.odin.Mention
+        """
+        if "document" not in mjson:
+            mjson = dict(mjson, document=default_doc_id)
+        mention_id = mjson.get("id", None)
+        key = (mjson["document"], mention_id)
+        if mention_id is not None and key in self._mentions:
+            return self._mentions[key]
+        m = Mention.load_from_JSON(mjson, self.documents, mention_table=self)
+        if mention_id is not None:
+            self._mentions[key] = m
+        return m
+
+
+class MentionIndex(object):
+    """
+    Interval trees over `processors.odin.Mention` for fast overlap and containment queries.
+
+    Token intervals are indexed per (document, sentence) and character offsets are indexed per document.
+    Trees are built on the first query after mentions are added, so bulk loading is O(n log n) and each query is O((k + 1) log n) for k results (see `processors.ds.IntervalTree`).
+
+    Parameters
+    ----------
+    mentions : [processors.odin.Mention] or None
+        Mentions to bulk load.
+
+    Methods
+    -------
+    add(mention)
+        Adds a `Mention` to the index.
+    overlapping(mention, characters=False)
+        The mentions that overlap `mention`.
+    containing(mention, characters=False)
+        The mentions that contain `mention`.
+    within(mention, characters=False)
+        The mentions contained by `mention`.
+    nearest(mention, characters=False)
+        The closest mentions that do not overlap `mention`.
+    find(doc_id, interval, sentence=None, relation="overlapping")
+        Queries the index using an arbitrary span.
+    """
+
+    RELATIONS = {"overlapping", "containing", "within", "nearest"}
+
+    def __init__(self, mentions=None):
+        self._by_sentence = defaultdict(list)
+        self._by_document = defaultdict(list)
+        self._token_trees = dict()
+        self._character_trees = dict()
+        for m in (mentions or []):
+            self.add(m)
+
+    def __len__(self):
+        return sum(len(ms) for ms in self._by_document.values())
+
+    def add(self, mention):
+        """
+        Adds `mention` to the index.
+        """
+        key = (mention._doc_id, mention.sentence)
+        self._by_sentence[key].append(mention)
+        self._by_document[mention._doc_id].append(mention)
+        # invalidate
+        self._token_trees.pop(key, None)
+        self._character_trees.pop(mention._doc_id, None)
+
+    def _tree(self, doc_id, sentence=None):
+        if sentence is None:
+            if doc_id not in self._character_trees:
+                items = [(m.characterStartOffset, m.characterEndOffset, m) for m in self._by_document.get(doc_id, [])]
+                self._character_trees[doc_id] = IntervalTree(items)
+            return self._character_trees[doc_id]
+        key = (doc_id, sentence)
+        if key not in self._token_trees:
+            items = [(m.start, m.end, m) for m in self._by_sentence.get(key, [])]
+            self._token_trees[key] = IntervalTree(items)
+        return self._token_trees[key]
+
+    def find(self, doc_id, interval, sentence=None, relation="overlapping"):
+        """
+        Queries the index using an arbitrary span.
+
+        Parameters
+        ----------
+        doc_id : str
+            The id of the `Document` to search.
+        interval : processors.ds.Interval
+            A token interval (if `sentence` is provided) or a span of character offsets.
+        sentence : int or None
+            The sentence index for a token `interval`.  None means `interval` is a span of character offsets.
+        relation : str
+            One of "overlapping", "containing", "within", or "nearest".
+
+        Returns
+        -------
+        [processors.odin.Mention]
+            The matching mentions sorted by start.
+        """
+        if relation not in MentionIndex.RELATIONS:
+            raise ValueError("relation must be one of {}".format(", ".join(sorted(MentionIndex.RELATIONS))))
+        tree = self._tree(doc_id, sentence)
+        return getattr(tree, relation)(interval.start, interval.end)
+
+    def _query(self, mention, characters, relation):
+        if characters:
+            interval = Interval(mention.characterStartOffset, mention.characterEndOffset)
+            res = self.find(mention._doc_id, interval, relation=relation)
+        else:
+            res = self.find(mention._doc_id, mention.tokenInterval, sentence=mention.sentence, relation=relation)
+        # a mention never matches itself
+        return [m for m in res if m is not mention]
+
+    def overlapping(self, mention, characters=False):
+        """
+        The mentions (other than `mention`) that overlap `mention`.
+
+        Parameters
+        ----------
+        mention : processors.odin.Mention
+            The query.
+        characters : bool
+            Whether to compare character offsets across the whole `Document` rather than token intervals within the same sentence.
+        """
+        return self._query(mention, characters, "overlapping")
+
+    def containing(self, mention, characters=False):
+        """
+        The mentions (other than `mention`) that contain `mention`.  See `MentionIndex.overlapping`.
+        """
+        return self._query(mention, characters, "containing")
+
+    def within(self, mention, characters=False):
+        """
+        The mentions (other than `mention`) contained by `mention`.  See `MentionIndex.overlapping`.
+        """
+        return self._query(mention, characters, "within")
+
+    def nearest(self, mention, characters=False):
+        """
+        The closest mentions that do not overlap `mention`.  See `MentionIndex.overlapping`.
+        """
+        return self._query(mention, characters, "nearest")
+
+
+class MentionConsolidator(object):
+    """
+    Selects the best non-overlapping `processors.odin.Mention` in each sentence.
+
+    Duplicates (same document, sentence, label, token interval, trigger, and arguments) are removed in a single pass.
+    The remaining mentions in each sentence are considered from the highest to the lowest score, and each is kept unless it overlaps a mention already kept.
+    Selection takes O(n log n) per sentence.  Mentions with equal scores are considered in their original order.
+
+    Parameters
+    ----------
+    score : function or None
+        Maps a `Mention` to a sort key (ex. a number or a tuple).  Default is `MentionConsolidator.length` (i.e., longest first).
+        See `MentionConsolidator.label_priority` and `MentionConsolidator.found_by_priority` for alternatives.
+    deduplicate : bool
+        Whether or not to remove duplicates before selection.
+
+    Methods
+    -------
+    consolidate(mentions)
+        Removes duplicates and overlapping mentions.
+    remove_duplicates(mentions)
+        Removes duplicate mentions (keeping the first occurrence).
+    length(mention)
+        Scores a mention by its number of tokens.
+    label_priority(labels)
+        Builds a scoring function that prefers mentions whose labels appear earlier in `labels`.
+    found_by_priority(rules)
+        Builds a scoring function that prefers mentions found by rules appearing earlier in `rules`.
+    """
+
+    def __init__(self, score=None, deduplicate=True):
+        self.score = score or MentionConsolidator.length
+        self.deduplicate = deduplicate
+
+    @staticmethod
+    def length(mention):
+        return mention.end - mention.start
+
+    @staticmethod
+    def label_priority(labels):
+        """
+        Builds a scoring function that prefers mentions whose `Mention.label` appears earlier in `labels`.  Ties are broken by length.
+        Labels not in `labels` have the lowest priority.
+        """
+        return MentionConsolidator._priority(labels, lambda m: m.label)
+
+    @staticmethod
+    def found_by_priority(rules):
+        """
+        Builds a scoring function that prefers mentions whose `Mention.foundBy` appears earlier in `rules`.  Ties are broken by length.
+        Rules not in `rules` have the lowest priority.
+        """
+        return MentionConsolidator._priority(rules, lambda m: m.foundBy)
+
+    @staticmethod
+    def _priority(ranked, key):
+        ranks = {item: len(ranked) - i for (i, item) in enumerate(ranked)}
+        def score(mention):
+            return (ranks.get(key(mention), 0), MentionConsolidator.length(mention))
+        return score
+
+    @staticmethod
+    def _signature(mention):
+        trigger = mention.trigger
+        arguments = mention.arguments or dict()
+        return (
+            mention._doc_id,
+            mention.sentence,
+            mention.label,
+            mention.start,
+            mention.end,
+            (trigger.start, trigger.end) if trigger else None,
+            tuple(sorted((role, a.label, a.sentence, a.start, a.end) for (role, args) in arguments.items() for a in args))
+        )
+
+    def remove_duplicates(self, mentions):
+        """
+        Removes mentions with the same document, sentence, label, token interval, trigger span, and arguments (keeping the first occurrence).
+        """
+        seen = set()
+        unique = []
+        for m in mentions:
+            signature = MentionConsolidator._signature(m)
+            if signature not in seen:
+                seen.add(signature)
+                unique.append(m)
+        return unique
+
+    def _select(self, mentions):
+        """
+        Keeps the highest scoring mentions that do not overlap (by sentence-local token interval) a mention with a higher score.
+        """
+        # sorted is stable, so ties keep their original order
+        ranked = sorted(mentions, key=self.score, reverse=True)
+        kept = _KeptSpans(m.start for m in mentions)
+        selected = []
+        for m in ranked:
+            if kept.add(m.start, m.end):
+                selected.append(m)
+        return selected
+
+    def consolidate(self, mentions):
+        """
+        Removes duplicates and selects non-overlapping mentions in each sentence, preferring those with higher scores.
+
+        Parameters
+        ----------
+        mentions : [processors.odin.Mention]
+            The mentions to consolidate.
+
+        Returns
+        -------
+        [processors.odin.Mention]
+            The kept mentions (in their original order).
+        """
+        mentions = self.remove_duplicates(mentions) if self.deduplicate else list(mentions)
+        by_sentence = defaultdict(list)
+        for m in mentions:
+            by_sentence[(m._doc_id, m.sentence)].append(m)
+        kept = set(id(m) for group in by_sentence.values() for m in self._select(group))
+        return [m for m in mentions if id(m) in kept]
+
+
+class _KeptSpans(object):
+    """
+    A set of non-overlapping [start, end) spans whose starts are drawn from `starts`.
+    Kept starts are counted in a Fenwick tree, so finding the kept spans on either side of a new span (and adding it) takes O(log n).
+    """
+
+    def __init__(self, starts):
+        self.starts = sorted(set(starts))
+        self.size = 0
+        self._counts = [0] * (len(self.starts) + 1)
+        # the largest end of a kept span at each start (None if there is none)
+        self._ends = [None] * len(self.starts)
+
+    def _prefix(self, i):
+        """
+        The number of kept starts among the first `i` starts.
+        """
+        total = 0
+        while i > 0:
+            total += self._counts[i]
+            i -= i & -i
+        return total
+
+    def _increment(self, i):
+        i += 1
+        while i < len(self._counts):
+            self._counts[i] += 1
+            i += i & -i
+
+    def _kth(self, k):
+        """
+        The position (in `starts`) of the kth (1-based) kept start.
+        """
+        i = 0
+        step = 1 << len(self._counts).bit_length()
+        while step:
+            j = i + step
+            if j < len(self._counts) and self._counts[j] < k:
+                i = j
+                k -= self._counts[j]
+            step >>= 1
+        return i
+
+    def add(self, start, end):
+        """
+        Adds [start, end) unless it overlaps a kept span.  Returns True if the span was added.
+        """
+        i = bisect_right(self.starts, start)
+        before = self._prefix(i)
+        # the closest kept span starting at or before `start`, and the closest starting after it
+        if before > 0 and self._ends[self._kth(before)] > start:
+            return False
+        if before < self.size and self.starts[self._kth(before + 1)] < end:
+            return False
+        i -= 1
+        if self._ends[i] is None:
+            self._increment(i)
+            self.size += 1
+            self._ends[i] = end
+        else:
+            self._ends[i] = max(self._ends[i], end)
+        return True
+
+
+class LabelMatcher(object):
+    """
+    Cached label pattern matching for `processors.odin.Mention.matches`.
+
+    Patterns are compiled once, and because many mentions share the same `labels` (i.e., the same hypernym chain),
+    the result for each (pattern, labels) pair is also cached.
+
+    Methods
+    -------
+    compile(label_pattern)
+        Retrieves (or compiles) the regex for `label_pattern`.
+    matches(label_pattern, labels)
+        Test if `label_pattern` matches any element of `labels`.
+    """
+
+    # bounds the size of each cache
+    MAX_SIZE = 10000
+    _patterns = dict()
+    _results = dict()
+
+    @staticmethod
+    def compile(label_pattern):
+        """
+        Retrieves (or compiles) the regex for `label_pattern` (a str or an already compiled regex).
+        """
+        if not is_string(label_pattern):
+            return label_pattern
+        regex = LabelMatcher._patterns.get(label_pattern, None)
+        if regex is None:
+            if len(LabelMatcher._patterns) >= LabelMatcher.MAX_SIZE:
+                LabelMatcher._patterns.clear()
+            regex = re.compile(label_pattern)
+            LabelMatcher._patterns[label_pattern] = regex
+        return regex
+
+    @staticmethod
+    def matches(label_pattern, labels):
+        """
+        Test if `label_pattern` matches (using `re.match`) any element of `labels`.
+        """
+        regex = LabelMatcher.compile(label_pattern)
+        key = (regex.pattern, regex.flags, tuple(labels))
+        res = LabelMatcher._results.get(key, None)
+        if res is None:
+            if len(LabelMatcher._results) >= LabelMatcher.MAX_SIZE:
+                LabelMatcher._results.clear()
+            res = any(regex.match(label) for label in labels)
+            LabelMatcher._results[key] = res
+        return res
+
+
+class LabelIndex(object):
+    """
+    An inverted index of label -> `processors.odin.Mention` built from each `Mention.labels` (i.e., a mention is indexed under its label and all of its hypernyms).
+
+    Parameters
+    ----------
+    mentions : [processors.odin.Mention] or None
+        Mentions to bulk load.
+
+    Attributes
+    ----------
+    labels : set
+        All indexed labels.
+
+    Methods
+    -------
+    add(mention)
+        Adds a `Mention` to the index.
+    with_label(label)
+        The mentions with `label` among their labels.
+    matching(label_pattern)
+        The mentions with a label matching `label_pattern` (see `Mention.matches`).
+    """
+
+    def __init__(self, mentions=None):
+        self.mentions = []
+        self._postings = defaultdict(list)
+        for m in (mentions or []):
+            self.add(m)
+
+    def __len__(self):
+        return len(self.mentions)
+
+    @property
+    def labels(self):
+        return set(self._postings.keys())
+
+    def add(self, mention):
+        """
+        Adds `mention` to the index.
+        """
+        i = len(self.mentions)
+        self.mentions.append(mention)
+        for label in set(mention.labels):
+            self._postings[label].append(i)
+
+    def with_label(self, label):
+        """
+        The mentions (in the order they were added) with `label` among their labels.
+        """
+        return [self.mentions[i] for i in self._postings.get(label, [])]
+
+    def matching(self, label_pattern):
+        """
+        The mentions (in the order they were added) with a label matching `label_pattern`.
+        The pattern is only tested against each distinct label.
+        """
+        regex = LabelMatcher.compile(label_pattern)
+        positions = set()
+        for (label, postings) in self._postings.items():
+            if regex.match(label):
+                positions.update(postings)
+        return [self.mentions[i] for i in sorted(positions)]
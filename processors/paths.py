@@ -1,10 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-from processors.utils import LabelManager
+from processors.utils import LabelManager, parallel_map
 from collections import Counter
 import networkx as nx
 import collections
 import re
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
 
 
 class DependencyUtils(object):
@@ -74,8 +78,8 @@ class DependencyUtils(object):
             None if no paths are found.  Otherwise, a list of lists of (source index, target index) tuples representing path segments.
         """
         # converts single int to [int]
-        start = start if isinstance(start, collections.Iterable) else [start]
-        end = end if isinstance(end, collections.Iterable) else [end]
+        start = start if isinstance(start, Iterable) else [start]
+        end = end if isinstance(end, Iterable) else [end]
         # node list -> edges (i.e., (source, dest) pairs)
         def path_to_edges(g, path):
             return [(path[i], path[i+1]) for i in range(len(path) - 1)]
@@ -121,7 +125,7 @@ class DependencyUtils(object):
             None if no paths are found.  Otherwise, a list of (source index, target index) tuples representing path segments.
         """
         paths = DependencyUtils.shortest_paths(g, start, end)
-        return None if len(shortest_paths) == 0 else max(paths, key=scoring_func)
+        return None if not paths else max(paths, key=scoring_func)
 
     @staticmethod
     def directed_relation(source_idx, destination_idx, relation, deps):
@@ -292,7 +296,7 @@ class DependencyUtils(object):
                     token_constraints.append("lemma=\"{}\"".format(sentence.lemmas[node]))
                 # NE labels
                 if entities and sentence._entities[node] != UNKNOWN:
-                    token_constraints.append("entity=\"{}\"".format(sentence.entity[node]))
+                    token_constraints.append("entity=\"{}\"".format(sentence._entities[node]))
                 # simple tags
                 if simple_tags and sentence.tags[node] != UNKNOWN:
                     token_constraints.append("tag={}".format(DependencyUtils.simplify_tag(sentence.tags[node])))
@@ -392,3 +396,489 @@ class HeadFinder(object):
                     is_valid_tag(sentence.tags[i])]
         # take token with the highest pagerank score
         return remaining[0] if len(remaining) > 0 else None
+
+
+class PathPattern(object):
+    """
+    A compiled Odin-style syntactic dependency path that is evaluated locally (i.e., without a round-trip to the server).
+
+    A pattern is a sequence of hops through a `processors.ds.DirectedGraph`, each optionally followed by a token constraint on the node reached.
+    An optional token constraint may precede the first hop to restrict the nodes where traversal starts.
+    The output of `DependencyUtils.lexicalize_path` (or its `" ".join`) is a valid pattern.
+
+    Hops
+        `>rel` (outgoing) and `<rel` (incoming), where `rel` is a relation name, a "quoted" relation, or a /regex/.  `>>` and `<<` match any outgoing or incoming relation.
+    Token constraints
+        `[field=value]`, where `field` is one of `word`, `lemma`, `tag`, `entity`, `chunk`, `incoming`, or `outgoing` and `value` is a "quoted" string, a bare string, or a /regex/.
+        Constraints can be negated (`!=` or `!`), grouped (`(...)`), and combined using `&` and `|`.
+
+    Parameters
+    ----------
+    pattern : str or [str]
+        The pattern to compile (ex. `[lemma=buy] >nsubj [entity=PERSON]`).
+    graph_name : str or None
+        The name of the graph to traverse.  None uses `processors.ds.Sentence.dependencies`.
+
+    Methods
+    -------
+    match_sentence(sentence)
+        Finds all paths in `sentence` that match the pattern.
+    matches(sentence)
+        Test whether the pattern matches anywhere in `sentence`.
+    find(doc)
+        Finds all paths in a `processors.ds.Document` that match the pattern.
+    find_all(docs, processes=None, chunksize=1)
+        Lazily finds matches in each of `docs` using a pool of worker processes.
+    """
+
+    FIELDS = {"word", "lemma", "tag", "entity", "chunk", "incoming", "outgoing"}
+
+    def __init__(self, pattern, graph_name=None):
+        self.pattern = pattern if not isinstance(pattern, list) else " ".join(pattern)
+        self.graph_name = graph_name
+        self._start, self._steps = PathPattern._compile(self.pattern)
+
+    def __str__(self):
+        return self.pattern
+
+    def __repr__(self):
+        return "PathPattern({})".format(self.pattern)
+
+    def _graph(self, sentence):
+        if not self.graph_name:
+            return sentence.dependencies
+        return sentence.graphs.get(self.graph_name, None) if sentence.graphs else None
+
+    def match_sentence(self, sentence):
+        """
+        Finds all paths in `sentence` that match the pattern.
+
+        Parameters
+        ----------
+        sentence : processors.ds.Sentence
+            The `Sentence` to search.
+
+        Returns
+        -------
+        [(int)]
+            A list of matching paths.  Each path is a tuple of token indices (one per node visited).
+        """
+        graph = self._graph(sentence)
+        if graph is None:
+            return []
+        paths = [(i,) for i in range(sentence.length) if self._start(sentence, graph, i)]
+        for (direction, relation_matches, constraint) in self._steps:
+            if not paths:
+                break
+            # NOTE: .get avoids adding keys to the defaultdicts
+            adjacency = graph.outgoing if direction == ">" else graph.incoming
+            paths = [path + (j,) \
+                     for path in paths \
+                     for (j, rel) in adjacency.get(path[-1], []) \
+                     if relation_matches(rel) and constraint(sentence, graph, j)]
+        return paths
+
+    def matches(self, sentence):
+        """
+        Test whether the pattern matches anywhere in `sentence`.
+        """
+        return len(self.match_sentence(sentence)) > 0
+
+    def find(self, doc):
+        """
+        Finds all paths in `doc` that match the pattern.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            The `Document` to search.
+
+        Returns
+        -------
+        [(int, (int))]
+            A list of (sentence index, path) pairs.
+        """
+        return [(i, path) for (i, s) in enumerate(doc.sentences) for path in self.match_sentence(s)]
+
+    def find_all(self, docs, processes=None, chunksize=1):
+        """
+        Lazily finds matches in each of `docs` using a pool of worker processes.
+
+        Parameters
+        ----------
+        docs : iterable of processors.ds.Document
+            The documents to search.
+        processes : int or None
+            The number of worker processes.  None uses one process per CPU.  1 searches in the current process.
+        chunksize : int
+            The number of documents sent to a worker at a time.
+
+        Returns
+        -------
+        generator
+            For each of `docs` (in order), the output of `PathPattern.find`.
+        """
+        tasks = ((self.pattern, self.graph_name, doc) for doc in docs)
+        return parallel_map(_find_in_document, tasks, processes=processes, chunksize=chunksize)
+
+    ##########################
+    # compilation
+    ##########################
+
+    @staticmethod
+    def _compile(pattern):
+        start = None
+        steps = []
+        for (kind, value) in PathPattern._tokenize(pattern):
+            if kind == "constraint":
+                constraint = PathPattern._compile_constraint(value)
+                if not steps and start is None:
+                    start = constraint
+                elif steps and steps[-1][2] is None:
+                    steps[-1] = (steps[-1][0], steps[-1][1], constraint)
+                else:
+                    raise ValueError("Token constraints must be separated by a hop in path pattern \"{}\"".format(pattern))
+            else:
+                steps.append((kind, PathPattern._compile_relation(value), None))
+        if start is None and not steps:
+            raise ValueError("Empty path pattern")
+        def any_token(sentence, graph, i): return True
+        return (start or any_token, [(d, r, c or any_token) for (d, r, c) in steps])
+
+    @staticmethod
+    def _scan_until(s, i, closing):
+        # returns the index of the first unescaped `closing` char at or after i
+        while i < len(s):
+            if s[i] == "\\":
+                i += 2
+                continue
+            if s[i] == closing:
+                return i
+            i += 1
+        raise ValueError("Unterminated {} in pattern \"{}\"".format(closing, s))
+
+    @staticmethod
+    def _tokenize(pattern):
+        i = 0
+        n = len(pattern)
+        while i < n:
+            c = pattern[i]
+            if c.isspace():
+                i += 1
+            elif c == "[":
+                # find the closing bracket, ignoring any found inside a quoted value or regex
+                j = i + 1
+                while j < n and pattern[j] != "]":
+                    j = PathPattern._scan_until(pattern, j + 1, pattern[j]) + 1 if pattern[j] in "\"/" else j + 1
+                if j >= n:
+                    raise ValueError("Unterminated [ in pattern \"{}\"".format(pattern))
+                yield ("constraint", pattern[i+1:j])
+                i = j + 1
+            elif c in "<>":
+                j = i + 1
+                if j < n and pattern[j] == c:
+                    value = None
+                    j += 1
+                elif j < n and pattern[j] in "\"/":
+                    end = PathPattern._scan_until(pattern, j + 1, pattern[j])
+                    value = pattern[j:end+1]
+                    j = end + 1
+                else:
+                    while j < n and not pattern[j].isspace() and pattern[j] not in "[<>":
+                        j += 1
+                    value = pattern[i+1:j]
+                    if not value:
+                        raise ValueError("Missing relation at position {} in pattern \"{}\"".format(i, pattern))
+                yield (c, value)
+                i = j
+            else:
+                raise ValueError("Unexpected character '{}' at position {} in pattern \"{}\"".format(c, i, pattern))
+
+    @staticmethod
+    def _string_matcher(value):
+        """
+        Builds a predicate over str from a "quoted" string, a /regex/, or a bare string.
+        """
+        if value.startswith("/") and value.endswith("/") and len(value) > 1:
+            regex = re.compile(value[1:-1])
+            return lambda s: regex.search(s) is not None
+        if value.startswith("\"") and value.endswith("\"") and len(value) > 1:
+            value = value[1:-1].replace("\\\"", "\"")
+        return lambda s: s == value
+
+    @staticmethod
+    def _compile_relation(value):
+        return (lambda rel: True) if value is None else PathPattern._string_matcher(value)
+
+    @staticmethod
+    def _compile_constraint(text):
+        tokens = list(PathPattern._constraint_tokens(text))
+        pos = [0]
+
+        def peek():
+            return tokens[pos[0]] if pos[0] < len(tokens) else None
+
+        def advance():
+            tok = peek()
+            if tok is None:
+                raise ValueError("Incomplete token constraint [{}]".format(text))
+            pos[0] += 1
+            return tok
+
+        def parse_or():
+            left = parse_and()
+            while peek() == "|":
+                advance()
+                right = parse_and()
+                left = (lambda l, r: lambda s, g, i: l(s, g, i) or r(s, g, i))(left, right)
+            return left
+
+        def parse_and():
+            left = parse_unary()
+            while peek() == "&":
+                advance()
+                right = parse_unary()
+                left = (lambda l, r: lambda s, g, i: l(s, g, i) and r(s, g, i))(left, right)
+            return left
+
+        def parse_unary():
+            tok = advance()
+            if tok == "!":
+                inner = parse_unary()
+                return lambda s, g, i: not inner(s, g, i)
+            if tok == "(":
+                inner = parse_or()
+                if advance() != ")":
+                    raise ValueError("Unbalanced parentheses in token constraint [{}]".format(text))
+                return inner
+            field = tok
+            if field not in PathPattern.FIELDS:
+                raise ValueError("Unsupported field \"{}\" in token constraint [{}].  Supported fields: {}".format(field, text, ", ".join(sorted(PathPattern.FIELDS))))
+            op = advance()
+            if op not in ("=", "!="):
+                raise ValueError("Expected = or != after \"{}\" in token constraint [{}]".format(field, text))
+            matcher = PathPattern._field_matcher(field, PathPattern._string_matcher(advance()))
+            return matcher if op == "=" else (lambda s, g, i: not matcher(s, g, i))
+
+        predicate = parse_or()
+        if peek() is not None:
+            raise ValueError("Unexpected \"{}\" in token constraint [{}]".format(peek(), text))
+        return predicate
+
+    @staticmethod
+    def _constraint_tokens(text):
+        i = 0
+        n = len(text)
+        while i < n:
+            c = text[i]
+            if c.isspace():
+                i += 1
+            elif c == "!" and i + 1 < n and text[i+1] == "=":
+                yield "!="
+                i += 2
+            elif c in "=&|!()":
+                yield c
+                i += 1
+            elif c in "\"/":
+                end = PathPattern._scan_until(text, i + 1, c)
+                yield text[i:end+1]
+                i = end + 1
+            else:
+                j = i
+                while j < n and not text[j].isspace() and text[j] not in "=&|!()\"/":
+                    j += 1
+                yield text[i:j]
+                i = j
+
+    @staticmethod
+    def _field_matcher(field, string_matches):
+        if field == "incoming":
+            return lambda s, g, i: any(string_matches(rel) for (_, rel) in g.incoming.get(i, []))
+        if field == "outgoing":
+            return lambda s, g, i: any(string_matches(rel) for (_, rel) in g.outgoing.get(i, []))
+        attr = {"word": "words", "lemma": "lemmas", "tag": "tags", "entity": "_entities", "chunk": "_chunks"}[field]
+        return lambda s, g, i: string_matches(getattr(s, attr)[i])
+
+
+class RelationCandidateMiner(object):
+    """
+    Generates relation candidates from pairs of named entities and counts the lexicalized syntactic dependency paths that link them.
+    Useful for mining Odin rules from a corpus.
+
+    For each sentence, a single breadth-first traversal is made from each entity span (rather than one `DirectedGraph.shortest_path` call per pair).
+
+    Parameters
+    ----------
+    granularities : dict or None
+        name -> keyword arguments for `DependencyUtils.lexicalize_path` (ex. {"lemmas": {"lemmas": True}}).  Default is `RelationCandidateMiner.GRANULARITIES`.
+    graph_name : str or None
+        The graph to traverse.  None uses `processors.ds.Sentence.dependencies`.
+    labels : set or None
+        If provided, only entities with one of these labels are considered.
+    max_length : int or None
+        If provided, paths with more than `max_length` edges are ignored.
+    lexicalize_endpoints : bool
+        Whether or not to lexicalize the tokens of the entities themselves.  By default, only the tokens between the entities are lexicalized.
+
+    Methods
+    -------
+    candidates(sentence)
+        Generates (source label, source interval, target label, target interval, path) for each pair of entities in `sentence`.
+    patterns(doc)
+        Counts (source label, target label, granularity, pattern) for each pair of entities in `doc`.
+    count_patterns(docs, processes=None, chunksize=1)
+        Counts patterns across `docs` using a pool of worker processes.
+    """
+
+    GRANULARITIES = {
+        "unlexicalized": {},
+        "lemmas": {"lemmas": True},
+        "simple_tags": {"simple_tags": True}
+    }
+
+    def __init__(self, granularities=None, graph_name=None, labels=None, max_length=None, lexicalize_endpoints=False):
+        self.granularities = granularities or RelationCandidateMiner.GRANULARITIES
+        self.graph_name = graph_name
+        self.labels = set(labels) if labels else None
+        self.max_length = max_length
+        self.lexicalize_endpoints = lexicalize_endpoints
+
+    def _graph(self, sentence):
+        if not self.graph_name:
+            return sentence.dependencies
+        return sentence.graphs.get(self.graph_name, None) if sentence.graphs else None
+
+    def _spans(self, sentence):
+        spans = [(label, interval) \
+                 for (label, intervals) in sentence.ne_intervals().items() \
+                 if not self.labels or label in self.labels \
+                 for interval in intervals]
+        return sorted(spans, key=lambda span: (span[1].start, span[1].end, span[0]))
+
+    @staticmethod
+    def _traverse(graph, interval):
+        """
+        Breadth-first traversal (ignoring direction) from every token in `interval`.
+        Returns node -> (previous node, directed relation) and node -> distance.
+        """
+        frontier = list(range(interval.start, interval.end))
+        previous = {i: None for i in frontier}
+        distance = {i: 0 for i in frontier}
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                hops = [(d, ">{}".format(rel)) for (d, rel) in graph.outgoing.get(node, [])] + \
+                       [(d, "<{}".format(rel)) for (d, rel) in graph.incoming.get(node, [])]
+                for (dest, relation) in hops:
+                    if dest not in distance:
+                        distance[dest] = distance[node] + 1
+                        previous[dest] = (node, relation)
+                        next_frontier.append(dest)
+            frontier = next_frontier
+        return (previous, distance)
+
+    def candidates(self, sentence):
+        """
+        Generates relation candidates for each pair of (non-overlapping) entities in `sentence`.
+        The source of each pair is the entity that occurs first.
+
+        Parameters
+        ----------
+        sentence : processors.ds.Sentence
+            The `Sentence` to search.
+
+        Returns
+        -------
+        generator
+            (source label, source interval, target label, target interval, path), where `path` is a list of (source index, directed relation, destination index) as produced by `DependencyUtils.retrieve_edges`.
+        """
+        graph = self._graph(sentence)
+        if graph is None:
+            return
+        spans = self._spans(sentence)
+        for (i, (source_label, source)) in enumerate(spans):
+            (previous, distance) = RelationCandidateMiner._traverse(graph, source)
+            for (target_label, target) in spans[i+1:]:
+                if source.overlaps(target):
+                    continue
+                reachable = [t for t in range(target.start, target.end) if t in distance]
+                if not reachable:
+                    continue
+                node = min(reachable, key=lambda t: (distance[t], t))
+                if self.max_length and distance[node] > self.max_length:
+                    continue
+                # walk back to the source
+                path = []
+                while previous[node] is not None:
+                    (prev, relation) = previous[node]
+                    path.append((prev, relation, node))
+                    node = prev
+                yield (source_label, source, target_label, target, list(reversed(path)))
+
+    def _lexicalize(self, sentence, path):
+        nodes = [s for (s, _, _) in path] + [path[-1][-1]]
+        interior = nodes[1:-1]
+        for (name, kwargs) in self.granularities.items():
+            if not self.lexicalize_endpoints:
+                # NOTE: lexicalize_path treats an empty limit_to as "no limit"
+                kwargs = dict(kwargs, limit_to=interior) if interior else dict()
+            yield (name, " ".join(DependencyUtils.lexicalize_path(sentence, path, **kwargs)))
+
+    def patterns(self, doc):
+        """
+        Counts the lexicalized paths between pairs of entities in `doc` at each granularity.
+
+        Parameters
+        ----------
+        doc : processors.ds.Document
+            The `Document` to search.
+
+        Returns
+        -------
+        collections.Counter
+            A Counter of (source label, target label, granularity, pattern) -> frequency
+        """
+        counts = Counter()
+        for sentence in doc.sentences:
+            for (source_label, _, target_label, _, path) in self.candidates(sentence):
+                for (name, pattern) in self._lexicalize(sentence, path):
+                    counts[(source_label, target_label, name, pattern)] += 1
+        return counts
+
+    def count_patterns(self, docs, processes=None, chunksize=1):
+        """
+        Counts the lexicalized paths between pairs of entities across `docs` using a pool of worker processes (map-reduce).
+
+        Parameters
+        ----------
+        docs : iterable of processors.ds.Document
+            The documents to search.
+        processes : int or None
+            The number of worker processes.  None uses one process per CPU.  1 counts in the current process.
+        chunksize : int
+            The number of documents sent to a worker at a time.
+
+        Returns
+        -------
+        collections.Counter
+            A Counter of (source label, target label, granularity, pattern) -> frequency
+        """
+        total = Counter()
+        tasks = ((self, doc) for doc in docs)
+        for counts in parallel_map(_count_document_patterns, tasks, processes=processes, chunksize=chunksize):
+            total.update(counts)
+        return total
+
+# compiled patterns (per process) for PathPattern.find_all
+_compiled_patterns = dict()
+
+def _find_in_document(task):
+    (pattern, graph_name, doc) = task
+    key = (pattern, graph_name)
+    if key not in _compiled_patterns:
+        _compiled_patterns[key] = PathPattern(pattern, graph_name=graph_name)
+    return _compiled_patterns[key].find(doc)
+
+def _count_document_patterns(task):
+    (miner, doc) = task
+    return miner.patterns(doc)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from processors.annotators import Message
+import requests
+import threading
+import logging
+import time
+import re
+
+
+class LatencyModel(object):
+    """
+    An online model of the latency (in seconds) of a processor as a linear function of the features of a text (see `processors.routing.ProcessorRouter.features`).
+
+    Coefficients are fit using recursive least squares with exponential forgetting, so the model tracks changes in the load of the server.
+
+    Parameters
+    ----------
+    prior : (float, float, float)
+        The initial coefficients (seconds per request, per 100 tokens, and per 10,000 squared sentence tokens).
+    decay : float
+        The forgetting factor (between 0 and 1).  Lower values adapt faster.
+    uncertainty : float or (float, float, float)
+        The initial variance of each coefficient.  Higher values trust the `prior` less.
+        By default, latency is attributed to the length of a text rather than to a fixed cost per request, so a slow long text does not make short texts look slow.
+
+    Attributes
+    ----------
+    coefficients : [float]
+        The current coefficients.
+    observations : int
+        The number of latencies observed.
+
+    Methods
+    -------
+    predict(features)
+        The expected latency (seconds) for a text with `features`.
+    update(features, seconds)
+        Updates the coefficients using an observed latency.
+    """
+
+    def __init__(self, prior=(0.0, 0.0, 0.0), decay=0.99, uncertainty=(1.0, 100.0, 100.0)):
+        self.coefficients = [float(c) for c in prior]
+        self.decay = decay
+        self.observations = 0
+        size = len(self.coefficients)
+        variances = [uncertainty] * size if isinstance(uncertainty, (int, float)) else list(uncertainty)
+        self._covariance = [[variances[i] if i == j else 0.0 for j in range(size)] for i in range(size)]
+
+    def predict(self, features):
+        return max(0.0, sum(c * x for (c, x) in zip(self.coefficients, features)))
+
+    def update(self, features, seconds):
+        size = len(self.coefficients)
+        P = self._covariance
+        Px = [sum(P[i][j] * features[j] for j in range(size)) for i in range(size)]
+        denominator = self.decay + sum(features[i] * Px[i] for i in range(size))
+        gain = [v / denominator for v in Px]
+        error = seconds - sum(c * x for (c, x) in zip(self.coefficients, features))
+        self.coefficients = [c + g * error for (c, g) in zip(self.coefficients, gain)]
+        # P = (P - gain * x^T * P) / decay  (P is symmetric, so x^T * P == Px^T)
+        self._covariance = [[(P[i][j] - gain[i] * Px[j]) / self.decay for j in range(size)] for i in range(size)]
+        self.observations += 1
+
+
+class ProcessorRouter(object):
+    """
+    Routes each text to the most preferred `processors.annotators.Processor` that is expected to finish within a latency budget.
+
+    The cost of a text is estimated (before annotation) from its number of tokens and the squared lengths of its sentences, since parsing long sentences dominates the latency of FastNLPProcessor and the CoreNLP-based processors.
+    The latency of each processor is learned online (see `processors.routing.LatencyModel`).
+    If a request fails or misses its deadline, the text is sent to the cheapest remaining processor.
+    Deadlines are best-effort (see `ProcessorRouter.annotate`).
+
+    Parameters
+    ----------
+    processors : [(str, processors.annotators.Processor)]
+        (name, processor) pairs, from most to least preferred (ex. [("fastnlp", api.fastnlp), ("clu", api.clu)]).
+    budget : float
+        The default latency budget (seconds) for each text.
+    priors : dict or None
+        name -> initial coefficients for the `LatencyModel` of a processor.
+    decay : float
+        The forgetting factor for each `LatencyModel`.
+
+    Attributes
+    ----------
+    models : dict
+        name -> `processors.routing.LatencyModel`
+    stats : dict
+        name -> {"requests": int, "failures": int, "timeouts": int, "seconds": float} for each processor.
+
+    Methods
+    -------
+    features(text)
+        The features used to estimate the cost of `text`.
+    predict(text)
+        The expected latency of each processor for `text`.
+    route(text, budget=None)
+        The name of the processor that `text` should be sent to.
+    annotate(text, budget=None)
+        Annotates `text` with the processor chosen by `route`, falling back to cheaper processors if the deadline is missed.
+    """
+
+    SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+    TOKEN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+    # the true latency of a request that timed out is unknown, so it is recorded as a multiple of the time waited
+    TIMEOUT_PENALTY = 2.0
+
+    def __init__(self, processors, budget, priors=None, decay=0.99):
+        if not processors:
+            raise ValueError("At least one processor is required")
+        self.processors = list(processors)
+        self.names = [name for (name, _) in self.processors]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Processor names must be unique")
+        self.budget = budget
+        priors = priors or dict()
+        self.models = {name: LatencyModel(priors.get(name, (0.0, 0.0, 0.0)), decay=decay) for name in self.names}
+        self.stats = {name: {"requests": 0, "failures": 0, "timeouts": 0, "seconds": 0.0} for name in self.names}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def features(text):
+        """
+        The features of `text` used to estimate its cost: (1, tokens / 100, sum of squared sentence lengths / 10,000).
+        Sentences and tokens are approximated with regular expressions, so no request is needed.
+        """
+        lengths = [len(ProcessorRouter.TOKEN.findall(s)) for s in ProcessorRouter.SENTENCE_END.split(text)]
+        return (1.0, sum(lengths) / 100.0, sum(n * n for n in lengths) / 10000.0)
+
+    def predict(self, text):
+        """
+        The expected latency (seconds) of each processor for `text`.
+
+        Returns
+        -------
+        dict
+            name -> seconds
+        """
+        features = ProcessorRouter.features(text)
+        with self._lock:
+            return {name: self.models[name].predict(features) for name in self.names}
+
+    def _candidates(self, predictions, budget):
+        """
+        Processors expected to finish within `budget` (in order of preference), followed by the rest (cheapest first).
+        """
+        within = [name for name in self.names if predictions[name] <= budget]
+        rest = sorted((name for name in self.names if name not in within), key=lambda name: predictions[name])
+        return within + rest
+
+    def route(self, text, budget=None):
+        """
+        The name of the most preferred processor expected to annotate `text` within `budget` (or the cheapest processor if none is expected to).
+        """
+        budget = self.budget if budget is None else budget
+        return self._candidates(self.predict(text), budget)[0]
+
+    def _observe(self, name, features, seconds, failed=False, timed_out=False):
+        with self._lock:
+            model = self.models[name]
+            # a failure says nothing about latency, and a timeout only bounds it from below
+            if timed_out:
+                model.update(features, max(seconds * ProcessorRouter.TIMEOUT_PENALTY, model.predict(features)))
+            elif not failed:
+                model.update(features, seconds)
+            stats = self.stats[name]
+            stats["requests"] += 1
+            stats["seconds"] += seconds
+            stats["failures"] += 1 if failed else 0
+            stats["timeouts"] += 1 if timed_out else 0
+
+    def annotate(self, text, budget=None):
+        """
+        Annotates `text` with the processor chosen by `ProcessorRouter.route`.
+        Each request is given a timeout that leaves enough time (by prediction) for the cheapest remaining processor.
+        If the request fails or times out, `text` is sent to that processor, until the deadline passes.
+
+        The budget is best-effort: `requests` applies a timeout to each socket operation (connecting or waiting for data) rather than to the whole request, so a response that arrives slowly can finish after the deadline.
+
+        Parameters
+        ----------
+        text : str
+            The text to annotate.
+        budget : float or None
+            The latency budget (seconds).  None uses the default budget.
+
+        Returns
+        -------
+        (str, processors.ds.Document) or (None, None)
+            The name of the processor used and the annotated `Document`, or (None, None) if no processor succeeded before the deadline.
+        """
+        budget = self.budget if budget is None else budget
+        deadline = time.time() + budget
+        features = ProcessorRouter.features(text)
+        with self._lock:
+            predictions = {name: self.models[name].predict(features) for name in self.names}
+        processors = dict(self.processors)
+        tried = set()
+        name = self._candidates(predictions, budget)[0]
+        while name is not None:
+            tried.add(name)
+            untried = sorted((n for n in self.names if n not in tried), key=lambda n: predictions[n])
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            # leave enough time to fall back to the cheapest remaining processor
+            reserve = predictions[untried[0]] if untried else 0.0
+            timeout = remaining - reserve if remaining > reserve else remaining
+            start = time.time()
+            try:
+                doc = processors[name]._annotate_message(Message(text), timeout=timeout)
+                self._observe(name, features, time.time() - start)
+                return (name, doc)
+            except Exception as e:
+                elapsed = time.time() - start
+                timed_out = isinstance(e, requests.exceptions.Timeout)
+                self._observe(name, features, elapsed, failed=not timed_out, timed_out=timed_out)
+                self.logger.debug("{} failed after {:.3f}s: {}".format(name, elapsed, e))
+            # fall back to the cheapest remaining processor
+            name = untried[0] if untried else None
+        return (None, None)
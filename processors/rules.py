@@ -0,0 +1,907 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from .serialization import JSONSerializer
+from .utils import post_json
+from collections import defaultdict
+import yaml
+import json
+import time
+import re
+
+
+class OdinGrammar(object):
+    """
+    A client-side representation of an Odin grammar (i.e., the `yaml` passed to `processors.api.OdinAPI`).
+
+    Parameters
+    ----------
+    rules : str
+        Odin rules provided as a `yaml` string.  Either a list of rules or a mapping with `rules` (and optionally `taxonomy` and `vars`).
+
+    Attributes
+    ----------
+    rules : [dict]
+        The rules in the order they were declared.
+    taxonomy : list or None
+        The label taxonomy (if any).
+    vars : dict
+        Variables available for substitution (ex. `${ verbs }`) in each rule.
+    resolvable : bool
+        Whether the dependencies between rules can be determined locally.  False if the grammar has `import`s, unnamed (or duplicate) rules, or a taxonomy that isn't defined inline (ex. a path).
+        Methods that split the grammar (`closure`, `components`, and `shards`) raise a `ValueError` for such grammars.
+
+    Methods
+    -------
+    rule(name)
+        Retrieves a rule by name.
+    pattern(rule)
+        The pattern of `rule` with variables substituted.
+    hypernyms(label)
+        The label and its hypernyms in the taxonomy.
+    consumed_labels(rule)
+        The labels of the mentions that `rule` consumes.
+    dependencies(name)
+        The names of the rules whose mentions the rule `name` may consume.
+    closure(names)
+        The named rules and (transitively) all of their dependencies.
+    components()
+        Partitions the rules into groups that don't share mentions.
+    shards(n, costs=None)
+        Packs the independent groups of rules into (at most) `n` shards of similar cost.
+    subset(names)
+        Produces `yaml` for the named rules (with the same `taxonomy` and `vars`).
+    prefilter()
+        Produces a `processors.rules.RulePrefilter` for this grammar.
+    """
+
+    _variable = re.compile(r"\$\{\s*([^}\s]+)\s*\}")
+    # @Label, @name:Label, or @"Label"
+    _mention = re.compile(r"@\s*(?:[\w-]+\s*:\s*)?\"?([^\s\[\]\(\)\|&\"?*+{},:]+)")
+    # mention=Label (in a token constraint)
+    _mention_constraint = re.compile(r"mention\s*=\s*\"?([^\s\]&|\")]+)")
+    # name:Label = ... (an argument of a dependency pattern)
+    _argument = re.compile(r"^\s*\w+\s*:\s*([^\s=?*+]+)\s*[?*+]?\s*=", re.MULTILINE)
+
+    def __init__(self, rules):
+        data = yaml.safe_load(rules)
+        if isinstance(data, dict):
+            self.rules = list(data.get("rules", None) or [])
+            self.taxonomy = data.get("taxonomy", None)
+            self.vars = dict(data.get("vars", None) or dict())
+        elif isinstance(data, list):
+            self.rules = data
+            self.taxonomy = None
+            self.vars = dict()
+        else:
+            raise ValueError("Odin rules must be either a list of rules or a mapping with rules")
+
+        self._parents = dict()
+        self._add_taxonomy(self.taxonomy, None)
+        names = self.names
+        self._index = {name: i for (i, name) in enumerate(names)}
+        self.resolvable = (
+            all(name is not None and "import" not in rule for (name, rule) in zip(names, self.rules)) and
+            len(self._index) == len(names) and
+            (self.taxonomy is None or isinstance(self.taxonomy, (list, dict)))
+        )
+
+    def _add_taxonomy(self, node, parent):
+        if isinstance(node, list):
+            for child in node:
+                self._add_taxonomy(child, parent)
+        elif isinstance(node, dict):
+            for (label, children) in node.items():
+                self._parents[label] = parent
+                self._add_taxonomy(children, label)
+        elif node is not None:
+            self._parents[node] = parent
+
+    def __len__(self):
+        return len(self.rules)
+
+    @property
+    def names(self):
+        return [r.get("name", None) for r in self.rules]
+
+    def rule(self, name):
+        return next((r for r in self.rules if r.get("name", None) == name), None)
+
+    def pattern(self, rule):
+        """
+        The pattern of `rule` with variables (ex. `${ verbs }`) substituted.  Unknown variables are left as is.
+        """
+        def replace(match):
+            return "{}".format(self.vars[match.group(1)]) if match.group(1) in self.vars else match.group(0)
+        return OdinGrammar._variable.sub(replace, "{}".format(rule.get("pattern", "")))
+
+    def hypernyms(self, label):
+        """
+        The label and its hypernyms in the taxonomy (from most to least specific).
+        """
+        labels = [label]
+        while self._parents.get(labels[-1], None) is not None:
+            labels.append(self._parents[labels[-1]])
+        return labels
+
+    def consumed_labels(self, rule):
+        """
+        The labels of the mentions that `rule` consumes (ex. `@Entity` or `theme:Entity = dobj`).
+        """
+        pattern = PatternAnalyzer._strip_comments(self.pattern(rule))
+        labels = set(OdinGrammar._mention.findall(pattern)) | set(OdinGrammar._mention_constraint.findall(pattern))
+        if rule.get("type", "dependency") != "token":
+            labels.update(label for label in OdinGrammar._argument.findall(pattern))
+        return labels
+
+    def _require_resolvable(self):
+        if not self.resolvable:
+            raise ValueError("The dependencies between rules can't be determined locally (the grammar has imports, unnamed or duplicate rules, or a taxonomy that isn't defined inline)")
+
+    def _dependencies(self, i):
+        """
+        The indices of the (other) rules whose mentions rule `i` may consume.
+        """
+        consumed = self.consumed_labels(self.rules[i])
+        return [
+            j for (j, r) in enumerate(self.rules)
+            if j != i and consumed.intersection(self.hypernyms(r.get("label", None)))
+        ]
+
+    def dependencies(self, name):
+        """
+        The names of the (other) rules whose mentions the rule `name` may consume.
+        A rule produces mentions with its label and each of that label's hypernyms.
+        """
+        self._require_resolvable()
+        return [self.rules[j]["name"] for j in self._dependencies(self._index[name])]
+
+    def closure(self, names):
+        """
+        The named rules and (transitively) all of their dependencies, in the order the rules were declared.
+        """
+        self._require_resolvable()
+        seen = set()
+        stack = [self._index[name] for name in names]
+        while stack:
+            i = stack.pop()
+            if i not in seen:
+                seen.add(i)
+                stack.extend(self._dependencies(i))
+        return [self.rules[i]["name"] for i in sorted(seen)]
+
+    def components(self):
+        """
+        Partitions the rules into groups that can be run independently (i.e., no rule consumes the mentions of a rule in another group).
+        As the rules of a group are run together, their priorities are respected.
+
+        Returns
+        -------
+        [[str]]
+            The names of the rules in each group, in the order they were declared.
+        """
+        self._require_resolvable()
+        group = list(range(len(self.rules)))
+
+        def find(i):
+            while group[i] != i:
+                group[i] = group[group[i]]
+                i = group[i]
+            return i
+
+        for i in range(len(self.rules)):
+            for j in self._dependencies(i):
+                group[find(i)] = find(j)
+        components = defaultdict(list)
+        for i in range(len(self.rules)):
+            components[find(i)].append(i)
+        return [[self.rules[i]["name"] for i in c] for c in sorted(components.values(), key=lambda c: c[0])]
+
+    def shards(self, n, costs=None):
+        """
+        Packs the independent groups of rules (see `OdinGrammar.components`) into (at most) `n` shards of similar cost.
+        The most expensive group is assigned first, always to the cheapest shard.
+
+        Parameters
+        ----------
+        n : int
+            The maximum number of shards (ex. the number of servers).
+        costs : dict or None
+            rule name -> cost (ex. `marginal_seconds` from `processors.rules.RuleProfiler`).  Rules without a cost count as 1.
+
+        Returns
+        -------
+        [[str]]
+            The names of the rules in each (non-empty) shard.
+        """
+        costs = costs or dict()
+        components = sorted(self.components(), key=lambda c: -sum(costs.get(name, 1) for name in c))
+        shards = [[] for _ in range(max(1, n))]
+        totals = [0.0] * len(shards)
+        for component in components:
+            i = totals.index(min(totals))
+            shards[i].extend(component)
+            totals[i] += sum(costs.get(name, 1) for name in component)
+        return [sorted(shard, key=self._index.get) for shard in shards if shard]
+
+    def subset(self, names):
+        """
+        Produces `yaml` for the named rules (in their original order), with the same `taxonomy` and `vars`.
+
+        Parameters
+        ----------
+        names : iterable of str
+            The names of the rules to include.
+
+        Returns
+        -------
+        str
+            Odin rules as a `yaml` string.
+        """
+        names = set(names)
+        data = {"rules": [r for r in self.rules if r.get("name", None) in names]}
+        if self.taxonomy is not None:
+            data["taxonomy"] = self.taxonomy
+        if self.vars:
+            data["vars"] = self.vars
+        return yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
+
+    def prefilter(self):
+        """
+        Produces a `processors.rules.RulePrefilter` for this grammar.
+        """
+        return RulePrefilter(self)
+
+
+class PatternAnalyzer(object):
+    """
+    Conservatively derives the lexical requirements of Odin token and dependency patterns.
+
+    A requirement is one of
+        `PatternAnalyzer.ANY` (nothing is required),
+        `PatternAnalyzer.MENTION` (only other mentions are required), or
+        a list of clauses that must all be satisfied, where each clause is a frozenset of alternatives (field, kind, value) of which at least one must appear in a sentence.
+    Whenever a construct isn't understood, it is treated as requiring nothing.
+
+    Methods
+    -------
+    token_pattern(pattern, unit="word")
+        The requirement for an Odin token pattern.
+    dependency_pattern(pattern, unit="word")
+        The requirement for an Odin dependency pattern (i.e., the requirement of its trigger).
+    """
+
+    ANY = "ANY"
+    MENTION = "MENTION"
+    FIELDS = {"word": "words", "lemma": "lemmas", "tag": "tags", "entity": "_entities", "chunk": "_chunks"}
+    EQ = "eq"
+    RE = "re"
+
+    _identifier = re.compile(r"[^\s\[\]\(\)\|&!=\"/@,{}?*+^$#]+")
+    _argument = re.compile(r"^\s*\w+\s*(:\s*[^\s=]+)?\s*[?*+]?\s*=")
+
+    class _Unparsable(Exception):
+        pass
+
+    @staticmethod
+    def sequence(requirements):
+        """
+        The requirement of a sequence (i.e., all of `requirements`).
+        """
+        clauses = []
+        mention = False
+        for req in requirements:
+            if req == PatternAnalyzer.MENTION:
+                mention = True
+            elif req != PatternAnalyzer.ANY:
+                clauses.extend(req)
+        if clauses:
+            return clauses
+        return PatternAnalyzer.MENTION if mention else PatternAnalyzer.ANY
+
+    @staticmethod
+    def alternation(requirements):
+        """
+        The requirement of an alternation (i.e., any of `requirements`).
+        Branches that only require mentions are dropped, as those mentions must be found by other rules.
+        """
+        requirements = list(requirements)
+        if any(req == PatternAnalyzer.ANY for req in requirements):
+            return PatternAnalyzer.ANY
+        branches = [req for req in requirements if req != PatternAnalyzer.MENTION]
+        if not branches:
+            return PatternAnalyzer.MENTION
+        if len(branches) == 1:
+            return branches[0]
+        # the most selective clause of each branch
+        return [frozenset().union(*[min(clauses, key=len) for clauses in branches])]
+
+    @staticmethod
+    def _strip_comments(pattern):
+        lines = []
+        for line in pattern.splitlines():
+            # a # starts a comment unless it is inside a string or regex
+            (quote, out) = (None, [])
+            for (i, c) in enumerate(line):
+                if quote:
+                    if c == "\\":
+                        pass
+                    elif c == quote and (i == 0 or line[i - 1] != "\\"):
+                        quote = None
+                elif c in "\"/":
+                    quote = c
+                elif c == "#":
+                    break
+                out.append(c)
+            lines.append("".join(out))
+        return "\n".join(lines)
+
+    @staticmethod
+    def token_pattern(pattern, unit="word"):
+        """
+        The requirement for an Odin token pattern.
+
+        Parameters
+        ----------
+        pattern : str
+            The token pattern.
+        unit : str
+            The field matched by bare strings and regexes (see the `unit` of an Odin rule).
+
+        Returns
+        -------
+        str or list
+            See `PatternAnalyzer`.
+        """
+        try:
+            parser = _TokenPatternParser(PatternAnalyzer._strip_comments(pattern), unit)
+            return parser.parse()
+        except PatternAnalyzer._Unparsable:
+            return PatternAnalyzer.ANY
+
+    @staticmethod
+    def dependency_pattern(pattern, unit="word"):
+        """
+        The requirement for an Odin dependency pattern.  Only the trigger is analyzed, as each argument must be a mention.
+        """
+        lines = PatternAnalyzer._strip_comments(pattern).splitlines()
+        trigger = None
+        for line in lines:
+            if not line.strip():
+                continue
+            if PatternAnalyzer._argument.match(line):
+                if trigger is not None:
+                    # the trigger ends where the first argument begins
+                    break
+                name = line[:line.index("=")].split(":")[0].strip()
+                if name != "trigger":
+                    break
+                trigger = [line[line.index("=") + 1:]]
+            elif trigger is not None:
+                trigger.append(line)
+        if trigger is None:
+            # the first argument anchors the pattern
+            return PatternAnalyzer.MENTION
+        return PatternAnalyzer.token_pattern("\n".join(trigger), unit=unit)
+
+
+class _TokenPatternParser(object):
+    """
+    A recursive descent parser for (a conservative subset of) Odin token patterns that produces requirements (see `PatternAnalyzer`).
+    """
+
+    def __init__(self, pattern, unit):
+        self.s = pattern
+        self.i = 0
+        self.unit = unit
+
+    def error(self):
+        raise PatternAnalyzer._Unparsable()
+
+    def peek(self):
+        self.skip_space()
+        return self.s[self.i] if self.i < len(self.s) else None
+
+    def skip_space(self):
+        while self.i < len(self.s) and self.s[self.i].isspace():
+            self.i += 1
+
+    def parse(self):
+        req = self.alternation()
+        if self.peek() is not None:
+            self.error()
+        return req
+
+    def alternation(self):
+        branches = [self.sequence()]
+        while self.peek() == "|":
+            self.i += 1
+            branches.append(self.sequence())
+        return PatternAnalyzer.alternation(branches)
+
+    def sequence(self):
+        reqs = []
+        while self.peek() not in (None, "|", ")"):
+            req = self.unit_requirement()
+            if self.quantified_optional():
+                req = PatternAnalyzer.ANY
+            reqs.append(req)
+        return PatternAnalyzer.sequence(reqs)
+
+    def quantified_optional(self):
+        """
+        Consumes a quantifier (if any), returning True if it allows zero repetitions.
+        """
+        c = self.peek()
+        optional = False
+        if c in ("?", "*"):
+            self.i += 1
+            optional = True
+        elif c == "+":
+            self.i += 1
+        elif c == "{":
+            end = self.s.find("}", self.i)
+            if end < 0:
+                self.error()
+            bounds = self.s[self.i + 1:end].split(",")
+            self.i = end + 1
+            low = bounds[0].strip()
+            # ex. an unsubstituted variable
+            if low and not low.isdigit():
+                self.error()
+            optional = (not low) or int(low) == 0
+        else:
+            return False
+        # lazy or possessive quantifiers
+        if self.i < len(self.s) and self.s[self.i] in "?+":
+            self.i += 1
+        return optional
+
+    def unit_requirement(self):
+        c = self.peek()
+        if c == "[":
+            return self.token_constraint()
+        if c == "(":
+            return self.group()
+        if c == "@":
+            self.i += 1
+            if self.peek() == "\"":
+                self.string()
+            else:
+                self.identifier()
+            return PatternAnalyzer.MENTION
+        if c in ("^", "$"):
+            self.i += 1
+            return PatternAnalyzer.ANY
+        # bare values are matched against the unit
+        return self.value_requirement(self.unit)
+
+    def group(self):
+        self.i += 1
+        lookaround = False
+        if self.s.startswith("?<", self.i) and not self.s.startswith("?<=", self.i) and not self.s.startswith("?<!", self.i):
+            # named capture
+            end = self.s.find(">", self.i)
+            if end < 0:
+                self.error()
+            self.i = end + 1
+        elif self.s.startswith("?", self.i):
+            # lookaround and other zero-width assertions
+            lookaround = True
+            self.i += 3 if self.s.startswith("?<", self.i) else 2
+        req = self.alternation()
+        if self.peek() != ")":
+            self.error()
+        self.i += 1
+        return PatternAnalyzer.ANY if lookaround else req
+
+    def token_constraint(self):
+        self.i += 1
+        if self.peek() == "]":
+            self.i += 1
+            return PatternAnalyzer.ANY
+        req = self.constraint_disjunction()
+        if self.peek() != "]":
+            self.error()
+        self.i += 1
+        return req
+
+    def constraint_disjunction(self):
+        branches = [self.constraint_conjunction()]
+        while self.peek() == "|":
+            self.i += 1
+            branches.append(self.constraint_conjunction())
+        return PatternAnalyzer.alternation(branches)
+
+    def constraint_conjunction(self):
+        reqs = [self.constraint_factor()]
+        while self.peek() == "&":
+            self.i += 1
+            reqs.append(self.constraint_factor())
+        return PatternAnalyzer.sequence(reqs)
+
+    def constraint_factor(self):
+        c = self.peek()
+        if c == "!":
+            self.i += 1
+            self.constraint_factor()
+            return PatternAnalyzer.ANY
+        if c == "(":
+            self.i += 1
+            req = self.constraint_disjunction()
+            if self.peek() != ")":
+                self.error()
+            self.i += 1
+            return req
+        field = self.identifier()
+        if self.peek() != "=":
+            self.error()
+        self.i += 1
+        if field == "mention":
+            self.value()
+            return PatternAnalyzer.MENTION
+        return self.value_requirement(field)
+
+    def value_requirement(self, field):
+        (kind, value) = self.value()
+        if field not in PatternAnalyzer.FIELDS:
+            return PatternAnalyzer.ANY
+        return [frozenset([(field, kind, value)])]
+
+    def value(self):
+        c = self.peek()
+        if c == "/":
+            return (PatternAnalyzer.RE, self.regex())
+        if c == "\"":
+            return (PatternAnalyzer.EQ, self.string())
+        return (PatternAnalyzer.EQ, self.identifier())
+
+    def delimited(self, delimiter):
+        self.i += 1
+        out = []
+        while self.i < len(self.s):
+            c = self.s[self.i]
+            if c == "\\" and self.i + 1 < len(self.s):
+                nxt = self.s[self.i + 1]
+                # keep escapes other than the delimiter itself
+                out.append(nxt if nxt == delimiter else c + nxt)
+                self.i += 2
+                continue
+            if c == delimiter:
+                self.i += 1
+                return "".join(out)
+            out.append(c)
+            self.i += 1
+        self.error()
+
+    def regex(self):
+        value = self.delimited("/")
+        # flags (ex. /word/i) are not supported
+        if self.i < len(self.s) and self.s[self.i].isalpha():
+            self.error()
+        return value
+
+    def string(self):
+        value = self.delimited("\"")
+        return value.replace("\\\\", "\\")
+
+    def identifier(self):
+        self.skip_space()
+        match = PatternAnalyzer._identifier.match(self.s, self.i)
+        if not match:
+            self.error()
+        self.i = match.end()
+        return match.group(0)
+
+
+class RulePrefilter(object):
+    """
+    A conservative, client-side filter for sentences that an Odin grammar cannot match.
+
+    The lexical requirements (words, lemmas, tags, entity labels, and chunk labels) of each rule are derived from its trigger or token pattern (see `PatternAnalyzer`).
+    A sentence is accepted if it satisfies the requirements of at least one rule.
+    Rules that only consume the mentions of other rules never add a sentence, as those mentions must be found by other rules in the same sentence.
+    If any rule can't be analyzed (ex. `import`s, unknown variables, or a regex that Python's `re` can't compile, such as `\\p{Lu}`), every sentence is accepted.
+
+    Parameters
+    ----------
+    grammar : processors.rules.OdinGrammar or str
+        The grammar (or its `yaml`).
+
+    Attributes
+    ----------
+    requirements : dict
+        rule name -> requirement (see `PatternAnalyzer`).
+    accepts_all : bool
+        True if no sentence can be excluded.
+    cross_sentence : bool
+        True if the grammar has cross-sentence rules.  Such rules depend on neighboring sentences, so only whole documents should be excluded.
+
+    Methods
+    -------
+    rule_matches(name, sentence)
+        Test if `sentence` satisfies the requirements of a rule.
+    matches_sentence(sentence)
+        Test if any rule could match `sentence`.
+    sentences(doc)
+        The indices of the sentences in `doc` that some rule could match.
+    matches(doc)
+        Test if any rule could match `doc`.
+    """
+
+    def __init__(self, grammar):
+        if not isinstance(grammar, OdinGrammar):
+            grammar = OdinGrammar(grammar)
+        self.grammar = grammar
+        self.requirements = dict()
+        self.cross_sentence = False
+        # regex -> compiled regex for every regex in the requirements
+        self._regexes = dict()
+        for (i, rule) in enumerate(grammar.rules):
+            name = rule.get("name", None) or "rule-{}".format(i)
+            self.requirements[name] = self._compile(self._analyze(rule))
+        self.accepts_all = any(req == PatternAnalyzer.ANY for req in self.requirements.values())
+        self._rules = [req for req in self.requirements.values() if req not in (PatternAnalyzer.ANY, PatternAnalyzer.MENTION)]
+
+    def _analyze(self, rule):
+        if "import" in rule or "pattern" not in rule:
+            return PatternAnalyzer.ANY
+        rule_type = rule.get("type", "dependency")
+        if rule_type == "cross-sentence":
+            self.cross_sentence = True
+            return PatternAnalyzer.MENTION
+        pattern = self.grammar.pattern(rule)
+        if OdinGrammar._variable.search(pattern):
+            # unknown variable
+            return PatternAnalyzer.ANY
+        unit = rule.get("unit", "word")
+        if rule_type == "token":
+            return PatternAnalyzer.token_pattern(pattern, unit=unit)
+        if rule_type in ("dependency", "graph"):
+            return PatternAnalyzer.dependency_pattern(pattern, unit=unit)
+        return PatternAnalyzer.ANY
+
+    def _compile(self, requirement):
+        """
+        Compiles the regexes of `requirement`.  Odin regexes use Java's syntax, so a requirement with a regex that `re` can't compile becomes `PatternAnalyzer.ANY`.
+        """
+        if requirement in (PatternAnalyzer.ANY, PatternAnalyzer.MENTION):
+            return requirement
+        compiled = dict()
+        for clause in requirement:
+            for (_, kind, value) in clause:
+                if kind == PatternAnalyzer.RE and value not in self._regexes:
+                    try:
+                        compiled[value] = re.compile(value)
+                    except re.error:
+                        return PatternAnalyzer.ANY
+        self._regexes.update(compiled)
+        return requirement
+
+    def _satisfies(self, requirement, values):
+        for clause in requirement:
+            satisfied = False
+            for (field, kind, value) in clause:
+                tokens = values(field)
+                if kind == PatternAnalyzer.EQ:
+                    satisfied = value in tokens
+                else:
+                    regex = self._regexes[value]
+                    satisfied = any(regex.search(tok) for tok in tokens)
+                if satisfied:
+                    break
+            if not satisfied:
+                return False
+        return True
+
+    @staticmethod
+    def _values(sentence):
+        cache = dict()
+
+        def values(field):
+            if field not in cache:
+                cache[field] = set(getattr(sentence, PatternAnalyzer.FIELDS[field]) or [])
+            return cache[field]
+        return values
+
+    def rule_matches(self, name, sentence):
+        """
+        Test if `sentence` satisfies the requirements of the rule `name`.  Rules that only consume mentions are always satisfied.
+        """
+        req = self.requirements[name]
+        if req in (PatternAnalyzer.ANY, PatternAnalyzer.MENTION):
+            return True
+        return self._satisfies(req, RulePrefilter._values(sentence))
+
+    def matches_sentence(self, sentence):
+        """
+        Test if any rule could match `sentence` (a `processors.ds.Sentence`).
+        """
+        if self.accepts_all:
+            return True
+        values = RulePrefilter._values(sentence)
+        return any(self._satisfies(req, values) for req in self._rules)
+
+    def sentences(self, doc):
+        """
+        The indices of the sentences in `doc` (a `processors.ds.Document`) that some rule could match.
+        """
+        return [i for (i, s) in enumerate(doc.sentences) if self.matches_sentence(s)]
+
+    def matches(self, doc):
+        """
+        Test if any rule could match `doc` (a `processors.ds.Document`).
+        """
+        return any(self.matches_sentence(s) for s in doc.sentences)
+
+
+class RuleProfiler(object):
+    """
+    Profiles the cost of each rule (or group of rules) in an Odin grammar by running it in isolation over a sample of documents.
+
+    A rule is run together with the rules whose mentions it consumes (see `OdinGrammar.closure`), as it would otherwise find nothing.
+    The `marginal_seconds` of a rule discount the time spent on those dependencies.
+    Grammars whose dependencies can't be determined locally (see `OdinGrammar.resolvable`) are rejected with a `ValueError`.
+    Requests bypass any `processors.cache.ResultCache` and are sent one at a time so that timings aren't skewed.
+
+    Parameters
+    ----------
+    odin : processors.api.OdinAPI
+        The API used to run the rules.
+    rules : str or processors.rules.OdinGrammar
+        The grammar (as a `yaml` string).
+    groups : dict or None
+        group name -> [rule name].  None profiles each rule.
+    repeats : int
+        The number of times each document is sent for each group.  Timings are averaged.
+
+    Attributes
+    ----------
+    results : [dict]
+        The profile of each group (from the last call to `RuleProfiler.profile`), ranked by descending `seconds`.
+    sample : dict
+        The number of documents and tokens in the last sample.
+
+    Methods
+    -------
+    profile(docs)
+        Profiles each group over `docs`.
+    table(top_n=10)
+        A ranked table of the most expensive groups.
+    projection(num_documents=None, num_tokens=None)
+        Projects the cost of each group (and the whole grammar) to a full corpus.
+    """
+
+    GRAMMAR = "*"
+
+    def __init__(self, odin, rules, groups=None, repeats=1):
+        self.odin = odin
+        self.grammar = rules if isinstance(rules, OdinGrammar) else OdinGrammar(rules)
+        self.grammar._require_resolvable()
+        self.groups = groups if groups is not None else {name: [name] for name in self.grammar.names}
+        self.repeats = repeats
+        self.results = []
+        self.sample = dict()
+        self._grammar = None
+
+    def _post(self, json_data):
+        return post_json(self.odin._service, json_data)
+
+    def _run(self, names, docs):
+        """
+        Runs the named rules over `docs`, returning timings, mention counts, and payload sizes.
+        """
+        rules_fields = self.odin._rules_fields(self.grammar.subset(names))
+        stats = {"seconds": 0.0, "decode_seconds": 0.0, "mentions": defaultdict(int), "request_bytes": 0, "response_bytes": 0, "errors": 0}
+        for doc in docs:
+            json_data = self.odin._request(dict(rules_fields, document=json.dumps(doc.to_JSON_dict(), sort_keys=True)))
+            for _ in range(self.repeats):
+                start = time.time()
+                mns_json = self._post(json_data)
+                stats["seconds"] += (time.time() - start) / self.repeats
+            stats["request_bytes"] += len(json_data.encode("utf-8"))
+            stats["response_bytes"] += len(json.dumps(mns_json).encode("utf-8"))
+            if "error" in mns_json:
+                stats["errors"] += 1
+                continue
+            start = time.time()
+            mentions = JSONSerializer.mentions_from_JSON(mns_json, documents=[doc])
+            stats["decode_seconds"] += time.time() - start
+            for m in mentions:
+                stats["mentions"][m.foundBy] += 1
+        return stats
+
+    def profile(self, docs):
+        """
+        Profiles each group over `docs`.
+
+        Parameters
+        ----------
+        docs : [processors.ds.Document]
+            A sample of documents.
+
+        Returns
+        -------
+        [dict]
+            The profile of each group, ranked by descending `seconds`, with
+            `group`, `rules` (the rules of the group), `dependencies` (the other rules that were run),
+            `seconds` (server time, including network), `marginal_seconds` (discounting dependencies), `decode_seconds`,
+            `mentions` (found by the group's rules), `request_bytes`, `response_bytes`, and `errors`.
+        """
+        docs = list(docs)
+        self.sample = {"documents": len(docs), "tokens": sum(len(doc.words) for doc in docs)}
+        # runs are shared by groups with the same dependencies
+        runs = dict()
+
+        def run(names):
+            key = tuple(names)
+            if key not in runs:
+                runs[key] = self._run(names, docs) if names else None
+            return runs[key]
+
+        results = []
+        for (group, names) in self.groups.items():
+            closure = self.grammar.closure(names)
+            dependencies = [n for n in closure if n not in names]
+            stats = run(closure)
+            baseline = run(self.grammar.closure(dependencies))
+            results.append({
+                "group": group,
+                "rules": list(names),
+                "dependencies": dependencies,
+                "seconds": stats["seconds"],
+                "marginal_seconds": max(0.0, stats["seconds"] - baseline["seconds"]) if baseline else stats["seconds"],
+                "decode_seconds": stats["decode_seconds"],
+                "mentions": sum(stats["mentions"][n] for n in names),
+                "request_bytes": stats["request_bytes"],
+                "response_bytes": stats["response_bytes"],
+                "errors": stats["errors"]
+            })
+        grammar = run(self.grammar.names)
+        self._grammar = {
+            "group": RuleProfiler.GRAMMAR,
+            "seconds": grammar["seconds"],
+            "decode_seconds": grammar["decode_seconds"],
+            "mentions": sum(grammar["mentions"].values())
+        }
+        self.results = sorted(results, key=lambda r: (-r["marginal_seconds"], -r["seconds"], r["group"]))
+        return self.results
+
+    def table(self, top_n=10):
+        """
+        A ranked table (str) of the `top_n` most expensive groups (by `marginal_seconds`) from the last call to `RuleProfiler.profile`.
+        """
+        header = ("group", "marginal_s", "total_s", "decode_s", "mentions", "request_kb", "response_kb")
+        rows = [header]
+        for r in self.results[:top_n]:
+            rows.append((
+                r["group"],
+                "{:.3f}".format(r["marginal_seconds"]),
+                "{:.3f}".format(r["seconds"]),
+                "{:.3f}".format(r["decode_seconds"]),
+                "{}".format(r["mentions"]),
+                "{:.1f}".format(r["request_bytes"] / 1024.0),
+                "{:.1f}".format(r["response_bytes"] / 1024.0)
+            ))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = ["  ".join(value.ljust(w) if i == 0 else value.rjust(w) for (i, (value, w)) in enumerate(zip(row, widths))) for row in rows]
+        return "\n".join(lines)
+
+    def projection(self, num_documents=None, num_tokens=None):
+        """
+        Projects the seconds (server time plus decoding) needed by each group (and the whole grammar, under `RuleProfiler.GRAMMAR`) to process a corpus.
+        Costs are scaled by the number of tokens if `num_tokens` is given, and otherwise by the number of documents.
+
+        Returns
+        -------
+        dict
+            group -> projected seconds
+        """
+        if num_tokens is not None:
+            scale = num_tokens / float(self.sample["tokens"])
+        elif num_documents is not None:
+            scale = num_documents / float(self.sample["documents"])
+        else:
+            raise ValueError("Either num_documents or num_tokens is required")
+        projection = {r["group"]: (r["marginal_seconds"] + r["decode_seconds"]) * scale for r in self.results}
+        projection[RuleProfiler.GRAMMAR] = (self._grammar["seconds"] + self._grammar["decode_seconds"]) * scale
+        return projection
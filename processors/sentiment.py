@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
-from processors.utils import is_string, post_json
+from processors.utils import is_string, post_json, concurrent_map, ServerVersion
+from processors.cache import SentimentCache
 from processors.ds import Sentence, Document
 from processors.annotators import Message, SegmentedMessage
+import requests
 import json
 
 
@@ -14,6 +16,8 @@ class SentimentAnalysisAPI(object):
     ----------
     address : str
         The base address for the API (i.e., everything preceding `/api/..`)
+    cache : processors.cache.SentimentCache or None
+        If provided, sentence-level scores are cached (see `processors.sentiment.SentimentAnalyzer`).
 
     Attributes
     ----------
@@ -21,20 +25,76 @@ class SentimentAnalysisAPI(object):
         Service using [`CoreNLP`'s tree-based system](https://nlp.stanford.edu/~socherr/EMNLP2013_RNTN.pdf) for performing sentiment analysis.
 
     """
-    def __init__(self, address):
+    def __init__(self, address, cache=None):
         self._service = address
-        self.corenlp = CoreNLPSentimentAnalyzer(self._service)
+        self.corenlp = CoreNLPSentimentAnalyzer(self._service, cache=cache)
 
 
 class SentimentAnalyzer(object):
+    """
+    Base class for sentiment analysis services.
+
+    Scores depend only on the sentence (or segment) being scored.  If a `cache` is provided, only the sentences missing from the cache are sent to the server when scoring a `Document`, a `Sentence`, segmented text, or `score_many`.
+    Cached scores are keyed on (endpoint, server version, sentence fingerprint).
+
+    Parameters
+    ----------
+    address : str
+        The base address for the API (i.e., everything preceding `/api/..`)
+    cache : processors.cache.SentimentCache or None
+        An optional cache for sentence-level scores.  Default is None (scores are not cached).
+
+    Methods
+    -------
+    score(data)
+        Scores `data` (str, [str], `processors.ds.Sentence`, or `processors.ds.Document`).
+    score_many(texts, batch_size=100, max_chars=100000, max_in_flight=4)
+        Lazily scores many short texts using batched, concurrent requests.
+    """
+
+    BATCH_SIZE = 100
+    MAX_CHARS = 100000
 
-    def __init__(self, address):
+    def __init__(self, address, cache=None):
+        self.address = address
+        self.cache = cache
+        self._server_version = ServerVersion(address)
         self._service = "{}/api/sentiment/score".format(address)
         self._text_service = self._service
         self._segmented_service = self._service
         self._sentence_service = self._service
         self._document_service = self._service
 
+    def server_version(self):
+        """
+        The version of processors-server (retrieved once, see `processors.utils.ServerVersion`).  Used to invalidate cached scores.
+        """
+        return self._server_version.get()
+
+    def _post(self, service, json_data):
+        return post_json(service, json_data)["scores"]
+
+    def _cached(self, service, items, score_misses):
+        """
+        Scores each of `items` (`Sentence` or str), using the cache (if any).
+        `score_misses` receives the indices of the items missing from the cache and returns a score for each.
+        """
+        if self.cache is None:
+            return score_misses(list(range(len(items))))
+        version = self.server_version()
+        fingerprints = [SentimentCache.fingerprint(item) for item in items]
+        scores = [self.cache.get(service, version, fp) for fp in fingerprints]
+        misses = [i for (i, score) in enumerate(scores) if score is None]
+        if not misses:
+            return scores
+        new_scores = score_misses(misses)
+        if len(new_scores) != len(misses):
+            raise ValueError("Expected {} scores, but received {}".format(len(misses), len(new_scores)))
+        for (i, score) in zip(misses, new_scores):
+            scores[i] = score
+            self.cache.put(service, version, fingerprints[i], score)
+        return scores
+
     def score_document(self, doc):
         """
         Sends a Document to the server for sentiment scoring.
@@ -50,9 +110,13 @@ class SentimentAnalyzer(object):
             A list of int scores (one for each sentence) ranging from 1 (very negative) to 5 (very positive)
 
         """
+        def score_misses(misses):
+            # only the sentences missing from the cache are sent
+            partial = doc if len(misses) == len(doc.sentences) else doc.view(misses)
+            return self._post(self._document_service, partial.to_JSON())
+
         try:
-            sentiment_scores = post_json(self._document_service, doc.to_JSON())
-            return sentiment_scores["scores"]
+            return self._cached(self._document_service, doc.sentences, score_misses)
 
         except Exception as e:
             #print(e)
@@ -74,8 +138,8 @@ class SentimentAnalyzer(object):
 
         """
         try:
-            sentiment_scores = post_json(self._sentence_service, sentence.to_JSON())
-            return sentiment_scores["scores"][0]
+            scores = self._cached(self._sentence_service, [sentence], lambda misses: self._post(self._sentence_service, sentence.to_JSON())[:1])
+            return scores[0]
 
         except Exception as e:
             print(e)
@@ -96,10 +160,12 @@ class SentimentAnalyzer(object):
             A list of int scores (one for each sentence/chunk) ranging from 1 (very negative) to 5 (very positive)
 
         """
+        def score_misses(misses):
+            msg = SegmentedMessage([sentences[i] for i in misses])
+            return self._post(self._segmented_service, msg.to_JSON())
+
         try:
-            msg = SegmentedMessage(sentences)
-            sentiment_scores = post_json(self._segmented_service, msg.to_JSON())
-            return sentiment_scores["scores"]
+            return self._cached(self._segmented_service, sentences, score_misses)
 
         except Exception as e:
             #print(e)
@@ -120,6 +186,74 @@ class SentimentAnalyzer(object):
             #print(e)
             return None
 
+    def _score_segments(self, segments):
+        """
+        Scores each of `segments` using a single request.  Raises an exception if the request fails.
+        """
+        scores = self._post(self._segmented_service, SegmentedMessage(segments).to_JSON())
+        if len(scores) != len(segments):
+            raise ValueError("Expected {} scores, but received {}".format(len(segments), len(scores)))
+        return scores
+
+    def _score_batch(self, segments):
+        """
+        Scores a batch of `segments`.  A batch rejected by the server (ex. a malformed response or the wrong number of scores) is bisected, so only the inputs that fail on their own are scored as None.
+        If the server can't be reached (ex. a connection error or a timeout), the whole batch is scored as None without retrying.
+        """
+        try:
+            return self._score_segments(segments)
+        except requests.exceptions.RequestException:
+            return [None] * len(segments)
+        except Exception:
+            if len(segments) == 1:
+                return [None]
+            mid = len(segments) // 2
+            return self._score_batch(segments[:mid]) + self._score_batch(segments[mid:])
+
+    @staticmethod
+    def _batches(texts, batch_size, max_chars):
+        batch = []
+        chars = 0
+        for text in texts:
+            if batch and (len(batch) == batch_size or chars + len(text) > max_chars):
+                yield batch
+                batch = []
+                chars = 0
+            batch.append(text)
+            chars += len(text)
+        if batch:
+            yield batch
+
+    def _score_cached_batch(self, segments):
+        return self._cached(self._segmented_service, segments, lambda misses: self._score_batch([segments[i] for i in misses]))
+
+    def score_many(self, texts, batch_size=BATCH_SIZE, max_chars=MAX_CHARS, max_in_flight=4):
+        """
+        Lazily scores many short texts (ex. reviews).
+        Texts are packed into batches (sent as a single `SegmentedMessage`), and batches are scored concurrently.
+        If a cache is provided, only the texts missing from the cache are sent.
+
+        Parameters
+        ----------
+        texts : iterable of str
+            The texts to score.  Each text is treated as a single segment (i.e., it receives one score).  Consumed lazily.
+        batch_size : int
+            The maximum number of texts in a batch.
+        max_chars : int
+            The maximum number of characters in a batch.  A longer text is sent on its own.
+        max_in_flight : int
+            The maximum number of concurrent requests.
+
+        Returns
+        -------
+        generator
+            For each of `texts` (in order), an int score ranging from 1 (very negative) to 5 (very positive), or None if the text could not be scored.
+        """
+        batches = SentimentAnalyzer._batches(texts, batch_size, max_chars)
+        for (_, scores) in concurrent_map(self._score_cached_batch, batches, max_in_flight=max_in_flight):
+            for score in scores:
+                yield score
+
     def score(self, data):
         """
         Sniff out data type and assemble corresponding message to send to the server for sentiment scoring
@@ -147,7 +281,8 @@ class CoreNLPSentimentAnalyzer(SentimentAnalyzer):
     """
     Bridge to [`CoreNLP`'s tree-based sentiment analysis system](https://nlp.stanford.edu/~socherr/EMNLP2013_RNTN.pdf)
     """
-    def __init__(self, address):
+    def __init__(self, address, cache=None):
+        super(CoreNLPSentimentAnalyzer, self).__init__(address, cache=cache)
         self._service = "{}/api/sentiment/corenlp/score".format(address)
         self._text_service = self._service
         self._segmented_service = self._service
@@ -1,16 +1,33 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import unicode_literals
-from .ds import Document
-from .odin import Mention
+from .ds import Document, DocumentView
+from .odin import Mention, MentionTable
+from collections import OrderedDict
 import json
 
 
 class JSONSerializer(object):
     """
     Utilities for serialization/deserialization of data structures.
-    
+
+    Methods
+    -------
+    mentions_to_JSON(mentions)
+        Serializes a list of `processors.odin.Mention` to a JSON string.
+    mentions_from_JSON(jdict, documents=None, qualify_ids=False)
+        Loads `processors.odin.Mention` from a dictionary of JSON data.
+    mentions_to_JSON_lines(mentions, fh, max_documents=MAX_DOCUMENTS)
+        Streams `processors.odin.Mention` (and each of their `Document`s) to `fh` as JSON Lines.
+    mentions_from_JSON_lines(lines, max_documents=MAX_DOCUMENTS)
+        Lazily loads `processors.odin.Mention` from JSON Lines.
     """
+
+    DOCUMENT = "document"
+    MENTION = "mention"
+    # the number of documents held in memory when reading JSON Lines
+    MAX_DOCUMENTS = 100
+
     @staticmethod
     def mentions_to_JSON_dict(mentions):
         jdict = dict()
@@ -38,14 +55,58 @@ class JSONSerializer(object):
         return json.dumps(JSONSerializer.mentions_to_JSON_dict(mentions), sort_keys=True, indent=4)
 
     @staticmethod
-    def mentions_from_JSON(jdict):
+    def _rebind(documents_json, documents):
+        """
+        Maps each doc id in `documents_json` to one of `documents` (without decoding) where possible.
+        A `Document` is used if its id matches.  Otherwise, a single `Document` is used for a response with a single document (ex. when the server assigned the id).
+        Sentence counts must agree.
+        """
+        by_id = {doc.id: doc for doc in documents if doc.id is not None}
+        docs_dict = dict()
+        for (doc_id, djson) in documents_json.items():
+            doc = by_id.get(doc_id, None)
+            if doc is None and len(documents) == 1 and len(documents_json) == 1:
+                doc = documents[0]
+            if doc is not None and doc.size == len(djson["sentences"]):
+                docs_dict[doc_id] = doc
+        return docs_dict
+
+    @staticmethod
+    def _to_parent(mjson, views, doc_id=None, qualify_ids=False):
+        """
+        Maps the sentence indices of `mjson` (and those of its trigger and arguments) from a `DocumentView` to its parent.
+        If `qualify_ids`, the parent sentence index is appended to each id (ex. T:123@4).
+        """
+        doc_id = mjson.get("document", doc_id)
+        view = views.get(doc_id, None)
+        if view is None:
+            return mjson
+        sentence = view.to_parent(mjson["sentence"])
+        mjson = dict(mjson, sentence=sentence)
+        if qualify_ids and mjson.get("id", None) is not None:
+            mjson["id"] = "{}@{}".format(mjson["id"], sentence)
+        if mjson.get("trigger", None) is not None:
+            mjson["trigger"] = JSONSerializer._to_parent(mjson["trigger"], views, doc_id, qualify_ids)
+        if mjson.get("arguments", None) is not None:
+            mjson["arguments"] = {role: [JSONSerializer._to_parent(a, views, doc_id, qualify_ids) for a in args] for (role, args) in mjson["arguments"].items()}
+        return mjson
+
+    @staticmethod
+    def mentions_from_JSON(jdict, documents=None, qualify_ids=False):
         """
         Loads `processors.odin.Mention` from a dictionary of JSON data (`jdict`).
+        Mentions that share an id (ex. an argument of several events) are deserialized once and shared.
 
         Parameters
         ----------
         jdict : dict
             A dictionary of JSON data encoding a list of `Mention`s and their corresponding `Document`s.
+        documents : [processors.ds.Document] or None
+            Documents already in memory (ex. those sent to the server).  Mentions are attached to these instead of decoding the matching documents in `jdict` (see `JSONSerializer._rebind`).
+            Mentions of a `processors.ds.DocumentView` are attached to its parent (with sentence indices mapped to the parent).
+        qualify_ids : bool
+            Whether to append the parent sentence index to the id of each mention of a `processors.ds.DocumentView` (ex. T:123@4).
+            Ids are only unique within a response, so this avoids collisions when merging the mentions of several views of one `Document`.
 
         Returns
         -------
@@ -53,11 +114,103 @@ class JSONSerializer(object):
             A list of `processors.odin.Mention`
         """
         # build map of documents
-        docs_dict = {doc_id:Document.load_from_JSON(djson) for (doc_id, djson) in jdict["documents"].items()}
-        # deserialize mentions
-        mns_json = jdict["mentions"]
-        mentions = []
-        for mjson in mns_json:
-            m = Mention.load_from_JSON(mjson, docs_dict)
-            mentions.append(m)
-        return mentions
+        docs_dict = JSONSerializer._rebind(jdict["documents"], documents) if documents else dict()
+        for (doc_id, djson) in jdict["documents"].items():
+            if doc_id not in docs_dict:
+                docs_dict[doc_id] = Document.load_from_JSON(djson)
+        # mentions of a view are attached to its parent
+        views = {doc_id: doc for (doc_id, doc) in docs_dict.items() if isinstance(doc, DocumentView)}
+        if views:
+            for (doc_id, view) in views.items():
+                docs_dict[doc_id] = view.parent
+            jdict = dict(jdict, mentions=[JSONSerializer._to_parent(mjson, views, qualify_ids=qualify_ids) for mjson in jdict["mentions"]])
+        # deserialize mentions.
+        # triggers and arguments are resolved lazily through the shared table
+        mention_table = MentionTable(docs_dict)
+        return [mention_table.mention(mjson) for mjson in jdict["mentions"]]
+
+    @staticmethod
+    def mentions_to_JSON_lines(mentions, fh, max_documents=MAX_DOCUMENTS):
+        """
+        Streams `mentions` to `fh` as JSON Lines.
+        Each `Document` is written (as a "document" record) before the first of its mentions (as "mention" records).
+        A `Document` is written again if a reader using the same `max_documents` would have discarded it, so the output can always be read back by `JSONSerializer.mentions_from_JSON_lines`.
+        Only the ids of recently written documents are kept in memory.
+
+        Parameters
+        ----------
+        mentions : iterable of processors.odin.Mention
+            The mentions to serialize.  Consumed lazily.
+        fh : file
+            A file-like object open for writing text.
+        max_documents : int
+            The number of documents a reader holds in memory (see `JSONSerializer.mentions_from_JSON_lines`).
+
+        Returns
+        -------
+        int
+            The number of mentions written.
+        """
+        # doc ids a reader would still hold, least recently used first
+        written = OrderedDict()
+        count = 0
+        for m in mentions:
+            if m._doc_id in written:
+                written.pop(m._doc_id)
+            else:
+                record = {"type": JSONSerializer.DOCUMENT, "id": m._doc_id, "document": m.document.to_JSON_dict()}
+                fh.write(json.dumps(record, sort_keys=True))
+                fh.write("\n")
+            written[m._doc_id] = True
+            while len(written) > max_documents:
+                written.popitem(last=False)
+            record = {"type": JSONSerializer.MENTION, "mention": m.to_JSON_dict()}
+            fh.write(json.dumps(record, sort_keys=True))
+            fh.write("\n")
+            count += 1
+        return count
+
+    @staticmethod
+    def mentions_from_JSON_lines(lines, max_documents=MAX_DOCUMENTS):
+        """
+        Lazily loads `processors.odin.Mention` from JSON Lines written by `JSONSerializer.mentions_to_JSON_lines`.
+        Each `Document` is only deserialized when the first of its mentions is read.
+        Mentions that share an id and document are deserialized once and shared.
+
+        Parameters
+        ----------
+        lines : iterable of str
+            The JSON Lines (ex. a file object).
+        max_documents : int
+            At most this many documents (and their mentions) are held in memory.  The least recently used document is discarded first.
+            Use the same value that was given to `JSONSerializer.mentions_to_JSON_lines`.
+
+        Returns
+        -------
+        generator
+            Yields each `processors.odin.Mention` in the order it was written.
+        """
+        # doc id -> document JSON or MentionTable (once its Document has been built)
+        documents = OrderedDict()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["type"] == JSONSerializer.DOCUMENT:
+                # a document written again replaces the discarded (or stale) copy
+                documents.pop(record["id"], None)
+                documents[record["id"]] = record["document"]
+            else:
+                mjson = record["mention"]
+                doc_id = mjson["document"]
+                if doc_id not in documents:
+                    raise KeyError("Document {} is not available.  It was either never written or discarded (see max_documents).".format(doc_id))
+                entry = documents.pop(doc_id)
+                if not isinstance(entry, MentionTable):
+                    entry = MentionTable({doc_id: Document.load_from_JSON(entry)})
+                # most recently used
+                documents[doc_id] = entry
+                yield entry.mention(mjson)
+            while len(documents) > max_documents:
+                documents.popitem(last=False)
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from processors.tensors import Vocabulary
+from processors.serialization import JSONSerializer
+from collections import OrderedDict
+import numpy as np
+import json
+
+
+class MentionColumns(object):
+    """
+    A columnar table of mentions built directly from Odin or OpenIE JSON (see `processors.serialization.JSONSerializer.mentions_from_JSON`).
+
+    No `processors.odin.Mention` or `processors.ds.Document` is built, so the table holds only the fields needed for analytics.
+    Each distinct mention (including triggers and arguments) is one row.  Repeated strings (labels, types, documents, and rules) are dictionary-encoded as int32 codes.
+    Arguments are stored in a child table that refers to rows by position.
+
+    Parameters
+    ----------
+    arrays : dict
+        str -> numpy.ndarray (see Attributes).
+    vocabularies : dict
+        column -> `processors.tensors.Vocabulary` for each dictionary-encoded column ("label", "type", "document", "foundBy", and "role").
+
+    Attributes
+    ----------
+    id : numpy.ndarray
+        object array of mention ids.
+    text : numpy.ndarray
+        object array of the text of each mention.  If the JSON has no "text", it is the words of the mention (as in `processors.odin.Mention.text`).
+    label : numpy.ndarray
+        int32 codes for the label of each mention.
+    type : numpy.ndarray
+        int32 codes for the type of each mention (see `processors.odin.Mention.TBM`).
+    document : numpy.ndarray
+        int32 codes for the doc id of each mention.
+    foundBy : numpy.ndarray
+        int32 codes for the rule that produced each mention.
+    sentence : numpy.ndarray
+        int32 sentence index of each mention.
+    start : numpy.ndarray
+        int32 token index that starts each mention.
+    end : numpy.ndarray
+        int32 token index that ends each mention (exclusive).
+    characterStartOffset : numpy.ndarray
+        int64 character offset that starts each mention.
+    characterEndOffset : numpy.ndarray
+        int64 character offset that ends each mention.
+    trigger : numpy.ndarray
+        int64 row of each mention's trigger (-1 if none).
+    top_level : numpy.ndarray
+        bool indicating whether each mention was listed in the JSON (as opposed to only appearing as a trigger or argument).
+    arguments : dict
+        The child table: "parent" (int64 row of the mention), "role" (int32 codes), and "argument" (int64 row of the argument).
+
+    Methods
+    -------
+    from_JSON(jdict)
+        Builds `MentionColumns` from a dictionary of mention JSON.
+    from_JSON_lines(lines, max_documents=JSONSerializer.MAX_DOCUMENTS)
+        Builds `MentionColumns` from JSON Lines written by `processors.serialization.JSONSerializer.mentions_to_JSON_lines`.
+    decode(column)
+        The values of a dictionary-encoded column.  Values missing from the JSON (ex. a mention without a "document") are None.
+    to_pandas()
+        Exports the mentions and arguments to a pair of `pandas.DataFrame`.  Missing values become NaN.
+    to_arrow()
+        Exports the mentions and arguments to a pair of `pyarrow.Table`.  Missing values become null.
+    """
+
+    ENCODED = ("label", "type", "document", "foundBy")
+    INTEGERS = (("sentence", np.int32), ("start", np.int32), ("end", np.int32), ("characterStartOffset", np.int64), ("characterEndOffset", np.int64), ("trigger", np.int64))
+    COLUMNS = ("id", "text") + ENCODED + tuple(name for (name, _) in INTEGERS) + ("top_level",)
+
+    def __init__(self, arrays, vocabularies):
+        for name in MentionColumns.COLUMNS:
+            setattr(self, name, arrays[name])
+        self.arguments = {name: arrays["arguments_{}".format(name)] for name in ("parent", "role", "argument")}
+        self.vocabularies = vocabularies
+
+    def __len__(self):
+        return len(self.id)
+
+    @staticmethod
+    def from_JSON(jdict):
+        """
+        Builds `MentionColumns` from a dictionary of mention JSON (ex. the response of `processors.api.OdinAPI` or `processors.api.OpenIEAPI`).
+        The "documents" in `jdict` are never deserialized.
+
+        Parameters
+        ----------
+        jdict : dict
+            A dictionary of JSON data encoding a list of mentions (and their documents).
+
+        Returns
+        -------
+        processors.tables.MentionColumns
+        """
+        builder = _ColumnBuilder(jdict.get("documents", None))
+        for mjson in jdict["mentions"]:
+            builder.add(mjson, top_level=True)
+        return builder.build()
+
+    @staticmethod
+    def from_JSON_lines(lines, max_documents=JSONSerializer.MAX_DOCUMENTS):
+        """
+        Builds `MentionColumns` from JSON Lines written by `processors.serialization.JSONSerializer.mentions_to_JSON_lines`.
+        Document records are never parsed into a `processors.ds.Document`.  They are only used for the text of each mention.
+
+        Parameters
+        ----------
+        lines : iterable of str
+            The JSON Lines (ex. a file object).
+        max_documents : int
+            At most this many document records are held in memory (see `processors.serialization.JSONSerializer.mentions_from_JSON_lines`).
+
+        Returns
+        -------
+        processors.tables.MentionColumns
+        """
+        # doc id -> document JSON, least recently used first
+        documents = OrderedDict()
+        builder = _ColumnBuilder(documents)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["type"] == JSONSerializer.DOCUMENT:
+                documents.pop(record["id"], None)
+                documents[record["id"]] = record["document"]
+                while len(documents) > max_documents:
+                    documents.popitem(last=False)
+            else:
+                mjson = record["mention"]
+                if mjson.get("document", None) in documents:
+                    # most recently used
+                    documents[mjson["document"]] = documents.pop(mjson["document"])
+                builder.add(mjson, top_level=True)
+        return builder.build()
+
+    def decode(self, column):
+        """
+        The values (as an object array) of a dictionary-encoded column (ex. "label").
+        """
+        codes = self.arguments["role"] if column == "role" else getattr(self, column)
+        return np.array(self.vocabularies[column].items, dtype=object)[codes]
+
+    def _categories(self, codes, column):
+        """
+        The codes and categories of a dictionary-encoded column, with None (a missing value) removed from the categories and coded as -1.
+        """
+        items = self.vocabularies[column].items
+        if None not in items:
+            return (codes, items)
+        missing = items.index(None)
+        remapped = np.where(codes > missing, codes - 1, codes).astype(codes.dtype)
+        remapped[codes == missing] = -1
+        return (remapped, items[:missing] + items[missing + 1:])
+
+    def to_pandas(self):
+        """
+        Exports the mentions and arguments to a pair of `pandas.DataFrame`.  Requires `pandas`.
+        Dictionary-encoded columns become `pandas.Categorical` built from the existing codes.
+
+        Returns
+        -------
+        (pandas.DataFrame, pandas.DataFrame)
+            The mentions and the arguments.  The index of the mentions is the row referenced by "trigger", "parent", and "argument".
+        """
+        import pandas as pd
+
+        def categorical(codes, column):
+            (codes, categories) = self._categories(codes, column)
+            return pd.Categorical.from_codes(codes, categories=categories)
+
+        mentions = dict()
+        for name in MentionColumns.COLUMNS:
+            values = getattr(self, name)
+            mentions[name] = categorical(values, name) if name in MentionColumns.ENCODED else values
+        arguments = {
+            "parent": self.arguments["parent"],
+            "role": categorical(self.arguments["role"], "role"),
+            "argument": self.arguments["argument"]
+        }
+        return (
+            pd.DataFrame(mentions, columns=list(MentionColumns.COLUMNS)),
+            pd.DataFrame(arguments, columns=["parent", "role", "argument"])
+        )
+
+    def to_arrow(self):
+        """
+        Exports the mentions and arguments to a pair of `pyarrow.Table`.  Requires `pyarrow`.
+        Numeric columns wrap the underlying buffers, and dictionary-encoded columns become `pyarrow.DictionaryArray`.
+
+        Returns
+        -------
+        (pyarrow.Table, pyarrow.Table)
+            The mentions and the arguments.
+        """
+        import pyarrow as pa
+
+        def dictionary(codes, column):
+            (codes, categories) = self._categories(codes, column)
+            return pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), pa.array(categories, type=pa.string()))
+
+        mentions = []
+        for name in MentionColumns.COLUMNS:
+            values = getattr(self, name)
+            if name in MentionColumns.ENCODED:
+                mentions.append(dictionary(values, name))
+            elif values.dtype == object:
+                mentions.append(pa.array(values, type=pa.string()))
+            else:
+                mentions.append(pa.array(values))
+        arguments = [
+            pa.array(self.arguments["parent"]),
+            dictionary(self.arguments["role"], "role"),
+            pa.array(self.arguments["argument"])
+        ]
+        return (
+            pa.Table.from_arrays(mentions, names=list(MentionColumns.COLUMNS)),
+            pa.Table.from_arrays(arguments, names=["parent", "role", "argument"])
+        )
+
+
+class _ColumnBuilder(object):
+    """
+    Accumulates the rows of a `MentionColumns`.  Mentions are identified by (doc id, mention id), so shared triggers and arguments are stored once.
+    """
+
+    def __init__(self, documents=None):
+        # doc id -> document JSON, used for the text of mentions without "text"
+        self.documents = documents if documents is not None else dict()
+        self.vocabularies = {column: Vocabulary() for column in MentionColumns.ENCODED + ("role",)}
+        self.columns = {name: [] for name in MentionColumns.COLUMNS}
+        self.arguments = {name: [] for name in ("parent", "role", "argument")}
+        self._rows = dict()
+
+    def add(self, mjson, top_level=False, default_doc_id=None):
+        """
+        Adds `mjson` (and, recursively, its trigger and arguments), returning its row.
+        """
+        doc_id = mjson.get("document", default_doc_id)
+        key = (doc_id, mjson.get("id", None))
+        row = self._rows.get(key, None) if key[1] is not None else None
+        if row is not None:
+            if top_level:
+                self.columns["top_level"][row] = True
+            return row
+        row = len(self.columns["id"])
+        if key[1] is not None:
+            self._rows[key] = row
+        labels = mjson["labels"]
+        interval = mjson["tokenInterval"]
+        trigger = mjson.get("trigger", None)
+        arguments = mjson.get("arguments", None)
+        if trigger is not None:
+            mention_type = "EventMention"
+        elif arguments is None:
+            mention_type = "TextBoundMention"
+        else:
+            mention_type = "RelationMention"
+        values = {
+            "id": mjson.get("id", None),
+            "text": mjson["text"] if "text" in mjson else self._text(doc_id, mjson["sentence"], interval),
+            "label": self.vocabularies["label"].id_for(mjson.get("label", labels[0])),
+            "type": self.vocabularies["type"].id_for(mjson.get("type", mention_type)),
+            "document": self.vocabularies["document"].id_for(doc_id),
+            "foundBy": self.vocabularies["foundBy"].id_for(mjson["foundBy"]),
+            "sentence": mjson["sentence"],
+            "start": interval["start"],
+            "end": interval["end"],
+            "characterStartOffset": mjson.get("characterStartOffset", -1),
+            "characterEndOffset": mjson.get("characterEndOffset", -1),
+            # filled in below
+            "trigger": -1,
+            "top_level": top_level
+        }
+        for (name, value) in values.items():
+            self.columns[name].append(value)
+        if trigger is not None:
+            self.columns["trigger"][row] = self.add(trigger, default_doc_id=doc_id)
+        for (role, args) in (arguments or dict()).items():
+            for arg in args:
+                arg_row = self.add(arg, default_doc_id=doc_id)
+                self.arguments["parent"].append(row)
+                self.arguments["role"].append(self.vocabularies["role"].id_for(role))
+                self.arguments["argument"].append(arg_row)
+        return row
+
+    def _text(self, doc_id, sentence, interval):
+        """
+        The words of a mention (as in `processors.odin.Mention.text`), or None if its document is not available.
+        """
+        djson = self.documents.get(doc_id, None)
+        if djson is None:
+            return None
+        words = djson["sentences"][sentence]["words"]
+        return " ".join(words[interval["start"]:interval["end"]])
+
+    def build(self):
+        arrays = {
+            "id": np.array(self.columns["id"], dtype=object),
+            "text": np.array(self.columns["text"], dtype=object),
+            "top_level": np.array(self.columns["top_level"], dtype=np.bool_),
+            "arguments_parent": np.array(self.arguments["parent"], dtype=np.int64),
+            "arguments_role": np.array(self.arguments["role"], dtype=np.int32),
+            "arguments_argument": np.array(self.arguments["argument"], dtype=np.int64)
+        }
+        for column in MentionColumns.ENCODED:
+            arrays[column] = np.array(self.columns[column], dtype=np.int32)
+        for (name, dtype) in MentionColumns.INTEGERS:
+            arrays[name] = np.array(self.columns[name], dtype=dtype)
+        return MentionColumns(arrays, self.vocabularies)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import numpy as np
+import os
+
+
+class Vocabulary(object):
+    """
+    A mapping of str -> int id.  Ids are assigned in order of first appearance and never change, so a single `Vocabulary` can be shared across shards.
+
+    Parameters
+    ----------
+    items : [str] or None
+        Initial entries.
+
+    Attributes
+    ----------
+    items : [str]
+        The entries, where the id of each entry is its position.
+
+    Methods
+    -------
+    id_for(item)
+        Retrieves (or assigns) the id for `item`.
+    """
+
+    def __init__(self, items=None):
+        self.items = []
+        self._ids = dict()
+        for item in (items or []):
+            self.id_for(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self._ids
+
+    def id_for(self, item):
+        """
+        Retrieves (or assigns) the id for `item`.
+        """
+        i = self._ids.get(item, None)
+        if i is None:
+            i = len(self.items)
+            self._ids[item] = i
+            self.items.append(item)
+        return i
+
+    def to_array(self):
+        return np.array(self.items, dtype=np.str_)
+
+
+class GraphTensors(object):
+    """
+    Sparse (COO) arrays for the syntactic dependency graphs of a batch of `processors.ds.Document`.
+
+    Token indices are global to the batch, so the edges of every sentence can be fed to a graph-learning model as a single block-diagonal adjacency matrix.
+    Use `sentence_offsets` and `edge_offsets` to recover per-sentence slices (i.e., `sentence_offsets[i]:sentence_offsets[i+1]`).
+
+    Parameters
+    ----------
+    arrays : dict
+        str -> numpy.ndarray (see Attributes).
+    relations : processors.tensors.Vocabulary
+        The relation vocabulary for `rel`.
+    features : dict
+        form (ex. "words") -> `processors.tensors.Vocabulary` for the corresponding token feature ids.
+
+    Attributes
+    ----------
+    src : numpy.ndarray
+        int64 source token index of each edge.
+    dst : numpy.ndarray
+        int64 destination token index of each edge.
+    rel : numpy.ndarray
+        int32 relation id of each edge.
+    sentence_offsets : numpy.ndarray
+        int64 token offset of each sentence (length is the number of sentences + 1).
+    edge_offsets : numpy.ndarray
+        int64 edge offset of each sentence (length is the number of sentences + 1).
+    document_offsets : numpy.ndarray
+        int64 sentence offset of each document (length is the number of documents + 1).
+    token_features : dict
+        form -> int32 numpy.ndarray of feature ids aligned with the batch's tokens.
+
+    Methods
+    -------
+    from_document(doc, **kwargs)
+        Builds `GraphTensors` for a single `Document`.
+    from_documents(docs, graph_name=None, forms=("words", "lemmas", "tags"), relations=None, features=None)
+        Builds `GraphTensors` for a batch of `Document`s.
+    to_csr()
+        Converts the edges to compressed sparse row (CSR) arrays.
+    to_scipy()
+        Wraps the edges in a `scipy.sparse.coo_matrix` without copying.
+    save_npz(path, compressed=True)
+        Writes the arrays and vocabularies to a `.npz` file.
+    load_npz(path)
+        Reads `GraphTensors` from a `.npz` file.
+    write_shards(docs, directory, shard_size=1000, **kwargs)
+        Writes `.npz` shards of `shard_size` documents.
+    """
+
+    FORMS = {"words": "words", "lemmas": "lemmas", "tags": "tags", "entities": "_entities", "chunks": "_chunks"}
+
+    def __init__(self, arrays, relations, features):
+        self.src = arrays["src"]
+        self.dst = arrays["dst"]
+        self.rel = arrays["rel"]
+        self.sentence_offsets = arrays["sentence_offsets"]
+        self.edge_offsets = arrays["edge_offsets"]
+        self.document_offsets = arrays["document_offsets"]
+        self.token_features = {form: arrays["features_{}".format(form)] for form in features}
+        self.relations = relations
+        self.features = features
+
+    @property
+    def num_tokens(self):
+        return int(self.sentence_offsets[-1])
+
+    @property
+    def num_edges(self):
+        return int(self.edge_offsets[-1])
+
+    @staticmethod
+    def from_document(doc, **kwargs):
+        """
+        Builds `GraphTensors` for a single `processors.ds.Document`.  See `GraphTensors.from_documents`.
+        """
+        return GraphTensors.from_documents([doc], **kwargs)
+
+    @staticmethod
+    def from_documents(docs, graph_name=None, forms=("words", "lemmas", "tags"), relations=None, features=None):
+        """
+        Builds `GraphTensors` for a batch of `processors.ds.Document`.
+
+        Parameters
+        ----------
+        docs : [processors.ds.Document]
+            The documents in the batch.
+        graph_name : str or None
+            The graph to export.  None uses `processors.ds.Sentence.dependencies`.  Sentences without the graph contribute tokens, but no edges.
+        forms : [str]
+            The token features to export.  Any of "words", "lemmas", "tags", "entities", and "chunks".
+        relations : processors.tensors.Vocabulary or None
+            A relation vocabulary to extend (ex. one shared across shards).
+        features : dict or None
+            form -> `processors.tensors.Vocabulary` to extend (ex. ones shared across shards).
+
+        Returns
+        -------
+        processors.tensors.GraphTensors
+        """
+        relations = relations if relations is not None else Vocabulary()
+        features = features if features is not None else dict()
+        for form in forms:
+            if form not in GraphTensors.FORMS:
+                raise ValueError("form must be one of {}".format(", ".join(sorted(GraphTensors.FORMS))))
+            features.setdefault(form, Vocabulary())
+        sentences = [s for doc in docs for s in doc.sentences]
+        graphs = [(s.dependencies if not graph_name else (s.graphs or dict()).get(graph_name, None)) for s in sentences]
+        edge_counts = [len(g.edges) if g is not None else 0 for g in graphs]
+        # offsets are computed up front so that each array can be filled in one pass
+        sentence_offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+        np.cumsum([s.length for s in sentences], out=sentence_offsets[1:])
+        edge_offsets = np.zeros(len(sentences) + 1, dtype=np.int64)
+        np.cumsum(edge_counts, out=edge_offsets[1:])
+        document_offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        np.cumsum([len(doc.sentences) for doc in docs], out=document_offsets[1:])
+        num_edges = int(edge_offsets[-1])
+        num_tokens = int(sentence_offsets[-1])
+
+        def edges():
+            for (g, offset) in zip(graphs, sentence_offsets):
+                if g is not None:
+                    for e in g.edges:
+                        yield (e.source + offset, e.destination + offset, relations.id_for(e.relation))
+
+        coo = np.fromiter(edges(), dtype=np.dtype([("src", np.int64), ("dst", np.int64), ("rel", np.int32)]), count=num_edges)
+        # fields of a structured array are strided views, so copy each into a contiguous array (ex. for torch.from_numpy)
+        arrays = {
+            "src": np.ascontiguousarray(coo["src"]),
+            "dst": np.ascontiguousarray(coo["dst"]),
+            "rel": np.ascontiguousarray(coo["rel"]),
+            "sentence_offsets": sentence_offsets,
+            "edge_offsets": edge_offsets,
+            "document_offsets": document_offsets
+        }
+        for form in forms:
+            attr = GraphTensors.FORMS[form]
+            vocab = features[form]
+            arrays["features_{}".format(form)] = np.fromiter(
+                (vocab.id_for(tok) for s in sentences for tok in getattr(s, attr)),
+                dtype=np.int32,
+                count=num_tokens
+            )
+        return GraphTensors(arrays, relations, {form: features[form] for form in forms})
+
+    def to_csr(self):
+        """
+        Converts the edges to compressed sparse row (CSR) arrays over the batch's tokens.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray, numpy.ndarray)
+            `indptr` (length is the number of tokens + 1), `indices` (destination token indices), and `data` (relation ids).
+        """
+        order = np.argsort(self.src, kind="stable")
+        indptr = np.zeros(self.num_tokens + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=self.num_tokens), out=indptr[1:])
+        return (indptr, self.dst[order], self.rel[order])
+
+    def to_scipy(self):
+        """
+        Wraps the edges in a `scipy.sparse.coo_matrix` (relation ids as data) without copying.  Requires `scipy`.
+        """
+        from scipy.sparse import coo_matrix
+        shape = (self.num_tokens, self.num_tokens)
+        return coo_matrix((self.rel, (self.src, self.dst)), shape=shape, copy=False)
+
+    def _to_arrays(self):
+        arrays = {
+            "src": self.src,
+            "dst": self.dst,
+            "rel": self.rel,
+            "sentence_offsets": self.sentence_offsets,
+            "edge_offsets": self.edge_offsets,
+            "document_offsets": self.document_offsets,
+            "relations": self.relations.to_array()
+        }
+        for (form, ids) in self.token_features.items():
+            arrays["features_{}".format(form)] = ids
+            arrays["vocab_{}".format(form)] = self.features[form].to_array()
+        return arrays
+
+    def save_npz(self, path, compressed=True):
+        """
+        Writes the arrays and vocabularies to a `.npz` file.
+        """
+        save = np.savez_compressed if compressed else np.savez
+        save(path, **self._to_arrays())
+
+    @staticmethod
+    def load_npz(path):
+        """
+        Reads `GraphTensors` from a `.npz` file written by `GraphTensors.save_npz`.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+        relations = Vocabulary(arrays["relations"].tolist())
+        features = {k[len("vocab_"):]: Vocabulary(v.tolist()) for (k, v) in arrays.items() if k.startswith("vocab_")}
+        return GraphTensors(arrays, relations, features)
+
+    @staticmethod
+    def write_shards(docs, directory, shard_size=1000, prefix="graphs", compressed=True, **kwargs):
+        """
+        Writes the graphs of `docs` to `.npz` shards of (at most) `shard_size` documents.
+        Relation and feature vocabularies are shared across shards, so ids are consistent throughout.
+
+        Parameters
+        ----------
+        docs : iterable of processors.ds.Document
+            The documents to export.  Consumed lazily, so only one shard is held in memory at a time.
+        directory : str
+            The directory for the shards.
+        shard_size : int
+            The number of documents per shard.
+        prefix : str
+            The file name prefix for each shard (ex. graphs-00000.npz).
+
+        Other keyword arguments are passed to `GraphTensors.from_documents`.
+
+        Returns
+        -------
+        [str]
+            The paths of the written shards.
+        """
+        kwargs.setdefault("relations", Vocabulary())
+        kwargs.setdefault("features", dict())
+        paths = []
+        batch = []
+
+        def flush():
+            path = os.path.join(directory, "{}-{:05d}.npz".format(prefix, len(paths)))
+            GraphTensors.from_documents(batch, **kwargs).save_npz(path, compressed=compressed)
+            paths.append(path)
+
+        for doc in docs:
+            batch.append(doc)
+            if len(batch) == shard_size:
+                flush()
+                batch = []
+        if batch:
+            flush()
+        return paths
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors.annotators import Processor, MergedAnnotation
+import threading
+import copy
+import json
+import time
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing concurrent annotation with several processors and merging of their layers.
+'''
+
+class _Rendezvous(object):
+    """
+    Blocks each caller until `parties` callers have arrived.  Raises an exception if they don't overlap within `timeout` seconds.
+    """
+
+    def __init__(self, parties, timeout=5.0):
+        self.parties = parties
+        self.timeout = timeout
+        self.arrived = 0
+        self._condition = threading.Condition()
+
+    def wait(self):
+        with self._condition:
+            self.arrived += 1
+            self._condition.notify_all()
+            deadline = time.time() + self.timeout
+            while self.arrived < self.parties:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception("Calls did not overlap")
+                self._condition.wait(remaining)
+
+
+class _FakeProcessor(Processor):
+    """
+    Simulates a processor that returns the same document JSON.  If a barrier is given, the request only completes once every processor sharing the barrier has been called.
+    """
+
+    def __init__(self, jdict, barrier=None):
+        super(_FakeProcessor, self).__init__("http://localhost:1")
+        self.jdict = jdict
+        self.barrier = barrier
+
+    def _message_to_json_dict(self, msg, timeout=None):
+        if self.barrier is not None:
+            self.barrier.wait()
+        if self.jdict is None:
+            raise Exception("Server error")
+        return copy.deepcopy(self.jdict)
+
+
+class MergedAnnotationTests(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            self.fast = json.load(jf)
+        self.bio = copy.deepcopy(self.fast)
+        for s in self.bio["sentences"]:
+            s["entities"] = ["B-Gene_or_gene_product"] * len(s["words"])
+            s["graphs"] = dict()
+
+    def test_merge(self):
+        "MergedAnnotation.fan_out should merge layers from each processor concurrently"
+        barrier = _Rendezvous(2)
+        processors = {"fastnlp": _FakeProcessor(self.fast, barrier), "bionlp": _FakeProcessor(self.bio, barrier)}
+        res = MergedAnnotation.fan_out("text", processors, {"entities": "bionlp", "graphs": "fastnlp", "chunks": "fastnlp"})
+        self.assertEqual(res.errors, dict(), "Processors should be called concurrently")
+        self.assertTrue(res.agrees, "Problem merging layers")
+        s = res.document.sentences[0]
+        self.assertEqual(s._entities, self.bio["sentences"][0]["entities"], "entities should come from bionlp")
+        self.assertEqual(s.to_JSON_dict()["graphs"], self.fast["sentences"][0]["graphs"], "graphs should come from fastnlp")
+        self.assertEqual(set(res.seconds), {"fastnlp", "bionlp"}, "Problem timing processors")
+
+    def test_mismatch(self):
+        "MergedAnnotation.fan_out should report the alignment when tokenization disagrees"
+        s = self.bio["sentences"][0]
+        # split the first token in two
+        (start, end) = (s["startOffsets"][0], s["endOffsets"][0])
+        s["startOffsets"] = [start, start + 1] + s["startOffsets"][1:]
+        s["endOffsets"] = [start + 1, end] + s["endOffsets"][1:]
+        s["words"] = [s["words"][0][:1], s["words"][0][1:]] + s["words"][1:]
+        s["entities"] = ["O"] + s["entities"]
+        processors = {"fastnlp": _FakeProcessor(self.fast), "bionlp": _FakeProcessor(self.bio)}
+        res = MergedAnnotation.fan_out("text", processors, {"entities": "bionlp", "tags": "fastnlp"}, tokens="fastnlp")
+        self.assertFalse(res.agrees, "Tokenization should disagree")
+        self.assertEqual(res.skipped, {"entities": "bionlp"}, "Mismatched layer should be skipped")
+        self.assertEqual(res.document.sentences[0]._entities, self.fast["sentences"][0]["entities"], "Mismatched layer should not be merged")
+        alignment = res.alignments["bionlp"]
+        self.assertEqual(alignment.mismatched_sentences, [0], "Problem finding mismatched sentences")
+        self.assertEqual(alignment.pairs[:2], [((0, 0), (0, 0)), ((0, 0), (0, 1))], "Split token should align with the original token")
+        self.assertEqual(alignment.unaligned, [], "Every token should be aligned")
+
+    def test_failure(self):
+        "MergedAnnotation.fan_out should skip the layers of a failed processor"
+        processors = {"fastnlp": _FakeProcessor(self.fast), "bionlp": _FakeProcessor(None)}
+        res = MergedAnnotation.fan_out("text", processors, {"entities": "bionlp", "tags": "fastnlp"}, tokens="fastnlp")
+        self.assertEqual(res.skipped, {"entities": "bionlp"}, "Layers of a failed processor should be skipped")
+        self.assertEqual(list(res.errors), ["bionlp"], "Failed request should be recorded")
+        self.assertIsNotNone(res.document, "Problem merging layers")
+        self.assertRaises(ValueError, MergedAnnotation.fan_out, "text", processors, {"entities": "clu"})
+
+if __name__ == "__main__":
+    unittest.main()
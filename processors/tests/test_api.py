@@ -135,6 +135,14 @@ class ProcessorsAPITests(unittest.TestCase):
         scores = API.sentiment.corenlp.score_segmented_text(sentences)
         self.assertTrue(len(scores) == len(sentences), "there should be {} scores, but only {} were produced :(".format(len(sentences), len(scores)))
 
+    def test_sentiment_analysis_score_many(self):
+        "API.sentiment.corenlp.score_many should return a score for each text"
+
+        texts = ["This is a terribly sad sentence.", "I'm pretty happy, though :) !"] * 5
+        scores = list(API.sentiment.corenlp.score_many(texts, batch_size=3, max_in_flight=2))
+        self.assertEqual(len(scores), len(texts), "there should be {} scores, but {} were produced".format(len(texts), len(scores)))
+        self.assertEqual(scores[:2] * 5, scores, "scores should be independent of batching")
+
     def test_sentiment_analysis_score_method(self):
         "API.sentiment.corenlp.score should be able to determine the appropriate API endpoint for the given parameter"
 
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.api import OdinAPI, DocumentWithRules
+from processors.cache import ResultCache
+from processors.utils import ServerVersion
+import tempfile
+import time
+import shutil
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing the cache of extraction results.
+'''
+
+class ResultCacheTests(unittest.TestCase):
+
+    RULES = "- name: example\n  label: Example\n  type: token\n  pattern: |\n    [word=example]\n"
+    URL = "https://raw.githubusercontent.com/clu-ling/py-processors/master/processors/tests/example-rules.yml"
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file) as jf:
+            self.jdict = json.load(jf)
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_get_and_put(self):
+        "ResultCache should return stored results and report hit rates per rule set"
+        cache = ResultCache()
+        self.assertIsNone(cache.get("odin", "{}", ResultCacheTests.RULES, "1.0"), "Empty cache should miss")
+        cache.put("odin", "{}", ResultCacheTests.RULES, "1.0", self.jdict)
+        self.assertEqual(cache.get("odin", "{}", ResultCacheTests.RULES, "1.0"), self.jdict, "Problem retrieving cached result")
+        # any part of the key should invalidate the result
+        self.assertIsNone(cache.get("odin", "{}", ResultCacheTests.RULES, "2.0"), "A new server version should miss")
+        self.assertIsNone(cache.get("odin", "{}", ResultCacheTests.URL, "1.0"), "New rules should miss")
+        stats = cache.stats()
+        rules_id = ResultCache.rules_id(ResultCacheTests.RULES)
+        self.assertEqual(stats[rules_id], {"hits": 1, "misses": 2, "hit_rate": 1 / 3.0}, "Problem with stats for yaml rules")
+        self.assertEqual(stats[ResultCacheTests.URL]["misses"], 1, "A url should be its own rules id")
+
+    def test_eviction(self):
+        "ResultCache should evict the least recently used results once it exceeds max_bytes"
+        cache = ResultCache()
+        cache.put("odin", "a", None, None, self.jdict)
+        cache.max_bytes = cache.size * 2
+        cache.put("odin", "b", None, None, self.jdict)
+        # a is now the most recently used
+        self.assertIsNotNone(cache.get("odin", "a", None, None))
+        cache.put("odin", "c", None, None, self.jdict)
+        self.assertEqual(len(cache), 2, "Cache should hold 2 results")
+        self.assertIsNone(cache.get("odin", "b", None, None), "Least recently used result should be evicted")
+        self.assertLessEqual(cache.size, cache.max_bytes, "Cache should not exceed max_bytes")
+        # replacing a result shouldn't count its size twice
+        size = cache.size
+        cache.put("odin", "c", None, None, self.jdict)
+        self.assertEqual(cache.size, size, "Problem tracking size of a replaced result")
+
+    def test_server_version(self):
+        "ServerVersion should remember a failed lookup for retry_after seconds"
+        version = ServerVersion("http://localhost:1")
+        self.assertIsNone(version.get(), "Unreachable server should have no version")
+        failed_at = version._failed_at
+        self.assertIsNone(version.get())
+        self.assertEqual(version._failed_at, failed_at, "Failed lookup should not be retried immediately")
+        version.retry_after = 0
+        time.sleep(0.01)
+        version.get()
+        self.assertGreater(version._failed_at, failed_at, "Failed lookup should be retried after retry_after")
+
+    def test_persistence(self):
+        "ResultCache should persist results to disk"
+        path = os.path.join(self.tmp_dir, "results.db")
+        cache = ResultCache(path)
+        cache.put("odin", "{}", ResultCacheTests.RULES, "1.0", self.jdict)
+        cache.close()
+        cache = ResultCache(path)
+        self.assertEqual(cache.get("odin", "{}", ResultCacheTests.RULES, "1.0"), self.jdict, "Problem reading persisted result")
+        cache.close()
+
+    def test_odin_cache_hit(self):
+        "OdinAPI should use cached results without contacting the server"
+        cache = ResultCache()
+        # nothing is listening on this port
+        odin = OdinAPI("http://localhost:1", cache=cache)
+        doc = JSONSerializer.mentions_from_JSON(self.jdict)[0].document
+        request = DocumentWithRules(doc, ResultCacheTests.RULES).to_JSON()
+        cache.put(odin._service, request, ResultCacheTests.RULES, odin.server_version(), self.jdict)
+        mentions = odin.extract_from_document(doc, ResultCacheTests.RULES)
+        self.assertEqual([m.id for m in mentions], [m["id"] for m in self.jdict["mentions"]], "Problem retrieving cached mentions")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors.utils import ConcurrencyLimit, AdaptiveConcurrency, post_json
+import requests
+import threading
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    # python 2.7
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+
+'''
+Testing adaptive limits on concurrent requests to each server.
+'''
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    """
+    Responds to /<status> with that status.
+    """
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(int(self.path.strip("/")))
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, *args):
+        pass
+
+
+class ConcurrencyLimitTests(unittest.TestCase):
+
+    def tearDown(self):
+        AdaptiveConcurrency.configure(enabled=False)
+
+    def test_aimd(self):
+        "ConcurrencyLimit should grow while saturated and back off on errors and slowdowns"
+        limit = ConcurrencyLimit(initial=2, max_limit=4, warmup=5)
+        for _ in range(50):
+            n = int(limit.limit)
+            for _ in range(n):
+                limit.acquire()
+            for _ in range(n):
+                limit.release(0.01)
+        self.assertEqual(limit.stats()["limit"], 4, "Limit should grow to max_limit while saturated")
+        limit.acquire()
+        limit.release(0.01, failed=True)
+        self.assertLess(limit.limit, 4, "Limit should decrease after an error")
+        self.assertEqual(limit.errors, 1, "Problem counting errors")
+        before = limit.limit
+        limit._last_decrease = 0.0
+        for _ in range(5):
+            limit.acquire()
+            limit.release(0.5)
+        self.assertLess(limit.limit, before, "Limit should decrease when latency rises")
+        self.assertGreaterEqual(limit.limit, limit.min_limit, "Limit should respect min_limit")
+
+    def test_acquire(self):
+        "ConcurrencyLimit should block requests over the limit"
+        limit = ConcurrencyLimit(initial=1)
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire(timeout=0.01), "Request over the limit should wait")
+        timer = threading.Timer(0.05, limit.release, args=(0.05,))
+        timer.start()
+        self.assertTrue(limit.acquire(timeout=1.0), "Released slot should be reused")
+        timer.join()
+        self.assertEqual(limit.in_flight, 1, "Problem tracking requests in flight")
+
+    def test_pool(self):
+        "AdaptiveConcurrency should track each server separately"
+        AdaptiveConcurrency.configure(initial=2)
+        services = ["http://a:8888/api/odin/extract", "http://b:8888/api/odin/extract"]
+        self.assertIs(AdaptiveConcurrency.for_service(services[0]), AdaptiveConcurrency.for_service("http://a:8888/version"))
+        self.assertEqual(AdaptiveConcurrency.choose(services, 1), services[1], "Ties should be broken in turn")
+        AdaptiveConcurrency.for_service(services[1]).acquire()
+        self.assertEqual(AdaptiveConcurrency.choose(services, 1), services[0], "Server with free slots should be favored")
+        limits = AdaptiveConcurrency.limits()
+        self.assertEqual(limits["http://b:8888"]["in_flight"], 1, "Problem reporting limits")
+        AdaptiveConcurrency.configure(enabled=False)
+        self.assertIsNone(AdaptiveConcurrency.for_service(services[0]), "Problem disabling limits")
+        self.assertEqual(AdaptiveConcurrency.choose(services, 1), services[1], "Services should be used in turn while disabled")
+
+    def test_overload(self):
+        "post_json should only back off on timeouts, connection errors, and 429/503 responses"
+        AdaptiveConcurrency.configure(initial=4)
+        self.assertRaises(requests.exceptions.ConnectionError, post_json, "http://localhost:1/api/annotate", "{}")
+        limit = AdaptiveConcurrency.for_service("http://localhost:1")
+        self.assertEqual((limit.errors, limit.in_flight), (1, 0), "Connection error should signal overload")
+        server = HTTPServer(("localhost", 0), _StatusHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            address = "http://localhost:{}".format(server.server_port)
+            for status in (200, 500, 503, 429):
+                post_json("{}/{}".format(address, status), "{}")
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(AdaptiveConcurrency.for_service(address).errors, 2, "Only 429 and 503 responses should signal overload")
+
+if __name__ == "__main__":
+    unittest.main()
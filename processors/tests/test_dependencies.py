@@ -2,6 +2,7 @@
 
 import unittest
 from processors import *
+from processors.paths import PathPattern, RelationCandidateMiner
 import os
 
 
@@ -41,5 +42,38 @@ class DependenciesTests(unittest.TestCase):
         indices_unlabeled = set([(1, 0), (1, 4), (18, 17), (4, 2), (4, 3), (5, 1), (5, 9), (5, 14), (8, 7), (9, 6), (9, 8), (9, 12), (12, 11), (14, 15), (14, 18), (15, 16)])
         self.assertEqual(set(s.bag_of_unlabeled_dependencies_using("index")), indices_unlabeled, "unlabeled dependencies for sentence using form 'index' were ill-formed.")
 
+    def test_path_pattern(self):
+        "PathPattern should match Odin-style paths locally"
+        json_file = os.path.join(__location__,'serialized_obama.json')
+        with open(json_file) as jf:
+            doc = Document.load_from_JSON(json.load(jf))
+        s = doc.sentences[1]
+        self.assertEqual(PathPattern("[lemma=be] <cop >nsubj").match_sentence(s), [(1, 5, 0)], "PathPattern failed to match a lexicalized path")
+        self.assertEqual(PathPattern(">> [entity=\"LOCATION\" & outgoing=nn]").match_sentence(s), [(17, 23)], "PathPattern failed to apply a token constraint to the destination")
+        self.assertEqual(PathPattern("[lemma=hold] >/^(dobj|aux)$/ [tag=DT | tag=TO]").match_sentence(s), [(7, 6)], "PathPattern failed to handle regex relations or disjunctive constraints")
+        self.assertFalse(PathPattern("[word=African] <amod >xcomp [tag=/^N/ & !incoming=conj_and]").matches(s), "PathPattern failed to handle a negated constraint")
+        # output of lexicalize_path should compile
+        path = DependencyUtils.lexicalize_path(s, [(1, "<cop", 5), (5, ">nsubj", 0)], lemmas=True)
+        self.assertEqual(PathPattern(path).match_sentence(s), [(1, 5, 0)], "PathPattern failed to compile the output of lexicalize_path")
+        # serial and pooled search should agree
+        pp = PathPattern("[tag=/^NNP/] >nn")
+        self.assertEqual(list(pp.find_all([doc, doc], processes=2)), [pp.find(doc)] * 2, "PathPattern.find_all did not match PathPattern.find")
+
+    def test_relation_candidates(self):
+        "RelationCandidateMiner should find the same paths as DirectedGraph.shortest_path"
+        json_file = os.path.join(__location__,'serialized_obama.json')
+        with open(json_file) as jf:
+            doc = Document.load_from_JSON(json.load(jf))
+        miner = RelationCandidateMiner()
+        s = doc.sentences[0]
+        for (_, source, _, target, path) in miner.candidates(s):
+            expected = s.dependencies.shortest_path(list(range(source.start, source.end)), list(range(target.start, target.end)))
+            self.assertEqual(len(path), len(expected), "RelationCandidateMiner did not find a shortest path")
+        counts = miner.patterns(doc)
+        self.assertEqual(counts[("PERSON", "LOCATION", "lemmas", ">appos [lemma=\"oʊˈbɑːmə\"] >nn")], 1, "Problem counting lexicalized patterns")
+        # endpoints are not lexicalized by default
+        self.assertEqual(counts[("PERSON", "LOCATION", "unlexicalized", ">appos >nn")], 1, "Problem counting unlexicalized patterns")
+        self.assertEqual(miner.count_patterns([doc, doc], processes=2), counts + counts, "Problem aggregating patterns across documents")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors.annotators import Processor, SegmentedMessage
+from processors.dispatch import CoalescingDispatcher
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+
+'''
+Testing coalescing of concurrent annotate_from_sentences requests.
+'''
+
+class _FakeProcessor(Processor):
+    """
+    Simulates a server that joins segments with a newline and splits each segment on whitespace.
+    """
+
+    def __init__(self):
+        super(_FakeProcessor, self).__init__("http://localhost:1")
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _message_to_json_dict(self, msg, timeout=None):
+        with self._lock:
+            self.requests.append(list(msg.segments))
+        if "bad" in msg.segments:
+            raise Exception("Server error")
+        time.sleep(0.01)
+        text = "\n".join(msg.segments)
+        sentences = []
+        offset = 0
+        for segment in msg.segments:
+            words = segment.split()
+            starts = []
+            position = 0
+            for w in words:
+                position = segment.index(w, position)
+                starts.append(offset + position)
+                position += len(w)
+            sentences.append({"words": words, "startOffsets": starts, "endOffsets": [s + len(w) for (s, w) in zip(starts, words)], "graphs": {"stanford-basic": {"edges": [], "roots": [0]}}})
+            offset += len(segment) + 1
+        return {"sentences": sentences, "text": text}
+
+
+class CoalescingDispatcherTests(unittest.TestCase):
+
+    def test_coalesce(self):
+        "CoalescingDispatcher should batch concurrent requests and split the results per caller"
+        processor = _FakeProcessor()
+        dispatcher = CoalescingDispatcher(processor, window=0.05, max_batch=10)
+        requests = [["Hello world .", "A second sentence ."], ["Another text ."], ["Hello world .", "A second sentence ."], ["One more", "text"]]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            docs = list(executor.map(dispatcher.annotate_from_sentences, requests))
+        dispatcher.close()
+        self.assertEqual(len(processor.requests), 1, "Concurrent requests should be coalesced")
+        self.assertEqual(len(processor.requests[0]), 5, "Identical requests should be sent once")
+        self.assertEqual(dispatcher.stats["shared"], 1, "Identical requests should share a response")
+        self.assertIs(docs[0], docs[2], "Identical requests should share a Document")
+        for (sentences, doc) in zip(requests, docs):
+            expected = processor._annotate_message(SegmentedMessage(sentences))
+            self.assertEqual(doc.to_JSON(), expected.to_JSON(), "Problem splitting Document for {}".format(sentences))
+
+    def test_max_batch(self):
+        "CoalescingDispatcher should respect max_batch and isolate failed requests"
+        processor = _FakeProcessor()
+        dispatcher = CoalescingDispatcher(processor, window=0.05, max_batch=2)
+        requests = [["one"], ["two"], ["bad"], ["four"]]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            docs = list(executor.map(dispatcher.annotate_from_sentences, requests))
+        dispatcher.close()
+        self.assertTrue(all(len(r) <= 2 for r in processor.requests), "Problem with max_batch")
+        self.assertIsNone(docs[2], "Failed request should produce None")
+        self.assertEqual([d.words for (i, d) in enumerate(docs) if i != 2], [["one"], ["two"], ["four"]], "Other requests should succeed")
+        self.assertRaises(ValueError, dispatcher.submit, ["closed"])
+
+    def test_cancel(self):
+        "CoalescingDispatcher should leave cancelled requests out of a batch without affecting identical requests"
+        processor = _FakeProcessor()
+        dispatcher = CoalescingDispatcher(processor, window=0.2, max_batch=10)
+        (first, second) = (dispatcher.submit(["shared ."]), dispatcher.submit(["shared ."]))
+        dropped = dispatcher.submit(["dropped ."])
+        self.assertIsNot(first, second, "Each caller should receive its own Future")
+        self.assertTrue(first.cancel() and dropped.cancel(), "Futures should be cancellable until the batch is sent")
+        self.assertEqual(second.result(5).words, ["shared", "."], "Cancelling one caller should not affect the others")
+        self.assertFalse(second.cancel(), "Futures should not be cancellable once the batch is sent")
+        dispatcher.close()
+        self.assertEqual(processor.requests, [["shared ."]], "Cancelled requests should not be sent")
+
+if __name__ == "__main__":
+    unittest.main()
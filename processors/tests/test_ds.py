@@ -31,6 +31,60 @@ class DSTests(unittest.TestCase):
         self.assertEqual(a.size(), 2, "Problem with Interval.size")
         self.assertEqual(b.size(), 1, "Problem with Interval.size")
         self.assertEqual(c.size(), 1, "Problem with Interval.size")
+        # check token indices
+        self.assertTrue(a.overlaps(2), "Problem detecting overlap with a token index")
+        self.assertFalse(a.overlaps(3), "Problem detecting overlap with a token index")
+        # Interval.contains used to return False for any token index; it now tests whether the index falls within [start, end)
+        self.assertTrue(a.contains(1), "Problem with Interval.contains for a token index")
+        self.assertFalse(a.contains(3), "Interval.contains should exclude the end of the Interval")
+
+    def test_document_view(self):
+        "DocumentView should share the Sentences of its parent"
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            doc = Document.load_from_JSON(json.load(jf))
+        view = doc.view([5, 1, 3])
+        self.assertEqual(view.indices, [1, 3, 5], "Sentences of a DocumentView should keep their order")
+        self.assertIs(view.sentences[1], doc.sentences[3], "Sentences should be shared with the parent")
+        self.assertEqual(view.words, doc.sentences[1].words + doc.sentences[3].words + doc.sentences[5].words, "Problem with words of DocumentView")
+        inner = view.view([0, 2])
+        self.assertIs(inner.parent, doc, "A view of a view should refer to the original Document")
+        self.assertEqual([inner.to_parent(i) for i in range(inner.size)], [1, 5], "Problem with indices of a view of a view")
+        self.assertRaises(ValueError, doc.view, [doc.size])
+
+    def test_interval_tree(self):
+        spans = [(0, 4), (1, 2), (3, 6), (5, 9), (10, 12), (11, 12)]
+        tree = IntervalTree([(start, end, i) for (i, (start, end)) in enumerate(spans)])
+        self.assertEqual(tree.overlapping(1, 4), [0, 1, 2], "Problem with IntervalTree.overlapping")
+        self.assertEqual(tree.containing(3, 4), [0, 2], "Problem with IntervalTree.containing")
+        self.assertEqual(tree.within(0, 6), [0, 1, 2], "Problem with IntervalTree.within")
+        self.assertEqual(tree.nearest(9, 10), [3, 4], "IntervalTree.nearest should return all spans at the minimum distance")
+        self.assertEqual(tree.overlapping(20, 21), [], "Problem with IntervalTree.overlapping")
+        self.assertEqual(tree.within(1, 12), [1, 2, 3, 4, 5], "Problem with IntervalTree.within")
+        # every span starts within the query but ends after it
+        tree = IntervalTree([(i, 1000, i) for i in range(500)] + [(600, 601, "inner")])
+        self.assertEqual(tree.within(0, 999), ["inner"], "IntervalTree.within should exclude spans that end after the query")
+
+    def test_subtree_index(self):
+        json_file = os.path.join(__location__, "serialized_obama.json")
+        with open(json_file) as jf:
+            doc = Document.load_from_JSON(json.load(jf))
+        s = doc.sentences[1]
+        # the basic dependencies form a tree
+        basic = s.graphs[DirectedGraph.STANFORD_BASIC_DEPENDENCIES]
+        self.assertTrue(basic.subtree_index().is_tree, "Basic dependencies should use the Euler tour index")
+        # the collapsed dependencies for this sentence have a token with two heads
+        collapsed = s.graphs[DirectedGraph.STANFORD_COLLAPSED_DEPENDENCIES]
+        self.assertFalse(collapsed.subtree_index().is_tree, "Collapsed dependencies should use the fallback index")
+        # "the first president born outside of the continental United States"
+        self.assertEqual(basic.subtree(16), [14, 15, 16, 17, 18, 19, 20, 21, 22, 23], "Problem with DirectedGraph.subtree")
+        # prepositions are collapsed into the relation
+        self.assertEqual(collapsed.subtree(16), [14, 15, 16, 17, 20, 21, 22, 23], "Problem with DirectedGraph.subtree")
+        for g in (basic, collapsed):
+            span = g.subtree_span(17)
+            self.assertEqual((span.start, span.end), (17, 24), "Problem with DirectedGraph.subtree_span")
+            self.assertTrue(g.dominates(16, 22), "Problem with DirectedGraph.dominates")
+            self.assertTrue(g.dominates(16, 16), "A token should dominate itself")
+            self.assertFalse(g.dominates(16, 9), "Problem with DirectedGraph.dominates")
 
 if __name__ == "__main__":
     unittest.main()
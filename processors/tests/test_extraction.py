@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.api import OdinAPI, DocumentWithRules, DocumentWithURL, TextWithRules
+from processors.cache import ResultCache
+from processors.utils import concurrent_map
+import time
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing client-side support for Odin extraction.  Server responses are supplied through a ResultCache.
+'''
+
+class OdinExtractionTests(unittest.TestCase):
+
+    RULES = "- name: example\n  label: Example\n  type: token\n  pattern: |\n    [word=example]\n"
+    URL = "https://raw.githubusercontent.com/clu-ling/py-processors/master/processors/tests/example-rules.yml"
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file) as jf:
+            self.jdict = json.load(jf)
+        self.doc = JSONSerializer.mentions_from_JSON(self.jdict)[0].document
+        self.cache = ResultCache()
+        # nothing is listening on this port, so every response must come from the cache
+        self.odin = OdinAPI("http://localhost:1", cache=self.cache)
+
+    def test_request(self):
+        "OdinAPI requests assembled from pre-serialized rules should match the containers"
+        for (container, rules) in [(DocumentWithRules, OdinExtractionTests.RULES), (DocumentWithURL, OdinExtractionTests.URL)]:
+            fields = dict(OdinAPI._rules_fields(rules), document=json.dumps(self.doc.to_JSON_dict(), sort_keys=True))
+            self.assertEqual(OdinAPI._request(fields), container(self.doc, rules).to_JSON(), "Problem assembling request")
+        fields = dict(OdinAPI._rules_fields(OdinExtractionTests.RULES), text=json.dumps("Some text."))
+        self.assertEqual(OdinAPI._request(fields), TextWithRules("Some text.", OdinExtractionTests.RULES).to_JSON(), "Problem assembling text request")
+
+    def test_extract_from_documents(self):
+        "OdinAPI.extract_from_documents should produce the mentions for each document"
+        request = DocumentWithRules(self.doc, OdinExtractionTests.RULES).to_JSON()
+        self.cache.put(self.odin._service, request, OdinExtractionTests.RULES, self.odin.server_version(), self.jdict)
+        results = list(self.odin.extract_from_documents([self.doc] * 5, OdinExtractionTests.RULES, max_in_flight=2))
+        self.assertEqual(len(results), 5, "There should be one result per document")
+        expected = [m["id"] for m in self.jdict["mentions"]]
+        for mentions in results:
+            self.assertEqual([m.id for m in mentions], expected, "Problem with extracted mentions")
+        indices = sorted(i for (i, _) in self.odin.extract_from_documents([self.doc] * 3, OdinExtractionTests.RULES, ordered=False))
+        self.assertEqual(indices, [0, 1, 2], "Unordered results should be paired with their index")
+
+    def test_rebind(self):
+        "OdinAPI.extract_from_document(rebind=True) should attach mentions to the caller's Document"
+        request = DocumentWithRules(self.doc, OdinExtractionTests.RULES).to_JSON()
+        self.cache.put(self.odin._service, request, OdinExtractionTests.RULES, self.odin.server_version(), self.jdict)
+        mentions = self.odin.extract_from_document(self.doc, OdinExtractionTests.RULES, rebind=True)
+        self.assertTrue(all(m.document is self.doc for m in mentions), "Mentions should share the caller's Document")
+        self.assertTrue(all(arg.document is self.doc for m in mentions for args in (m.arguments or dict()).values() for arg in args), "Arguments should share the caller's Document")
+        self.assertEqual(mentions[0].words(), ["He"], "Problem with words of rebound mention")
+        mentions = self.odin.extract_from_document(self.doc, OdinExtractionTests.RULES)
+        self.assertFalse(any(m.document is self.doc for m in mentions), "Mentions should not share the caller's Document by default")
+
+    def test_rebind_mismatch(self):
+        "JSONSerializer.mentions_from_JSON should decode documents that can't be rebound"
+        other = Document(self.doc.sentences[:1])
+        mentions = JSONSerializer.mentions_from_JSON(self.jdict, documents=[other])
+        self.assertFalse(any(m.document is other for m in mentions), "A Document with a different number of sentences should not be used")
+        other.id = "obama-1"
+        self.doc.id = "other"
+        mentions = JSONSerializer.mentions_from_JSON(self.jdict, documents=[self.doc, other])
+        self.assertFalse(any(m.document is self.doc for m in mentions), "Only a Document with a matching id should be used")
+
+    def test_view(self):
+        "Mentions found in a DocumentView should be attached to its parent"
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            parent = Document.load_from_JSON(json.load(jf))
+        view = parent.view([5, 3])
+        # a response for the view
+        response = dict(self.jdict, documents={"obama-1": view.to_JSON_dict()})
+        request = DocumentWithRules(view, OdinExtractionTests.RULES).to_JSON()
+        self.cache.put(self.odin._service, request, OdinExtractionTests.RULES, self.odin.server_version(), response)
+        mentions = self.odin.extract_from_document(view, OdinExtractionTests.RULES)
+        self.assertTrue(all(m.document is parent for m in mentions), "Mentions should be attached to the parent")
+        self.assertEqual({m.sentence for m in mentions}, {5}, "Sentence indices should refer to the parent")
+        self.assertEqual(mentions[0].words(), parent.sentences[5].words[0:1], "Problem with words of remapped mention")
+        event = next(m for m in mentions if m.id == "E:1")
+        self.assertEqual(event.trigger.sentence, 5, "Trigger sentence index should refer to the parent")
+        self.assertEqual(event.arguments["holder"][0].sentence, 5, "Argument sentence index should refer to the parent")
+
+    def test_sharded(self):
+        "OdinAPI.extract_from_document_sharded should merge the mentions of independent shards"
+        from processors.rules import OdinGrammar
+        rules = "\n".join([
+            "- name: people\n  label: Person\n  type: token\n  pattern: |\n    [word=He]",
+            "- name: places\n  label: Location\n  type: token\n  pattern: |\n    [word=States]",
+            "- name: hold\n  label: Hold\n  pattern: |\n    trigger = [lemma=hold]\n    holder:Person = nsubj"
+        ])
+        grammar = OdinGrammar(rules)
+        self.assertEqual(grammar.components(), [["people", "hold"], ["places"]], "Problem finding independent rules")
+        self.assertEqual(grammar.shards(1), [["people", "places", "hold"]], "Problem packing a single shard")
+        # responses for each shard (T:1 is found by both)
+        mentions = {m["id"]: m for m in self.jdict["mentions"]}
+        document = json.dumps(self.doc.to_JSON_dict(), sort_keys=True)
+        for (names, ids) in [(["people", "hold"], ["T:1", "E:1"]), (["places"], ["T:3", "T:1"])]:
+            shard = grammar.subset(names)
+            request = OdinAPI._request(dict(OdinAPI._rules_fields(shard), document=document))
+            response = dict(self.jdict, mentions=[mentions[i] for i in ids])
+            self.cache.put(self.odin._service, request, shard, self.odin.server_version(), response)
+        merged = self.odin.extract_from_document_sharded(self.doc, rules, workers=2)
+        self.assertEqual([m.id for m in merged], ["T:1", "E:1", "T:3"], "Problem merging shards")
+        self.assertTrue(all(m.document is self.doc for m in merged), "Mentions should be attached to the Document")
+        # imports can't be analyzed, so the rules are sent as a single shard
+        imported = "- import: org/clulab/people.yml\n" + rules
+        request = OdinAPI._request(dict(OdinAPI._rules_fields(imported), document=document))
+        self.cache.put(self.odin._service, request, imported, self.odin.server_version(), self.jdict)
+        merged = self.odin.extract_from_document_sharded(self.doc, imported, workers=2)
+        self.assertEqual(len(merged), len(self.jdict["mentions"]), "Grammar with imports should be sent as a single shard")
+
+    def test_parallel(self):
+        "OdinAPI.extract_from_document_parallel should rebase the mentions of each group of sentences"
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            parent = Document.load_from_JSON(json.load(jf))
+        mentions = {m["id"]: m for m in self.jdict["mentions"]}
+        # responses for each group of 2 sentences (all mentions are in the second sentence of a group)
+        for (indices, ids) in [([0, 1], ["T:1", "T:3", "E:1"]), ([2, 3], ["T:1", "T:2", "E:1"]), ([4, 5], [])]:
+            view = parent.view(indices)
+            request = DocumentWithRules(view, OdinExtractionTests.RULES).to_JSON()
+            response = dict(self.jdict, documents={"obama-1": view.to_JSON_dict()}, mentions=[mentions[i] for i in ids])
+            self.cache.put(self.odin._service, request, OdinExtractionTests.RULES, self.odin.server_version(), response)
+        res = self.odin.extract_from_document_parallel(parent, OdinExtractionTests.RULES, max_in_flight=3)
+        self.assertEqual([m.id for m in res], ["T:1@1", "T:3@1", "E:1@1", "T:1@3", "T:2@3", "E:1@3"], "Problem qualifying ids")
+        self.assertEqual([m.sentence for m in res], [1, 1, 1, 3, 3, 3], "Problem rebasing sentence indices")
+        event = res[-1]
+        self.assertEqual(event.arguments["holder"][0].id, "T:1@3", "Arguments should be rebased")
+        self.assertIs(event.arguments["holder"][0], res[3], "Arguments should be shared with the mentions of the same group")
+        self.assertEqual(event.trigger.words(), parent.sentences[3].words[7:8], "Problem with rebased trigger")
+        self.assertRaises(ValueError, self.odin.extract_from_document_parallel, parent, "- name: x\n  type: cross-sentence\n")
+        # a rule named after cross-sentence rules is fine
+        self.assertTrue(OdinAPI._sentence_local("- name: not-cross-sentence\n  label: X\n  type: token\n  pattern: |\n    [word=x]\n"))
+        # imports can't be analyzed, so the whole document is sent
+        imported = "- import: org/clulab/people.yml\n" + OdinExtractionTests.RULES
+        self.assertFalse(OdinAPI._sentence_local(imported))
+        self.assertFalse(OdinAPI._sentence_local("- name: [unclosed"), "Invalid yaml can't be analyzed")
+        self.assertFalse(OdinAPI._sentence_local("just a string"), "yaml that isn't a grammar can't be analyzed")
+        self.cache.put(self.odin._service, DocumentWithRules(parent, imported).to_JSON(), imported, self.odin.server_version(), dict(self.jdict, documents={"obama-1": parent.to_JSON_dict()}))
+        res = self.odin.extract_from_document_parallel(parent, imported)
+        self.assertEqual(len(res), len(self.jdict["mentions"]), "Grammar with imports should be applied to the whole document")
+
+    def test_concurrent_map(self):
+        "concurrent_map should bound concurrency and respect order"
+        def slow(x):
+            time.sleep(0.01 * (5 - x))
+            return x * x
+        self.assertEqual(list(concurrent_map(slow, range(5), max_in_flight=3)), [(i, i * i) for i in range(5)], "Problem with ordered results")
+        unordered = list(concurrent_map(slow, range(5), max_in_flight=5, ordered=False))
+        self.assertEqual(sorted(unordered), [(i, i * i) for i in range(5)], "Problem with unordered results")
+        self.assertEqual(unordered[0], (4, 16), "Fastest call should complete first")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.keyphrases import KeyphraseExtractor
+import networkx as nx
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing document-level keyphrase extraction.
+'''
+
+class KeyphraseTests(unittest.TestCase):
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_obama.json")
+        with open(json_file) as jf:
+            self.doc = Document.load_from_JSON(json.load(jf))
+
+    def test_rank_lemmas(self):
+        "KeyphraseExtractor.rank_lemmas should agree with networkx.pagerank"
+        extractor = KeyphraseExtractor(max_iter=1000, tol=1e-12)
+        (nodes, sources, destinations) = extractor._build_graph(self.doc)
+        g = nx.DiGraph()
+        g.add_nodes_from(range(len(nodes)))
+        for (s, d) in zip(sources, destinations):
+            weight = g[s][d]["weight"] + 1 if g.has_edge(s, d) else 1
+            g.add_edge(s, d, weight=weight)
+        expected = nx.pagerank(g, max_iter=1000, tol=1e-12)
+        scores = extractor.rank_lemmas(self.doc)
+        for (lemma, i) in nodes.items():
+            self.assertAlmostEqual(scores[lemma], expected[i], places=6, msg="PageRank score for \"{}\" differs from networkx".format(lemma))
+
+    def test_extract(self):
+        "KeyphraseExtractor.extract should expand top lemmas to noun phrases"
+        extractor = KeyphraseExtractor()
+        keyphrases = extractor.extract(self.doc, top_n=3)
+        self.assertEqual(len(keyphrases), 3, "Expected 3 keyphrases")
+        self.assertEqual(keyphrases[0][0], "Barack Hussein Obama II", "Problem expanding keyphrase to its chunk")
+        self.assertEqual(list(extractor.extract_many([self.doc, self.doc], top_n=3, processes=2)), [keyphrases] * 2, "Problem extracting keyphrases in parallel")
+        self.assertEqual(extractor.stats["documents"], 2, "Problem recording throughput")
+
+if __name__ == "__main__":
+    unittest.main()
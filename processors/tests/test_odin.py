@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.odin import MentionIndex, MentionConsolidator, LabelIndex
+import re
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing utilities for working with Odin mentions.
+'''
+
+class OdinTests(unittest.TestCase):
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file) as jf:
+            self.mentions = JSONSerializer.mentions_from_JSON(json.load(jf))
+        self.by_id = {m.id: m for m in self.mentions}
+
+    def ids(self, mentions):
+        return [m.id for m in mentions]
+
+    def test_mention_index(self):
+        "MentionIndex should answer overlap and containment queries"
+        index = MentionIndex(self.mentions)
+        (he, office) = (self.by_id["T:1"], self.by_id["T:2"])
+        self.assertEqual(self.ids(index.overlapping(he)), ["E:1", "E:2", "R:1"], "Problem with MentionIndex.overlapping")
+        self.assertEqual(self.ids(index.within(self.by_id["E:1"])), ["T:1", "T:2"], "Problem with MentionIndex.within")
+        self.assertEqual(self.ids(index.containing(office)), ["E:1", "E:2", "R:1"], "Problem with MentionIndex.containing")
+        self.assertEqual(self.ids(index.nearest(office)), ["T:1"], "Problem with MentionIndex.nearest")
+        self.assertEqual(self.ids(index.overlapping(office, characters=True)), ["E:1", "E:2", "R:1"], "Problem querying character offsets")
+        # queries should agree with Mention.overlaps
+        for m in self.mentions:
+            expected = [o.id for o in self.mentions if o is not m and m.overlaps(o)]
+            self.assertEqual(sorted(self.ids(index.overlapping(m))), sorted(expected), "MentionIndex.overlapping disagrees with Mention.overlaps")
+
+    def test_consolidation(self):
+        "MentionConsolidator should remove duplicates and select the best non-overlapping mentions"
+        longest = MentionConsolidator()
+        self.assertEqual(self.ids(longest.remove_duplicates(self.mentions + self.mentions)), self.ids(self.mentions), "Problem removing duplicate mentions")
+        self.assertEqual(self.ids(longest.consolidate(self.mentions + self.mentions)), ["E:2"], "The longest mention should have been selected")
+        by_label = MentionConsolidator(score=MentionConsolidator.label_priority(["Person", "Location", "Thing"]))
+        self.assertEqual(self.ids(by_label.consolidate(self.mentions)), ["T:1", "T:2", "T:3"], "Mentions with prioritized labels should have been selected")
+        by_rule = MentionConsolidator(score=MentionConsolidator.found_by_priority(["hold-rule"]))
+        self.assertEqual(self.ids(by_rule.consolidate(self.mentions)), ["T:3", "E:1"], "Mentions found by prioritized rules should have been selected")
+        # a longer mention is preferred even when shorter mentions cover more tokens
+        he = self.by_id["T:1"]
+        (left, right, longer) = (he.copy(token_interval=Interval(0, 4)), he.copy(token_interval=Interval(4, 8)), he.copy(token_interval=Interval(2, 7)))
+        kept = longest.consolidate([left, right, longer])
+        self.assertEqual(len(kept), 1, "Overlapping shorter mentions should have been removed")
+        self.assertIs(kept[0], longer, "The longest mention should have been selected")
+
+    def test_label_index(self):
+        "LabelIndex should find mentions by label and hypernym"
+        index = LabelIndex(self.mentions)
+        self.assertEqual(self.ids(index.with_label("Event")), ["E:1", "E:2"], "Problem finding mentions by hypernym")
+        self.assertEqual(self.ids(index.with_label("Missing")), [], "Problem with an unindexed label")
+        self.assertEqual(self.ids(index.matching("^(Event|Relation)$")), ["E:1", "E:2", "R:1"], "Problem finding mentions by label pattern")
+        # should agree with Mention.matches
+        for pattern in ("Ent", re.compile("^Ev"), "Loc.*"):
+            self.assertEqual(self.ids(index.matching(pattern)), self.ids([m for m in self.mentions if m.matches(pattern)]), "LabelIndex.matching disagrees with Mention.matches")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors.annotators import Processor
+from processors.routing import ProcessorRouter, LatencyModel
+import requests
+import json
+import time
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing cost-aware routing of texts to processors.
+'''
+
+class _FakeProcessor(Processor):
+    """
+    Simulates a processor whose latency grows with the squared length of each sentence.
+    """
+
+    def __init__(self, jdict, seconds_per_token):
+        super(_FakeProcessor, self).__init__("http://localhost:1")
+        self.jdict = jdict
+        self.seconds_per_token = seconds_per_token
+        self.calls = 0
+
+    def _message_to_json_dict(self, msg, timeout=None):
+        self.calls += 1
+        lengths = [len(s.split()) for s in msg.text.split(". ")]
+        seconds = self.seconds_per_token * sum(n * n for n in lengths)
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise requests.exceptions.Timeout()
+        time.sleep(seconds)
+        if self.jdict is None:
+            raise Exception("Server error")
+        return self.jdict
+
+
+class RoutingTests(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            self.jdict = json.load(jf)
+
+    def test_latency_model(self):
+        "LatencyModel should learn a linear latency curve online"
+        model = LatencyModel(decay=1.0, uncertainty=1e6)
+        for n in [10, 50, 20, 80, 5, 40]:
+            features = ProcessorRouter.features(" ".join(["word"] * n) + ".")
+            model.update(features, 0.01 + 0.5 * features[2])
+        features = ProcessorRouter.features(" ".join(["word"] * 60) + ".")
+        self.assertAlmostEqual(model.predict(features), 0.01 + 0.5 * features[2], places=3)
+
+    def test_route(self):
+        "ProcessorRouter should fall back to a cheaper processor when the budget would be missed"
+        slow = _FakeProcessor(self.jdict, seconds_per_token=0.0001)
+        cheap = _FakeProcessor(self.jdict, seconds_per_token=0.000002)
+        router = ProcessorRouter([("fastnlp", slow), ("clu", cheap)], budget=0.1, priors={"clu": (0.02, 0.0, 0.0)})
+        short_text = "A short sentence."
+        long_text = " ".join(["word"] * 60) + "."
+        # the first long text times out with the preferred processor
+        (name, doc) = router.annotate(long_text)
+        self.assertEqual(name, "clu", "Problem falling back after a missed deadline")
+        self.assertIsNotNone(doc, "Problem falling back after a missed deadline")
+        self.assertEqual(router.stats["fastnlp"]["timeouts"], 1, "Problem recording timeouts")
+        for _ in range(3):
+            router.annotate(short_text)
+        self.assertEqual(router.route(short_text), "fastnlp", "Short texts should use the preferred processor")
+        self.assertEqual(router.route(long_text), "clu", "Long texts should be routed to the cheaper processor")
+        calls = slow.calls
+        self.assertEqual(router.annotate(long_text)[0], "clu", "Problem routing long text")
+        self.assertEqual(slow.calls, calls, "Long text should not be sent to the slow processor")
+        self.assertEqual(router.annotate(long_text, budget=0.001), (None, None), "Problem with missed deadline")
+        # a slow error isn't a timeout
+        failing = _FakeProcessor(None, seconds_per_token=0.0)
+        router = ProcessorRouter([("fastnlp", failing)], budget=0.1)
+        self.assertEqual(router.annotate(short_text), (None, None))
+        self.assertEqual((router.stats["fastnlp"]["failures"], router.stats["fastnlp"]["timeouts"]), (1, 0), "Only Timeout should count as a timeout")
+
+if __name__ == "__main__":
+    unittest.main()
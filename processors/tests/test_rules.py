@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.api import OdinAPI
+from processors.rules import OdinGrammar, PatternAnalyzer, RulePrefilter, RuleProfiler
+import time
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing client-side analysis of Odin rules.
+'''
+
+class RulePrefilterTests(unittest.TestCase):
+
+    RULES = """
+vars:
+  birth: "bear"
+rules:
+  - name: occupation
+    label: Occupation
+    type: token
+    pattern: |
+      # an occupation
+      [word=organizer | lemma=teach]
+  - name: birth
+    label: Birth
+    pattern: |
+      trigger = [lemma=${ birth } & tag=/^V/]
+      person:Person = nsubjpass
+  - name: expanded
+    label: Person
+    type: token
+    pattern: |
+      @Person [tag=/^N/]*
+"""
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_obama.json")
+        with open(json_file) as jf:
+            self.doc = Document.load_from_JSON(json.load(jf))
+
+    def test_token_pattern(self):
+        "PatternAnalyzer should conservatively derive the requirements of token patterns"
+        self.assertEqual(PatternAnalyzer.token_pattern("[lemma=/^be/ & tag=VBN] [word=\"x y\"]+"), [frozenset([("lemma", "re", "^be")]), frozenset([("tag", "eq", "VBN")]), frozenset([("word", "eq", "x y")])])
+        self.assertEqual(PatternAnalyzer.token_pattern("(?<x> [word=a] | [word=b]) [entity=PERSON]?"), [frozenset([("word", "eq", "a"), ("word", "eq", "b")])])
+        self.assertEqual(PatternAnalyzer.token_pattern("/^V/+", unit="tag"), [frozenset([("tag", "re", "^V")])], "Problem with unit")
+        self.assertEqual(PatternAnalyzer.token_pattern("@Entity [tag=/^(J|N)/]*"), PatternAnalyzer.MENTION)
+        # nothing is required
+        self.assertEqual(PatternAnalyzer.token_pattern("[!word=x]"), PatternAnalyzer.ANY, "Problem with negation")
+        self.assertEqual(PatternAnalyzer.token_pattern("[incoming=nsubj] [word=a]{0,2}"), PatternAnalyzer.ANY, "Problem with optional constraints")
+        self.assertEqual(PatternAnalyzer.token_pattern("[word=a] | []"), PatternAnalyzer.ANY, "Problem with alternation")
+        self.assertEqual(PatternAnalyzer.token_pattern("[word=a"), PatternAnalyzer.ANY, "Unparsable patterns should require nothing")
+        self.assertEqual(PatternAnalyzer.token_pattern("[word=a]{x}"), PatternAnalyzer.ANY, "Unparsable quantifiers should require nothing")
+        self.assertEqual(PatternAnalyzer.token_pattern("[word=a]{${n}}"), PatternAnalyzer.ANY, "Unsubstituted variables should require nothing")
+
+    def test_prefilter(self):
+        "RulePrefilter should only exclude sentences that no rule can match"
+        prefilter = RulePrefilter(RulePrefilterTests.RULES)
+        self.assertEqual(prefilter.requirements["expanded"], PatternAnalyzer.MENTION, "Problem with mention-only rule")
+        self.assertFalse(prefilter.accepts_all)
+        # 0-2 contain "born" and 3-4 an occupation
+        self.assertEqual(prefilter.sentences(self.doc), [0, 1, 2, 3, 4], "Problem filtering sentences")
+        self.assertTrue(prefilter.rule_matches("occupation", self.doc.sentences[3]))
+        self.assertFalse(prefilter.rule_matches("occupation", self.doc.sentences[0]))
+        # rules that can't be analyzed accept everything
+        grammar = OdinGrammar(RulePrefilterTests.RULES)
+        grammar.vars = dict()
+        self.assertTrue(RulePrefilter(grammar).accepts_all, "Unknown variables should accept every sentence")
+        with open(os.path.join(__location__, "example-rules.yml")) as rf:
+            self.assertTrue(RulePrefilter(rf.read()).accepts_all, "Problem with example rules")
+        # Java regexes that re can't compile
+        prefilter = RulePrefilter("- name: upper\n  label: Upper\n  type: token\n  pattern: |\n    [word=/\\p{IsAlphabetic}+/ & tag=NNP] [word=/^\\p{Lu}/]\n")
+        self.assertEqual(prefilter.requirements["upper"], PatternAnalyzer.ANY, "A regex that can't be compiled should require nothing")
+        self.assertEqual(prefilter.sentences(self.doc), list(range(self.doc.size)), "A regex that can't be compiled should accept every sentence")
+
+    def test_subset(self):
+        "OdinGrammar.subset should produce yaml for the named rules"
+        grammar = OdinGrammar(RulePrefilterTests.RULES)
+        subset = OdinGrammar(grammar.subset(["birth"]))
+        self.assertEqual([r["name"] for r in subset.rules], ["birth"])
+        self.assertEqual(subset.vars, {"birth": "bear"}, "Variables should be kept")
+
+    def test_unresolvable(self):
+        "OdinGrammar should refuse to split grammars with imports or an external taxonomy"
+        rules = "\n".join([
+            "- import: org/clulab/people.yml",
+            "- name: ev\n  label: Event\n  pattern: |\n    trigger = [lemma=meet]\n    person:Person = nsubj",
+            "- name: other\n  label: Other\n  type: token\n  pattern: |\n    [word=x]"
+        ])
+        grammar = OdinGrammar(rules)
+        self.assertFalse(grammar.resolvable, "Imports can't be resolved locally")
+        self.assertRaises(ValueError, grammar.components)
+        self.assertRaises(ValueError, grammar.shards, 2)
+        self.assertRaises(ValueError, grammar.closure, ["ev"])
+        self.assertRaises(ValueError, RuleProfiler, None, grammar)
+        grammar = OdinGrammar("taxonomy: org/clulab/taxonomy.yml\nrules:\n" + "\n".join("  " + line for line in rules.splitlines()[1:]))
+        self.assertFalse(grammar.resolvable, "A taxonomy path can't be resolved locally")
+        # rules are keyed by position, so names can't collide
+        grammar = OdinGrammar(RulePrefilterTests.RULES)
+        self.assertTrue(grammar.resolvable)
+        self.assertEqual(grammar.components(), [["occupation"], ["birth", "expanded"]], "Problem finding independent rules")
+        self.assertEqual(grammar.closure(["birth"]), ["birth", "expanded"], "Problem with closure")
+
+    def test_odin_prefilter(self):
+        "OdinAPI should only send the sentences that the rules could match"
+        prefilter = RulePrefilter("- name: organizer\n  label: Occupation\n  type: token\n  pattern: |\n    [word=organizer]\n")
+        view = OdinAPI._apply_prefilter(self.doc, prefilter)
+        self.assertEqual(view.indices, [3], "Problem with view of matching sentences")
+        # nothing is listening on this port
+        odin = OdinAPI("http://localhost:1")
+        rules = "- name: nothing\n  label: Nothing\n  type: token\n  pattern: |\n    [word=xylophone]\n"
+        self.assertEqual(odin.extract_from_document(self.doc, rules, prefilter=True), [], "A document that can't match should not be sent")
+
+    def test_dependencies(self):
+        "OdinGrammar should find the rules whose mentions a rule consumes"
+        with open(os.path.join(__location__, "example-rules.yml")) as rf:
+            grammar = OdinGrammar(rf.read())
+        self.assertEqual(grammar.hypernyms("Person"), ["Person", "PossiblePerson", "Entity", "ExpandedEntity"], "Problem with hypernyms")
+        self.assertEqual(grammar.consumed_labels(grammar.rule("triples")), {"Verb", "ExpandedEntity"}, "Problem with consumed labels")
+        self.assertEqual(grammar.dependencies("ner-person"), [], "Problem with rule without dependencies")
+        self.assertIn("ner-person", grammar.dependencies("expanded-entity"), "A rule should depend on rules producing hyponyms of consumed labels")
+        self.assertEqual(grammar.closure(["triples"]), grammar.names, "Problem with closure")
+
+
+class _FakeProfiler(RuleProfiler):
+    """
+    Simulates a server where each rule finds one mention and the rule "slow" takes a while.
+    """
+
+    def __init__(self, response, *args, **kwargs):
+        super(_FakeProfiler, self).__init__(*args, **kwargs)
+        self.response = response
+
+    def _post(self, json_data):
+        names = [r["name"] for r in OdinGrammar(json.loads(json_data)["rules"]).rules]
+        if "slow" in names:
+            time.sleep(0.05)
+        mention = self.response["mentions"][0]
+        mentions = [dict(mention, id="T:{}".format(name), foundBy=name) for name in names]
+        return {"documents": self.response["documents"], "mentions": mentions}
+
+
+class RuleProfilerTests(unittest.TestCase):
+
+    RULES = """
+rules:
+  - name: fast
+    label: Fast
+    type: token
+    pattern: |
+      [word=He]
+  - name: slow
+    label: Slow
+    type: token
+    pattern: |
+      [word=He]
+  - name: consumer
+    label: Consumer
+    type: token
+    pattern: |
+      @Slow
+"""
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file) as jf:
+            self.jdict = json.load(jf)
+        self.doc = JSONSerializer.mentions_from_JSON(self.jdict)[0].document
+
+    def test_profile(self):
+        "RuleProfiler should rank rules by cost, discounting their dependencies"
+        profiler = _FakeProfiler(self.jdict, OdinAPI("http://localhost:1"), RuleProfilerTests.RULES)
+        results = profiler.profile([self.doc, self.doc])
+        self.assertEqual(results[0]["group"], "slow", "The slow rule should be ranked first")
+        consumer = next(r for r in results if r["group"] == "consumer")
+        self.assertEqual(consumer["dependencies"], ["slow"], "Problem with dependencies")
+        self.assertGreaterEqual(consumer["seconds"], 0.1, "Problem with total seconds")
+        self.assertLess(consumer["marginal_seconds"], consumer["seconds"], "Dependencies should be discounted")
+        self.assertEqual(consumer["mentions"], 2, "Only mentions found by the group's rules should be counted")
+        self.assertGreater(consumer["request_bytes"], 0)
+        self.assertIn("slow", profiler.table(top_n=1))
+        projection = profiler.projection(num_documents=20)
+        self.assertAlmostEqual(projection["slow"], 10 * (results[0]["marginal_seconds"] + results[0]["decode_seconds"]))
+        self.assertGreater(projection[RuleProfiler.GRAMMAR], projection["fast"], "Problem projecting the whole grammar")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import requests
+from processors.sentiment import SentimentAnalyzer
+from processors.cache import SentimentCache
+from processors.ds import Document
+import tempfile
+import json
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+
+'''
+Testing client-side batching of sentiment analysis requests.
+'''
+
+class _FakeAnalyzer(SentimentAnalyzer):
+    """
+    Simulates a server that scores each segment by its length and fails on any batch containing "bad".
+    """
+
+    def __init__(self):
+        super(_FakeAnalyzer, self).__init__("http://localhost:1")
+        self.requests = []
+
+    def _score_segments(self, segments):
+        self.requests.append(list(segments))
+        if "down" in segments:
+            raise requests.exceptions.ConnectionError("Connection refused")
+        if "bad" in segments:
+            raise Exception("Server error")
+        return [len(s) for s in segments]
+
+
+class SentimentBatchTests(unittest.TestCase):
+
+    def test_batches(self):
+        "SentimentAnalyzer.score_many should pack texts into batches"
+        analyzer = _FakeAnalyzer()
+        texts = ["a" * i for i in range(1, 11)]
+        scores = list(analyzer.score_many(iter(texts), batch_size=4, max_in_flight=2))
+        self.assertEqual(scores, list(range(1, 11)), "Problem with order of scores")
+        self.assertEqual([len(r) for r in analyzer.requests], [4, 4, 2], "Problem with batch size")
+        analyzer = _FakeAnalyzer()
+        list(analyzer.score_many(texts, batch_size=10, max_chars=10))
+        self.assertTrue(all(sum(len(t) for t in r) <= 10 or len(r) == 1 for r in analyzer.requests), "Problem with max_chars")
+
+    def test_bisect(self):
+        "SentimentAnalyzer.score_many should only fail the inputs that fail on their own"
+        analyzer = _FakeAnalyzer()
+        texts = ["one", "two", "bad", "four", "five", "six"]
+        scores = list(analyzer.score_many(texts, batch_size=6))
+        self.assertEqual(scores, [3, 3, None, 4, 4, 3], "Problem bisecting a failed batch")
+        # connection errors fail the whole batch without bisecting
+        analyzer = _FakeAnalyzer()
+        scores = list(analyzer.score_many(["one", "two", "down", "four"], batch_size=4))
+        self.assertEqual(scores, [None] * 4, "Problem with connection error")
+        self.assertEqual(len(analyzer.requests), 1, "Connection errors should not be retried")
+
+
+class _CountingAnalyzer(SentimentAnalyzer):
+    """
+    Simulates a server that scores each sentence by its number of words (or each segment by its length).
+    """
+
+    def __init__(self, cache=None):
+        super(_CountingAnalyzer, self).__init__("http://localhost:1", cache=cache)
+        self._server_version._version = "test"
+        self.requests = []
+
+    def _post(self, service, json_data):
+        data = json.loads(json_data)
+        self.requests.append(data)
+        if "segments" in data:
+            return [len(s) for s in data["segments"]]
+        if "sentences" in data:
+            return [len(s["words"]) for s in data["sentences"]]
+        return [len(data["words"])]
+
+
+class SentimentCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(__location__, "serialized_obama.json")) as jf:
+            self.doc = Document.load_from_JSON(json.load(jf))
+
+    def test_score_document(self):
+        "SentimentAnalyzer.score_document should only send sentences missing from the cache"
+        cache = SentimentCache()
+        analyzer = _CountingAnalyzer(cache=cache)
+        expected = [s.length for s in self.doc.sentences]
+        self.assertEqual(analyzer.score_document(self.doc), expected, "Problem scoring Document")
+        self.assertEqual(analyzer.score_document(self.doc), expected, "Problem scoring cached Document")
+        self.assertEqual(len(analyzer.requests), 1, "Cached Document should not be sent")
+        self.assertEqual(analyzer.score_sentence(self.doc.sentences[2]), expected[2], "Problem scoring cached Sentence")
+        # a Document sharing some sentences
+        other = Document.load_from_JSON(self.doc.to_JSON_dict())
+        other.sentences[3].words = ["A", "new", "sentence"]
+        scores = analyzer.score_document(other)
+        self.assertEqual(scores[3], 3, "Problem merging new scores")
+        self.assertEqual(scores[:3] + scores[4:], expected[:3] + expected[4:], "Problem merging cached scores")
+        self.assertEqual(len(analyzer.requests[-1]["sentences"]), 1, "Only the changed sentence should be sent")
+        stats = cache.stats()
+        self.assertEqual(stats["misses"], len(expected) + 1, "Problem with cache misses")
+        self.assertEqual(stats["hits"], len(expected) * 2, "Problem with cache hits")
+        # another server version
+        analyzer._server_version._version = "other"
+        analyzer.score_document(self.doc)
+        self.assertEqual(len(analyzer.requests[-1]["sentences"]), len(expected), "Cache should depend on server version")
+
+    def test_score_segmented_text(self):
+        "SentimentAnalyzer.score_segmented_text and score_many should share cached segments"
+        analyzer = _CountingAnalyzer(cache=SentimentCache())
+        self.assertEqual(analyzer.score_segmented_text(["one", "three"]), [3, 5], "Problem scoring segments")
+        self.assertEqual(list(analyzer.score_many(["three", "four", "one"])), [5, 4, 3], "Problem scoring cached segments")
+        self.assertEqual(analyzer.requests[-1]["segments"], ["four"], "Only uncached segments should be sent")
+
+    def test_bounded(self):
+        "SentimentCache should evict the least recently used scores and persist to disk"
+        cache = SentimentCache(max_size=2)
+        for (text, score) in [("a", 1), ("b", 2)]:
+            cache.put("service", "v", SentimentCache.fingerprint(text), score)
+        cache.get("service", "v", SentimentCache.fingerprint("a"))
+        cache.put("service", "v", SentimentCache.fingerprint("c"), 3)
+        self.assertEqual(len(cache), 2, "SentimentCache should be bounded")
+        self.assertIsNone(cache.get("service", "v", SentimentCache.fingerprint("b")), "Least recently used score should be evicted")
+        self.assertEqual(cache.stats()["evictions"], 1, "Problem counting evictions")
+        path = os.path.join(tempfile.mkdtemp(), "sentiment.json")
+        cache.save(path)
+        loaded = SentimentCache(path=path)
+        self.assertEqual(loaded.get("service", "v", SentimentCache.fingerprint("c")), 3, "Problem loading SentimentCache")
+        self.assertEqual(len(loaded), 2, "Problem loading SentimentCache")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 
 import unittest
 from processors import *
+import io
 import os
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
@@ -34,5 +35,66 @@ class SerializationTests(unittest.TestCase):
         m = mentions[0]
         self.assertTrue(isinstance(m, Mention), "JSONSerializer.load_from_JSON did not produce a Mention from {}".format(json_file))
 
+    def test_shared_arguments(self):
+        "JSONSerializer.mentions_from_JSON should share Mentions that appear in several events"
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file, "r") as jf:
+            mentions = JSONSerializer.mentions_from_JSON(json.load(jf))
+        mentions = {m.id: m for m in mentions}
+        he = mentions["T:1"]
+        self.assertIs(mentions["E:1"].arguments["holder"][0], he, "Argument was not shared with the top-level Mention")
+        self.assertIs(mentions["E:2"].arguments["person"][0], he, "Argument was not shared across events")
+        self.assertIs(mentions["R:1"].arguments["entity"][0], he, "Argument was not shared across relations")
+        self.assertIs(mentions["E:2"].arguments["location"][0], mentions["R:1"].arguments["location"][0], "Argument was not shared across events and relations")
+        # triggers inherit the document of their parent
+        trigger = mentions["E:1"].trigger
+        self.assertIsInstance(trigger, Mention, "Trigger was not a Mention")
+        self.assertIs(trigger.document, he.document, "Trigger was not bound to its parent's Document")
+        self.assertEqual(mentions["R:1"].type, Mention.RM, "Problem determining the type of a Mention")
+
+    def test_mentions_json_lines(self):
+        "JSONSerializer.mentions_to_JSON_lines should write each Document once and round-trip via mentions_from_JSON_lines"
+        mentions = []
+        for fname in ("serialized_events.json", "serialized_mention.json"):
+            with open(os.path.join(__location__, fname), "r") as jf:
+                mentions += JSONSerializer.mentions_from_JSON(json.load(jf))
+        out = io.StringIO()
+        self.assertEqual(JSONSerializer.mentions_to_JSON_lines(mentions, out), len(mentions), "Problem counting written mentions")
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len([r for r in records if r["type"] == "document"]), 2, "Each Document should be written once")
+        loaded = list(JSONSerializer.mentions_from_JSON_lines(io.StringIO(out.getvalue())))
+        self.assertEqual([m.to_JSON() for m in loaded], [m.to_JSON() for m in mentions], "Mentions did not survive a round trip")
+        self.assertIs(loaded[3].arguments["holder"][0], loaded[0], "Mentions read from JSON Lines should be shared")
+        self.assertIs(loaded[0].document, loaded[5].document, "Documents read from JSON Lines should be shared")
+
+    def test_mentions_json_lines_bounded(self):
+        "JSONSerializer.mentions_to_JSON_lines should write a Document again once a bounded reader would have discarded it"
+        mentions = []
+        for fname in ("serialized_events.json", "serialized_mention.json"):
+            with open(os.path.join(__location__, fname), "r") as jf:
+                mentions.append(JSONSerializer.mentions_from_JSON(json.load(jf)))
+        # alternate between the two documents
+        interleaved = [mentions[0][0], mentions[1][0], mentions[0][1]]
+        out = io.StringIO()
+        JSONSerializer.mentions_to_JSON_lines(interleaved, out, max_documents=1)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len([r for r in records if r["type"] == "document"]), 3, "Discarded Documents should be written again")
+        loaded = list(JSONSerializer.mentions_from_JSON_lines(io.StringIO(out.getvalue()), max_documents=1))
+        self.assertEqual([m.to_JSON() for m in loaded], [m.to_JSON() for m in interleaved], "Mentions did not survive a round trip")
+
+    def test_mention_ids_per_document(self):
+        "JSONSerializer.mentions_from_JSON should not share Mentions with the same id in different Documents"
+        with open(os.path.join(__location__, "serialized_events.json"), "r") as jf:
+            jdict = json.load(jf)
+        # a copy of every mention in a second document, reusing the same ids
+        jdict["documents"]["obama-2"] = jdict["documents"]["obama-1"]
+        copies = json.loads(json.dumps(jdict["mentions"]).replace("obama-1", "obama-2"))
+        jdict["mentions"] += copies
+        mentions = {(m._doc_id, m.id): m for m in JSONSerializer.mentions_from_JSON(jdict)}
+        (first, second) = (mentions[("obama-1", "E:1")], mentions[("obama-2", "E:1")])
+        self.assertIsNot(first.arguments["holder"][0], second.arguments["holder"][0], "Mentions from different Documents should not be shared")
+        self.assertIs(second.arguments["holder"][0], mentions[("obama-2", "T:1")], "Argument should be shared within its Document")
+        self.assertEqual(second.arguments["holder"][0]._doc_id, "obama-2", "Argument should come from its own Document")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.tables import MentionColumns
+import numpy as np
+import io
+import os
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing columnar tables of mentions.
+'''
+
+class MentionColumnsTests(unittest.TestCase):
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_events.json")
+        with open(json_file) as jf:
+            self.jdict = json.load(jf)
+        self.table = MentionColumns.from_JSON(self.jdict)
+
+    def test_rows(self):
+        "MentionColumns should store each distinct mention (including triggers) once"
+        self.assertEqual(len(self.table), 8, "MentionColumns should have 6 mentions and 2 triggers")
+        self.assertEqual(int(self.table.top_level.sum()), 6, "Problem with top_level")
+        self.assertEqual(self.table.sentence.dtype, np.int32, "sentence should be an int32 column")
+        e1 = list(self.table.id).index("E:1")
+        self.assertEqual(self.table.id[self.table.trigger[e1]], "T:4", "Problem with trigger row of E:1")
+        self.assertEqual(self.table.decode("type")[e1], "EventMention", "Problem decoding type")
+        self.assertEqual((self.table.start[e1], self.table.end[e1]), (0, 10), "Problem with token interval of E:1")
+
+    def test_arguments(self):
+        "MentionColumns should store arguments in a child table"
+        args = self.table.arguments
+        self.assertEqual(len(args["parent"]), 6, "MentionColumns should have 6 arguments")
+        roles = self.table.decode("role")
+        pairs = sorted((self.table.id[p], r, self.table.id[a]) for (p, r, a) in zip(args["parent"], roles, args["argument"]))
+        self.assertIn(("E:2", "person", "T:1"), pairs, "Problem with arguments of E:2")
+        self.assertIn(("R:1", "location", "T:3"), pairs, "Problem with arguments of R:1")
+
+    def test_from_JSON_lines(self):
+        "MentionColumns.from_JSON_lines should agree with MentionColumns.from_JSON"
+        mentions = JSONSerializer.mentions_from_JSON(self.jdict)
+        fh = io.StringIO()
+        JSONSerializer.mentions_to_JSON_lines(mentions, fh)
+        fh.seek(0)
+        table = MentionColumns.from_JSON_lines(fh)
+        self.assertEqual(list(table.id), list(self.table.id), "Problem reading rows from JSON Lines")
+        self.assertEqual(list(table.decode("label")), list(self.table.decode("label")), "Problem reading labels from JSON Lines")
+        texts = dict(zip(table.id, table.text))
+        self.assertEqual([texts[m.id] for m in mentions], [m.text for m in mentions], "Text should come from the document records")
+
+    def test_missing_values(self):
+        "MentionColumns should encode values missing from the JSON as None"
+        for mjson in self.jdict["mentions"]:
+            if mjson["id"] == "T:1":
+                mjson["foundBy"] = None
+        table = MentionColumns.from_JSON(self.jdict)
+        t1 = list(table.id).index("T:1")
+        self.assertIsNone(table.decode("foundBy")[t1], "Missing value should decode to None")
+        if pandas:
+            (mentions, _) = table.to_pandas()
+            self.assertTrue(pandas.isnull(mentions["foundBy"][t1]), "Missing value should be NaN in pandas")
+            self.assertEqual(list(mentions["foundBy"].drop(t1)), [v for (i, v) in enumerate(table.decode("foundBy")) if i != t1], "Problem remapping categories")
+        if pyarrow:
+            (mentions, _) = table.to_arrow()
+            self.assertEqual(mentions.column("foundBy").to_pylist(), list(table.decode("foundBy")), "Missing value should be null in pyarrow")
+
+    @unittest.skipUnless(pandas, "requires pandas")
+    def test_to_pandas(self):
+        "MentionColumns.to_pandas should produce categorical columns"
+        (mentions, arguments) = self.table.to_pandas()
+        self.assertEqual(len(mentions), 8, "Problem with number of rows")
+        self.assertEqual(str(mentions["label"].dtype), "category", "label should be categorical")
+        self.assertEqual(set(mentions[mentions["label"] == "Born"]["id"]), {"E:2"}, "Problem selecting by label")
+        self.assertEqual(len(arguments), 6, "Problem with number of arguments")
+
+    @unittest.skipUnless(pyarrow, "requires pyarrow")
+    def test_to_arrow(self):
+        "MentionColumns.to_arrow should produce dictionary-encoded columns"
+        (mentions, arguments) = self.table.to_arrow()
+        self.assertEqual(mentions.num_rows, 8, "Problem with number of rows")
+        self.assertTrue(pyarrow.types.is_dictionary(mentions.schema.field("label").type), "label should be dictionary-encoded")
+        self.assertEqual(mentions.column("start").to_pylist(), self.table.start.tolist(), "Problem with start column")
+        self.assertEqual(arguments.num_rows, 6, "Problem with number of arguments")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from processors import *
+from processors.tensors import GraphTensors, Vocabulary
+import numpy as np
+import tempfile
+import shutil
+import os
+
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+'''
+Testing export of dependency graphs to sparse arrays.
+'''
+
+class GraphTensorsTests(unittest.TestCase):
+
+    def setUp(self):
+        json_file = os.path.join(__location__, "serialized_obama.json")
+        with open(json_file) as jf:
+            self.doc = Document.load_from_JSON(json.load(jf))
+        json_file = os.path.join(__location__, "serialized_biodoc.json")
+        with open(json_file) as jf:
+            self.biodoc = Document.load_from_JSON(json.load(jf))
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_from_documents(self):
+        "GraphTensors.from_documents should produce batched COO arrays aligned with token features"
+        docs = [self.doc, self.biodoc]
+        t = GraphTensors.from_documents(docs, forms=("words", "entities"))
+        self.assertEqual(t.num_tokens, sum(len(d.words) for d in docs), "Problem with sentence offsets")
+        self.assertEqual(list(t.document_offsets), [0, 6, 12], "Problem with document offsets")
+        # recover the edges of the second sentence
+        s = self.doc.sentences[1]
+        (start, end) = (t.edge_offsets[1], t.edge_offsets[2])
+        offset = t.sentence_offsets[1]
+        exported = set(zip(t.src[start:end] - offset, [t.relations.items[r] for r in t.rel[start:end]], t.dst[start:end] - offset))
+        self.assertEqual(exported, set((e.source, e.relation, e.destination) for e in s.dependencies.edges), "Problem recovering a sentence's edges")
+        words = [t.features["words"].items[i] for i in t.token_features["words"]]
+        self.assertEqual(words, self.doc.words + self.biodoc.words, "Token features were not aligned with the batch's tokens")
+        # CSR
+        (indptr, indices, data) = t.to_csr()
+        self.assertEqual(len(indptr), t.num_tokens + 1, "Problem with CSR indptr")
+        token = int(offset) + 5
+        self.assertEqual(set(indices[indptr[token]:indptr[token+1]] - offset), set(d for (d, _) in s.dependencies.outgoing[5]), "Problem with CSR indices")
+
+    def test_shards(self):
+        "GraphTensors.write_shards should share vocabularies across .npz shards"
+        paths = GraphTensors.write_shards([self.doc, self.biodoc, self.doc], self.tmp_dir, shard_size=2)
+        self.assertEqual(len(paths), 2, "Expected 2 shards")
+        first = GraphTensors.load_npz(paths[0])
+        last = GraphTensors.load_npz(paths[1])
+        self.assertTrue(np.array_equal(first.src, GraphTensors.from_documents([self.doc, self.biodoc]).src), "Problem loading .npz shard")
+        # ids for the repeated document should be identical
+        self.assertTrue(np.array_equal(first.rel[:len(last.rel)], last.rel), "Relation ids should be consistent across shards")
+        self.assertTrue(np.array_equal(first.token_features["lemmas"][:last.num_tokens], last.token_features["lemmas"]), "Feature ids should be consistent across shards")
+
+if __name__ == "__main__":
+    unittest.main()
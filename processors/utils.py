@@ -1,28 +1,87 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 from termcolor import colored
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+import multiprocessing as mp
+import threading
 import requests
 import json
+import time
 import os
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    # python 2.7
+    from urlparse import urlparse
 
 def is_string(x):
     return isinstance(x, ("".__class__, u"".__class__))
 
-def post_json(service, json_data):
-    # POST json to the server API
-    #response = requests.post(service, json={"text":"{}".format(text)})
-    # for older versions of requests, use the call below
-    #print("SERVICE: {}".format(service))
-    response = requests.post(service,
-                             data=json_data,
-                             headers={'content-type': 'application/json; charset=utf-8'},
-                             timeout=None
-                             )
-    # response content should be utf-8
-    #response.encoding = "utf-8"
-    content = response.content.decode("utf-8")
-    #print("CONTENT: {}".format(content))
-    return json.loads(content)
+def post_json(service, json_data, timeout=None):
+    """
+    POSTs `json_data` to `service`.  `timeout` (seconds, or None to wait indefinitely) is passed to `requests`.
+    If enabled, the number of concurrent requests to each server is limited adaptively (see `processors.utils.AdaptiveConcurrency`).
+    """
+    limit = AdaptiveConcurrency.for_service(service)
+    if limit is not None and not limit.acquire(timeout):
+        raise requests.exceptions.Timeout("Timed out waiting for a connection to {}".format(AdaptiveConcurrency.server(service)))
+    start = time.time()
+    overloaded = False
+    try:
+        # POST json to the server API
+        #response = requests.post(service, json={"text":"{}".format(text)})
+        # for older versions of requests, use the call below
+        #print("SERVICE: {}".format(service))
+        try:
+            response = requests.post(service,
+                                     data=json_data,
+                                     headers={'content-type': 'application/json; charset=utf-8'},
+                                     timeout=timeout
+                                     )
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            overloaded = True
+            raise
+        overloaded = response.status_code in AdaptiveConcurrency.OVERLOADED
+        # response content should be utf-8
+        #response.encoding = "utf-8"
+        content = response.content.decode("utf-8")
+        #print("CONTENT: {}".format(content))
+        return json.loads(content)
+    finally:
+        if limit is not None:
+            limit.release(time.time() - start, failed=overloaded)
+
+def server_version(address):
+    """
+    Retrieves the version of the processors-server at `address`, or None if it can't be retrieved.
+    """
+    try:
+        return str(post_json("{}/version".format(address), None)["version"])
+    except Exception:
+        return None
+
+class ServerVersion(object):
+    """
+    The version of the processors-server at `address`, retrieved once (see `server_version`).
+    A failed lookup is remembered for `retry_after` seconds, so an unreachable server isn't queried on every call.
+    """
+
+    RETRY_AFTER = 60.0
+
+    def __init__(self, address, retry_after=RETRY_AFTER):
+        self.address = address
+        self.retry_after = retry_after
+        self._version = None
+        self._failed_at = None
+
+    def get(self):
+        if self._version is None:
+            if self._failed_at is not None and time.time() - self._failed_at < self.retry_after:
+                return None
+            self._version = server_version(self.address)
+            self._failed_at = None if self._version is not None else time.time()
+        return self._version
 
 def full_path(p):
     """
@@ -30,6 +89,83 @@ def full_path(p):
     """
     return os.path.abspath(os.path.normpath(os.path.expanduser(p)))
 
+def parallel_map(func, items, processes=None, chunksize=1):
+    """
+    Lazily applies `func` to each element of `items` using a pool of worker processes.
+    Results are yielded in the order of `items`.
+
+    Parameters
+    ----------
+    func : function
+        A module-level (i.e., picklable) function of one argument.
+    items : iterable
+        The inputs to `func`.
+    processes : int or None
+        The number of worker processes.  None uses `multiprocessing.cpu_count()`.  1 applies `func` in the current process.
+    chunksize : int
+        The number of items sent to a worker at a time.  Larger chunks reduce IPC overhead for cheap calls.
+    """
+    if processes == 1:
+        for item in items:
+            yield func(item)
+        return
+    pool = mp.Pool(processes=processes)
+    try:
+        for res in pool.imap(func, items, chunksize):
+            yield res
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def concurrent_map(func, items, max_in_flight=4, ordered=True):
+    """
+    Lazily applies `func` to each element of `items` using a pool of threads (ex. for blocking calls to the server).
+    At most `max_in_flight` calls are pending at any time, so `items` can be a long (or unbounded) stream.
+
+    Parameters
+    ----------
+    func : function
+        A function of one argument.
+    items : iterable
+        The inputs to `func`.  Consumed lazily.
+    max_in_flight : int
+        The maximum number of concurrent calls.
+    ordered : bool
+        Whether results are yielded in the order of `items` (True) or as they complete (False).
+
+    Returns
+    -------
+    generator
+        Yields (index, result) pairs, where index is the position of the input in `items`.
+        Exceptions raised by `func` are re-raised when the corresponding result is reached.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+    items = iter(enumerate(items))
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = deque()
+
+        def submit():
+            for (i, item) in items:
+                pending.append((i, executor.submit(func, item)))
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit():
+            pass
+        while pending:
+            if ordered:
+                (i, future) = pending.popleft()
+                res = future.result()
+            else:
+                done, _ = wait([f for (_, f) in pending], return_when=FIRST_COMPLETED)
+                (i, future) = next((i, f) for (i, f) in pending if f in done)
+                pending.remove((i, future))
+                res = future.result()
+            submit()
+            yield (i, res)
+
 class LabelManager(object):
     """
     Keep track of common labels
@@ -51,3 +187,193 @@ class OdinError(Exception):
     def __str__(self):
         cn = colored(self.__class__.__name__, color="red", attrs=["bold"])
         return "{}: {}\n{}".format(cn, self.message, self.rules)
+
+
+class ConcurrencyLimit(object):
+    """
+    An adaptive limit on the number of in-flight requests to a single server, adjusted using AIMD (additive increase, multiplicative decrease).
+
+    While requests succeed and latency stays near its long-term average, the limit grows by about one request per round trip whenever it is fully used.
+    When a request signals overload (see `AdaptiveConcurrency.OVERLOADED`) or recent latency exceeds `tolerance` times its long-term average, the limit is multiplied by `backoff` (at most once per round trip).
+
+    Parameters
+    ----------
+    initial : int
+        The initial limit.
+    min_limit : int
+        The smallest limit.
+    max_limit : int
+        The largest limit.
+    backoff : float
+        The multiplicative decrease (between 0 and 1).
+    tolerance : float
+        How much recent latency can exceed the long-term average before the limit is decreased.
+    warmup : int
+        The number of requests observed before latency is used to decrease the limit.
+
+    Attributes
+    ----------
+    limit : float
+        The current limit (requests are admitted while `in_flight` is below its integer part).
+    in_flight : int
+        The number of requests currently in flight.
+
+    Methods
+    -------
+    acquire(timeout=None)
+        Waits for a slot.  Returns False if `timeout` expired.
+    release(seconds, failed=False)
+        Frees a slot and updates the limit using the observed latency.  `failed` marks a request that signalled overload.
+    stats()
+        The limit, requests in flight, and latency statistics.
+    """
+
+    # weight of each observation in the recent and long-term latency averages
+    RECENT = 0.3
+    LONG_TERM = 0.02
+
+    def __init__(self, initial=16, min_limit=1, max_limit=128, backoff=0.9, tolerance=2.0, warmup=10):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.warmup = warmup
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.recent_latency = None
+        self.long_term_latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self.in_flight >= max(self.min_limit, int(self.limit)):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, seconds, failed=False):
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            self.requests += 1
+            if failed:
+                self.errors += 1
+                self._decrease()
+            else:
+                self._observe(seconds)
+                if self.requests > self.warmup and self.recent_latency > self.tolerance * self.long_term_latency:
+                    self._decrease()
+                elif saturated:
+                    # about one request per round trip
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def _observe(self, seconds):
+        if self.recent_latency is None:
+            (self.recent_latency, self.long_term_latency) = (seconds, seconds)
+            return
+        self.recent_latency += ConcurrencyLimit.RECENT * (seconds - self.recent_latency)
+        self.long_term_latency += ConcurrencyLimit.LONG_TERM * (seconds - self.long_term_latency)
+
+    def _decrease(self):
+        now = time.time()
+        # requests already in flight during a slowdown should only cause one decrease
+        if now - self._last_decrease < (self.recent_latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "recent_latency": self.recent_latency,
+                "long_term_latency": self.long_term_latency
+            }
+
+
+class AdaptiveConcurrency(object):
+    """
+    Tracks a `processors.utils.ConcurrencyLimit` for each server (scheme, host, and port) that `post_json` sends requests to.
+
+    Each server in a pool gets its own limit, so a struggling server is throttled without slowing the others (see `AdaptiveConcurrency.choose`).
+    Limits are disabled by default.  Call `AdaptiveConcurrency.configure()` to enable them for every server.
+    Only timeouts, connection errors, and responses with a status in `AdaptiveConcurrency.OVERLOADED` (429 and 503) are treated as overload; other errors don't change the limit.
+
+    Methods
+    -------
+    configure(enabled=True, **settings)
+        Enables (or disables) adaptive limits, using `settings` for each new `ConcurrencyLimit`.  Existing limits are discarded.
+    for_service(service)
+        The `ConcurrencyLimit` for the server of `service` (None if disabled).
+    limits()
+        The statistics for each server, for monitoring.
+    choose(services, i=0)
+        The service whose server has the most free slots.
+    """
+
+    # 429 Too Many Requests and 503 Service Unavailable
+    OVERLOADED = (429, 503)
+
+    enabled = False
+    settings = dict()
+    _limits = dict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def server(service):
+        parsed = urlparse(service)
+        return "{}://{}".format(parsed.scheme, parsed.netloc)
+
+    @staticmethod
+    def configure(enabled=True, **settings):
+        with AdaptiveConcurrency._lock:
+            AdaptiveConcurrency.enabled = enabled
+            AdaptiveConcurrency.settings = settings
+            AdaptiveConcurrency._limits = dict()
+
+    @staticmethod
+    def for_service(service):
+        if not AdaptiveConcurrency.enabled:
+            return None
+        server = AdaptiveConcurrency.server(service)
+        with AdaptiveConcurrency._lock:
+            limit = AdaptiveConcurrency._limits.get(server, None)
+            if limit is None:
+                limit = ConcurrencyLimit(**AdaptiveConcurrency.settings)
+                AdaptiveConcurrency._limits[server] = limit
+            return limit
+
+    @staticmethod
+    def limits():
+        """
+        server -> `ConcurrencyLimit.stats` for each server that has received a request.
+        """
+        with AdaptiveConcurrency._lock:
+            limits = dict(AdaptiveConcurrency._limits)
+        return {server: limit.stats() for (server, limit) in limits.items()}
+
+    @staticmethod
+    def choose(services, i=0):
+        """
+        The service (of `services`) whose server has the most free slots.  Ties are broken in turn, starting from `services[i % len(services)]`.
+        """
+        ordered = [services[(i + j) % len(services)] for j in range(len(services))]
+        if not AdaptiveConcurrency.enabled or len(services) == 1:
+            return ordered[0]
+
+        def free(service):
+            limit = AdaptiveConcurrency.for_service(service)
+            return int(limit.limit) - limit.in_flight
+
+        return max(ordered, key=free)
@@ -60,7 +60,10 @@ with open('requirements.txt', 'r', 'utf-8') as f:
 with open('docs/index.md', 'r', 'utf-8') as f:
     readme = f.read()
 
-test_deps = ["green>=2.5.0", "coverage"]
+graph_deps = ["numpy>=1.13.0"]
+table_deps = graph_deps + ["pandas>=0.20.0", "pyarrow>=0.8.0"]
+rule_deps = ["pyyaml>=3.12"]
+test_deps = ["green>=2.5.0", "coverage"] + table_deps + rule_deps
 viz_deps = ["jupyter>=1.0.0", "ipython>=6.2.1", "traitlets>=4.3.2"]
 
 setup(name='py-processors',
@@ -88,7 +91,10 @@ setup(name='py-processors',
       tests_require=test_deps,
       extras_require={
         'test': test_deps,
-        'jupyter': viz_deps
+        'jupyter': viz_deps,
+        'graphs': graph_deps,
+        'tables': table_deps,
+        'rules': rule_deps
       },
       include_package_data=True,
       zip_safe=False)